@@ -0,0 +1,92 @@
+"""measures what the contact queries of KilobotsEnv cost with the ContactIndex and with Body.collides_with
+
+Each case steps a YamlKilobotsEnv whose kilobots gather at a light next to the objects and asks after every step which
+kilobots touch which object. The query is answered in three ways:
+
+    none: no query, the cost of the step without contact queries
+    index: env.contacts.pairs(KILOBOT, OBJECT) from the ContactIndex, which is built from world.contacts once per step
+    collides_with: kilobot.collides_with(object) for all pairs of kilobots and objects, which walks the contacts of
+        each kilobot
+
+For each case, the time per step including the query and the time of the query alone are reported, the queries of
+index include building the index:
+
+    python benchmarks/contacts.py
+    python benchmarks/contacts.py --kilobots 100 1000 --objects 1 4 --steps 20
+"""
+import argparse
+import time
+
+import numpy as np
+
+_methods = ['none', 'index', 'collides_with']
+
+
+def make_env(kilobots, objects):
+    from gym_kilobots.envs.yaml_kilobots_env import EnvConfiguration, YamlKilobotsEnv
+
+    objects = [dict(idx=i, color=None, shape='quad', width=.15, height=.15, init=[.2 * i - .1 * objects, .0, .0],
+                    symmetry=None) for i in range(objects)]
+    conf = EnvConfiguration(width=2., height=1.5, resolution=600, objects=objects,
+                            light=dict(obj_type='circular', init=[.0, .1], radius=.2),
+                            kilobots=dict(num=kilobots, mean='light', std=.1))
+
+    class BenchmarkEnv(YamlKilobotsEnv):
+        def _init_kilobots(self, type='PhototaxisKilobot'):
+            super()._init_kilobots(type)
+
+    return BenchmarkEnv(configuration=conf)
+
+
+def query(env, method):
+    if method == 'index':
+        contacts = env.contacts
+        return contacts.pairs(contacts.KILOBOT, contacts.OBJECT)
+    if method == 'collides_with':
+        return np.array([(i, j) for i, kb in enumerate(env.kilobots) for j, o in enumerate(env.objects)
+                         if kb.collides_with(o._body)], dtype=np.intp).reshape((-1, 2))
+    return None
+
+
+def run(kilobots, objects, method, steps, seed):
+    np.random.seed(seed)
+    env = make_env(kilobots, objects)
+    env.reset()
+    query(env, method)
+    action = np.zeros(env.action_space.shape)
+
+    step_seconds = query_seconds = .0
+    touching = 0
+    for _ in range(steps):
+        t = time.perf_counter()
+        env.step(action)
+        q = time.perf_counter()
+        pairs = query(env, method)
+        step_seconds += time.perf_counter() - t
+        query_seconds += time.perf_counter() - q
+        touching += len(pairs) if pairs is not None else 0
+    env.close()
+    return dict(step_ms=step_seconds / steps * 1e3, query_ms=query_seconds / steps * 1e3, touching=touching / steps)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--kilobots', nargs='+', type=int, default=[50, 500])
+    parser.add_argument('--objects', nargs='+', type=int, default=[1, 4])
+    parser.add_argument('--methods', nargs='+', default=_methods, choices=_methods)
+    parser.add_argument('--steps', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print('{:>6} {:>8} {:>14} {:>10} {:>10} {:>9}'.format('kbs', 'objects', 'method', 'ms/step', 'ms/query',
+                                                          'touching'))
+    for kilobots in args.kilobots:
+        for objects in args.objects:
+            for method in args.methods:
+                r = run(kilobots, objects, method, args.steps, args.seed)
+                print('{:>6} {:>8} {:>14} {:>10.2f} {:>10.3f} {:>9.1f}'.format(
+                    kilobots, objects, method, r['step_ms'], r['query_ms'], r['touching']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""compares the physics backends of KilobotsEnv (see gym_kilobots.lib.physics) on the same scenarios
+
+Each scenario is run from the same initial state with every backend. For each run, the time per step, the largest
+overlap of two kilobots relative to their diameter, whether all kilobots stayed on the table and how far the objects
+moved are reported, and for all backends but the first the deviation of the mean kilobot position and of the object
+poses from the first backend:
+
+    python benchmarks/physics_backends.py
+    python benchmarks/physics_backends.py --scenario gather --kilobots 1000 10000 --steps 3
+
+The scenarios are 'gather' (PhototaxisKilobots gathering at a circular light) and 'push' (SimplePhototaxisKilobots
+that are driven by a linear light against an object). The table grows with the number of kilobots such that the
+density stays that of 1000 kilobots on the default table.
+
+With --test-envs, the environments of gym_kilobots.envs.kilobots_test_envs are compared instead, the environments
+that cannot be stepped with any backend are reported as skipped:
+
+    python benchmarks/physics_backends.py --test-envs
+
+The NumPy backend only pays off for large swarms. For small swarms its step costs an order of magnitude more than
+that of Box2D, e.g., on QuadAssemblyKilobotsEnv (15 kilobots) and with 50 kilobots. In the gather scenario with 1000
+kilobots, which start overlapping, a step took 0.6 s with NumPy and 13 s with Box2D, and neither backend separated the
+kilobots within three steps. With 10000 kilobots a step took 6.9 s with NumPy, Box2D did not finish two steps within
+25 minutes. Neither backend is interactive at these sizes.
+"""
+import argparse
+import time
+
+import numpy as np
+
+_shapes = ['quad', 'triangle', 'circle', 'l_shape', 'c_shape']
+
+
+def make_env(scenario, kilobots, shape, physics):
+    from gym_kilobots.envs.yaml_kilobots_env import EnvConfiguration, YamlKilobotsEnv
+
+    scale = max(1., np.sqrt(kilobots / 1000))
+    if scenario == 'gather':
+        kilobot_class = 'PhototaxisKilobot'
+        objects = [dict(idx=0, color=None, shape=shape, width=.15, height=.15, init='random', symmetry=None)]
+        light = dict(obj_type='circular', init='random', radius=.2)
+        spawn = dict(num=kilobots, mean='light', std=.1 * scale)
+    else:
+        kilobot_class = 'SimplePhototaxisKilobot'
+        objects = [dict(idx=0, color=None, shape=shape, width=.15, height=.15, init=[.0, .0, .0], symmetry=None)]
+        light = dict(obj_type='linear', init=.0)
+        spawn = dict(num=kilobots, mean=[-.2, .0], std=.04 * scale)
+    conf = EnvConfiguration(width=2. * scale, height=1.5 * scale, resolution=600, objects=objects, light=light,
+                            kilobots=spawn)
+
+    class BenchmarkEnv(YamlKilobotsEnv):
+        def _init_kilobots(self, type=kilobot_class):
+            super()._init_kilobots(type)
+
+    return BenchmarkEnv(configuration=conf, physics=physics)
+
+
+def make_test_env(name, physics):
+    from gym_kilobots.envs import kilobots_test_envs
+
+    env_class = getattr(kilobots_test_envs, name)
+    return type(name, (env_class,), dict(physics=physics))()
+
+
+def max_overlap(env):
+    from gym_kilobots.lib.messaging import SpatialHash
+
+    positions = env.swarm.poses[:, :2]
+    if len(positions) < 2:
+        return .0
+    diameter = 2 * env._kilobots[0]._radius
+    grid = SpatialHash(diameter)
+    grid.build(positions)
+    i, j, distances = grid.query(positions, diameter, sort=False)
+    distances = distances[i != j]
+    return float(1 - distances.min() / diameter) if len(distances) else .0
+
+
+def run(scenario, kilobots, shape, physics, steps, seed):
+    np.random.seed(seed)
+    env = make_env(scenario, kilobots, shape, physics)
+    return run_env(env, steps)
+
+
+def run_env(env, steps):
+    env.reset()
+    objects = np.asarray(env.get_state()['objects']).reshape((-1, 3)).copy()
+    action = np.zeros(env.action_space.shape) if env.action_space is not None else None
+
+    t = time.perf_counter()
+    for _ in range(steps):
+        env.step(action)
+    step_ms = (time.perf_counter() - t) / steps * 1e3
+
+    state = env.get_state()
+    kilobot_positions = state['kilobots'][:, :2]
+    lower, upper = env.world_bounds
+    on_table = bool(np.all((kilobot_positions >= lower) & (kilobot_positions <= upper)))
+    result = dict(step_ms=step_ms, kilobots=len(kilobot_positions), overlap=max_overlap(env), on_table=on_table,
+                  kilobot_mean=kilobot_positions.mean(axis=0), objects=np.asarray(state['objects']).reshape((-1, 3)))
+    result['object_moved'] = np.linalg.norm(result['objects'][:, :2] - objects[:, :2], axis=1).max(initial=.0)
+    env.close()
+    return result
+
+
+_test_envs = ['QuadPushingEnv', 'QuadAssemblyKilobotsEnv', 'TriangleTestEnv']
+
+
+def print_result(scenario, kilobots, shape, physics, r, reference):
+    kilobot_drift = np.linalg.norm(r['kilobot_mean'] - reference['kilobot_mean'])
+    object_drift = np.linalg.norm(r['objects'][:, :2] - reference['objects'][:, :2], axis=1).max(initial=.0)
+    object_turn = np.abs(r['objects'][:, 2] - reference['objects'][:, 2]).max(initial=.0)
+    print('{:>23} {:>6} {:>10} {:>8} {:>10.1f} {:>8.3f} {:>9} {:>10.4f} {:>10.4f} {:>10.4f} {:>10.4f}'.format(
+        scenario, kilobots, shape, physics, r['step_ms'], r['overlap'], str(r['on_table']), r['object_moved'],
+        kilobot_drift, object_drift, object_turn))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--physics', nargs='+', default=['box2d', 'numpy'],
+                        help='the backends to compare, the first one is the reference')
+    parser.add_argument('--scenario', nargs='+', default=['gather', 'push'])
+    parser.add_argument('--kilobots', nargs='+', type=int, default=[100])
+    parser.add_argument('--shape', nargs='+', default=_shapes)
+    parser.add_argument('--test-envs', action='store_true',
+                        help='compare the backends on the environments of gym_kilobots.envs.kilobots_test_envs')
+    parser.add_argument('--steps', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print('{:>23} {:>6} {:>10} {:>8} {:>10} {:>8} {:>9} {:>10} {:>10} {:>10} {:>10}'.format(
+        'scenario', 'kbs', 'shape', 'physics', 'ms/step', 'overlap', 'on table', 'obj moved', 'kb drift', 'obj drift',
+        'obj turn'))
+    if args.test_envs:
+        for name in _test_envs:
+            reference = None
+            for physics in args.physics:
+                np.random.seed(args.seed)
+                try:
+                    r = run_env(make_test_env(name, physics), args.steps)
+                except Exception as e:
+                    print('{:>23} skipped, cannot be stepped with {}: {!r}'.format(name, physics, e))
+                    break
+                if reference is None:
+                    reference = r
+                print_result(name, r['kilobots'], '-', physics, r, reference)
+        return
+
+    for scenario in args.scenario:
+        for kilobots in args.kilobots:
+            for shape in args.shape:
+                reference = None
+                for physics in args.physics:
+                    r = run(scenario, kilobots, shape, physics, args.steps, args.seed)
+                    if reference is None:
+                        reference = r
+                    print_result(scenario, kilobots, shape, physics, r, reference)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""benchmarks YamlKilobotsEnv for different swarm sizes, kilobot classes, objects and lights
+
+Each case runs in a fresh process and reports steps/s, resets/s, the peak resident memory and the mean time per step
+of each phase of step (see gym_kilobots.kb_profiling). The results are written as JSON and can be compared to the
+results of another commit, regressions larger than --threshold let the comparison fail:
+
+    git checkout <old commit> && python benchmarks/scaling.py -o before.json
+    git checkout <new commit> && python benchmarks/scaling.py -o after.json --compare before.json
+
+By default, each dimension is swept on its own around a base case, use --grid to run all combinations. With
+thousands of kilobots the table is crowded and the step time is dominated by the contacts in Box2D.
+"""
+import argparse
+import itertools
+import json
+import multiprocessing as mp
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+_base_case = dict(kilobots=50, kilobot_class='PhototaxisKilobot', shape='quad', objects=1, light='circular')
+
+_sweeps = dict(kilobots=[10, 50, 100, 500, 1000, 5000],
+               kilobot_class=['PhototaxisKilobot', 'SimplePhototaxisKilobot', 'SimpleVelocityControlKilobot'],
+               shape=['quad', 'corner_quad', 'triangle', 'circle', 'l_shape', 't_shape', 'c_shape'],
+               objects=[1, 4, 16],
+               light=['circular', 'momentum', 'linear', 'composite'])
+
+# the metrics that are compared and whether larger values are better
+_metrics = dict(steps_per_s=True, resets_per_s=True, peak_rss_mb=False)
+
+
+def light_configuration(light):
+    if light == 'linear':
+        return dict(obj_type='linear', init='random')
+    if light == 'composite':
+        return dict(obj_type='composite', init='random',
+                    components=[dict(obj_type='circular', init='random', radius=.2) for _ in range(2)])
+    return dict(obj_type=light, init='random', radius=.2)
+
+
+def make_env(case):
+    from gym_kilobots.envs.yaml_kilobots_env import EnvConfiguration, YamlKilobotsEnv
+
+    objects = [dict(idx=i, color=None, shape=case['shape'], width=.15, height=.15, init='random', symmetry=None)
+               for i in range(case['objects'])]
+    conf = EnvConfiguration(width=2., height=1.5, resolution=600, objects=objects,
+                            light=light_configuration(case['light']),
+                            kilobots=dict(num=case['kilobots'], mean='random', std=.3))
+
+    class BenchmarkEnv(YamlKilobotsEnv):
+        def _init_kilobots(self, type=case['kilobot_class']):
+            super()._init_kilobots(type)
+
+    return BenchmarkEnv(configuration=conf)
+
+
+def run_case(case, steps, resets, seed):
+    import numpy as np
+    from gym_kilobots.kb_profiling import PerfStats
+
+    np.random.seed(seed)
+    env = make_env(case)
+
+    t = time.perf_counter()
+    for _ in range(resets):
+        env.reset()
+    resets_per_s = resets / (time.perf_counter() - t)
+
+    action = np.zeros(env.action_space.shape) if env.action_space is not None else None
+    env.perf_stats = PerfStats()
+    t = time.perf_counter()
+    for _ in range(steps):
+        env.step(action)
+    steps_per_s = steps / (time.perf_counter() - t)
+
+    stats = env.perf_stats.mean()
+    env.close()
+
+    return dict(case, steps_per_s=steps_per_s, resets_per_s=resets_per_s,
+                peak_rss_mb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                phases_ms={p: stats[p] * 1e3 for p in PerfStats.phases},
+                counters={c: stats[c] for c in PerfStats.counters})
+
+
+def _run_case(args):
+    return run_case(*args)
+
+
+def cases(grid):
+    if grid:
+        keys = list(_sweeps.keys())
+        for values in itertools.product(*(_sweeps[k] for k in keys)):
+            yield dict(zip(keys, values))
+        return
+
+    # the base value of a dimension is replaced by the first swept value if it is not swept
+    base_case = {k: v if v in _sweeps[k] else _sweeps[k][0] for k, v in _base_case.items()}
+    seen = []
+    for key, values in _sweeps.items():
+        for value in values:
+            case = dict(base_case, **{key: value})
+            if case not in seen:
+                seen.append(case)
+                yield case
+
+
+def metadata():
+    import Box2D
+    import numpy as np
+
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                         cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return dict(commit=commit, time=time.strftime('%Y-%m-%dT%H:%M:%S'), python=platform.python_version(),
+                numpy=np.__version__, box2d=Box2D.__version__, platform=platform.platform())
+
+
+def compare(results, reference, threshold):
+    """prints the relative change of each metric, returns the number of regressions larger than threshold"""
+    def key(r):
+        return tuple(r[k] for k in _base_case)
+
+    reference = {key(r): r for r in reference['results']}
+    regressions = 0
+    print('{:<60} {:>14} {:>14} {:>14}'.format('case', *_metrics))
+    for r in results['results']:
+        ref = reference.get(key(r))
+        if ref is None:
+            continue
+        changes = []
+        for metric, larger_is_better in _metrics.items():
+            change = r[metric] / ref[metric] - 1
+            regressed = (-change if larger_is_better else change) > threshold
+            regressions += regressed
+            changes.append('{:+.1%}{}'.format(change, ' !' if regressed else '  '))
+        print('{:<60} {:>14} {:>14} {:>14}'.format(' '.join(str(v) for v in key(r)), *changes))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    for key, values in _sweeps.items():
+        parser.add_argument('--' + key.replace('_', '-'), nargs='+', type=type(values[0]), default=None,
+                            help='values of {} to sweep (default: {})'.format(key, ' '.join(map(str, values))))
+    parser.add_argument('--grid', action='store_true', help='run all combinations instead of one sweep per dimension')
+    parser.add_argument('--steps', type=int, default=10)
+    parser.add_argument('--resets', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', default='benchmark_results.json')
+    parser.add_argument('--compare', default=None, help='JSON results of a previous run to compare with')
+    parser.add_argument('--threshold', type=float, default=.1,
+                        help='relative change that counts as regression when comparing')
+    args = parser.parse_args()
+
+    for key in _sweeps:
+        values = getattr(args, key)
+        if values is not None:
+            _sweeps[key] = values
+
+    results = dict(metadata=metadata(), steps=args.steps, resets=args.resets, results=[])
+    # a fresh process per case such that the peak memory and the caches of one case do not affect the others
+    ctx = mp.get_context('spawn')
+    with ctx.Pool(1, maxtasksperchild=1) as pool:
+        for case in cases(args.grid):
+            r = pool.apply(_run_case, ((case, args.steps, args.resets, args.seed),))
+            results['results'].append(r)
+            print('{kilobots:>5} {kilobot_class:>28} {shape:>12} {objects:>3} {light:>10}: '
+                  '{steps_per_s:9.2f} steps/s {resets_per_s:9.2f} resets/s {peak_rss_mb:8.1f} MB'.format(**r))
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            reference = json.load(f)
+        if compare(results, reference, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
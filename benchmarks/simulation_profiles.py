@@ -0,0 +1,119 @@
+"""measures how far the simulation profiles of KilobotsEnv (see gym_kilobots.lib.simulation) diverge from the
+'accurate' profile and what they cost
+
+Each scenario is run from the same initial state with the accurate profile and with every other profile. After each
+step, the positions of the kilobots and the poses of the objects are compared with those of the accurate run. For
+each profile, the time per step, the mean and the largest kilobot deviation (in meters, over all kilobots and steps),
+the deviation of the kilobots after the last step and the largest position and orientation deviation of the objects
+are reported:
+
+    python benchmarks/simulation_profiles.py
+    python benchmarks/simulation_profiles.py --profiles fast default fast,velocity_iterations=6 --steps 50
+
+A profile is a name, optionally followed by values that replace those of the named profile. The scenarios are those
+of benchmarks/physics_backends.py: 'gather' (PhototaxisKilobots gathering at a circular light) and 'push'
+(SimplePhototaxisKilobots that are driven by a linear light against an object). The kilobots of a dense swarm push
+each other, thus their trajectories are chaotic and the deviations grow with the number of steps for any profile.
+"""
+import argparse
+import time
+
+import numpy as np
+
+_shapes = ['quad', 'triangle', 'circle', 'l_shape', 'c_shape']
+
+
+def parse_profile(text):
+    from gym_kilobots.lib.simulation import make_profile
+
+    name, *overrides = text.split(',')
+    overrides = dict(override.split('=') for override in overrides)
+    return make_profile(name, **{key: int(value) for key, value in overrides.items()})
+
+
+def make_env(scenario, kilobots, shape, simulation):
+    from gym_kilobots.envs.yaml_kilobots_env import EnvConfiguration, YamlKilobotsEnv
+
+    if scenario == 'gather':
+        kilobot_class = 'PhototaxisKilobot'
+        objects = [dict(idx=0, color=None, shape=shape, width=.15, height=.15, init='random', symmetry=None)]
+        light = dict(obj_type='circular', init='random', radius=.2)
+        spawn = dict(num=kilobots, mean='light', std=.1)
+    else:
+        kilobot_class = 'SimplePhototaxisKilobot'
+        objects = [dict(idx=0, color=None, shape=shape, width=.15, height=.15, init=[.0, .0, .0], symmetry=None)]
+        light = dict(obj_type='linear', init=.0)
+        spawn = dict(num=kilobots, mean=[-.2, .0], std=.04)
+    conf = EnvConfiguration(width=2., height=1.5, resolution=600, objects=objects, light=light, kilobots=spawn)
+
+    class BenchmarkEnv(YamlKilobotsEnv):
+        def _init_kilobots(self, type=kilobot_class):
+            super()._init_kilobots(type)
+
+    return BenchmarkEnv(configuration=conf, simulation=simulation)
+
+
+def run(scenario, kilobots, shape, simulation, steps, seed):
+    """the kilobot positions and object poses after each step and the time per step"""
+    np.random.seed(seed)
+    env = make_env(scenario, kilobots, shape, simulation)
+    env.reset()
+    action = np.zeros(env.action_space.shape) if env.action_space is not None else None
+
+    kilobot_positions = np.empty((steps, kilobots, 2))
+    object_poses = np.empty((steps, len(env.objects), 3))
+    duration = .0
+    for step in range(steps):
+        t = time.perf_counter()
+        env.step(action)
+        duration += time.perf_counter() - t
+        state = env.get_state()
+        kilobot_positions[step] = state['kilobots'][:, :2]
+        object_poses[step] = np.asarray(state['objects']).reshape((-1, 3))
+    env.close()
+    return dict(step_ms=duration / steps * 1e3, kilobots=kilobot_positions, objects=object_poses)
+
+
+def divergence(result, reference):
+    kilobot_deviation = np.linalg.norm(result['kilobots'] - reference['kilobots'], axis=2)
+    object_deviation = np.linalg.norm(result['objects'][..., :2] - reference['objects'][..., :2], axis=2)
+    # the difference of the orientations wrapped to [-pi, pi)
+    object_turn = np.abs((result['objects'][..., 2] - reference['objects'][..., 2] + np.pi) % (2 * np.pi) - np.pi)
+    return dict(kb_mean=kilobot_deviation.mean(), kb_max=kilobot_deviation.max(),
+                kb_final=kilobot_deviation[-1].mean(), obj_max=object_deviation.max(initial=.0),
+                obj_turn=object_turn.max(initial=.0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profiles', nargs='+', default=['fast', 'default'],
+                        help='the profiles to compare with the accurate profile, e.g., fast,velocity_iterations=6')
+    parser.add_argument('--reference', default='accurate', help='the profile the others are compared with')
+    parser.add_argument('--scenario', nargs='+', default=['gather', 'push'])
+    parser.add_argument('--kilobots', nargs='+', type=int, default=[10, 100])
+    parser.add_argument('--shape', nargs='+', default=['quad', 'c_shape'], choices=_shapes)
+    parser.add_argument('--steps', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    reference_profile = parse_profile(args.reference)
+    profiles = [(text, parse_profile(text)) for text in args.profiles]
+
+    print('{:>8} {:>5} {:>8} {:>32} {:>9} {:>9} {:>9} {:>9} {:>9} {:>9}'.format(
+        'scenario', 'kbs', 'shape', 'profile', 'ms/step', 'kb mean', 'kb max', 'kb final', 'obj max', 'obj turn'))
+    for scenario in args.scenario:
+        for kilobots in args.kilobots:
+            for shape in args.shape:
+                reference = run(scenario, kilobots, shape, reference_profile, args.steps, args.seed)
+                print('{:>8} {:>5} {:>8} {:>32} {:>9.1f}'.format(scenario, kilobots, shape, args.reference,
+                                                                  reference['step_ms']))
+                for text, profile in profiles:
+                    r = run(scenario, kilobots, shape, profile, args.steps, args.seed)
+                    d = divergence(r, reference)
+                    print('{:>8} {:>5} {:>8} {:>32} {:>9.1f} {:>9.4f} {:>9.4f} {:>9.4f} {:>9.4f} {:>9.4f}'.format(
+                        scenario, kilobots, shape, text, r['step_ms'], d['kb_mean'], d['kb_max'], d['kb_final'],
+                        d['obj_max'], d['obj_turn']))
+
+
+if __name__ == '__main__':
+    main()
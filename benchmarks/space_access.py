@@ -0,0 +1,51 @@
+"""measures the cost of accessing the spaces of a YamlKilobotsEnv
+
+The spaces are cached by the environment, this script compares an access to the cached spaces with building the
+spaces (and the spaces they are composed of) anew on every access as it was done before the spaces were cached.
+
+    python benchmarks/space_access.py --kilobots 10 100 1000
+"""
+import argparse
+import timeit
+
+from gym_kilobots.envs import YamlKilobotsEnv
+from gym_kilobots.envs.yaml_kilobots_env import EnvConfiguration
+
+_spaces = ('state_space', 'observation_space', 'kilobots_state_space', 'object_observation_space')
+
+
+def make_env(num_kilobots, num_objects):
+    objects = [dict(idx=i, color=None, shape='quad', width=.15, height=.15, init='random', symmetry=None)
+               for i in range(num_objects)]
+    conf = EnvConfiguration(width=2., height=1.5, resolution=600, objects=objects,
+                            light=dict(obj_type='circular', init='random', radius=.2),
+                            kilobots=dict(num=num_kilobots, mean='random', std=.5))
+    env = YamlKilobotsEnv(configuration=conf)
+    env.reset()
+    return env
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--kilobots', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--objects', type=int, default=4)
+    parser.add_argument('--number', type=int, default=1000)
+    args = parser.parse_args()
+
+    print('{:>10} {:>26} {:>14} {:>14}'.format('kilobots', 'space', 'uncached [us]', 'cached [us]'))
+    for num_kilobots in args.kilobots:
+        env = make_env(num_kilobots, args.objects)
+        for name in _spaces:
+            def uncached_access():
+                env._space_cache.clear()
+                return getattr(env, name)
+
+            uncached = timeit.timeit(uncached_access, number=args.number) / args.number
+            getattr(env, name)
+            cached = timeit.timeit(lambda: getattr(env, name), number=args.number) / args.number
+            print('{:>10} {:>26} {:>14.2f} {:>14.2f}'.format(num_kilobots, name, uncached * 1e6, cached * 1e6))
+        env.close()
+
+
+if __name__ == '__main__':
+    main()
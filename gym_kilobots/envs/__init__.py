@@ -1,3 +1,5 @@
 from .kilobots_env import KilobotsEnv
 from .yaml_kilobots_env import YamlKilobotsEnv
-from .direct_control_kilobots_env import DirectControlKilobotsEnv
\ No newline at end of file
+from .direct_control_kilobots_env import DirectControlKilobotsEnv
+from .vector_kilobots_env import VectorKilobotsEnv
+from .subproc_kilobots_env import SubprocVectorKilobotsEnv
\ No newline at end of file
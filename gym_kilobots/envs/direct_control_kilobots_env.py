@@ -2,14 +2,14 @@ import abc
 
 import numpy as np
 from gym import spaces
-from .kilobots_env import KilobotsEnv
+from .kilobots_env import KilobotsEnv, cached_space
 
 
 class DirectControlKilobotsEnv(KilobotsEnv):
     def __init__(self, **kwargs):
         super(DirectControlKilobotsEnv, self).__init__(**kwargs)
 
-    @property
+    @cached_space
     def action_space(self):
         as_low = np.array([kb.action_space.low for kb in self._kilobots])
         as_high = np.array([kb.action_space.high for kb in self._kilobots])
@@ -1,18 +1,62 @@
+import functools
+import random
 import time
 
 import gym
 
 import numpy as np
 
-from Box2D import b2World, b2ChainShape
+from Box2D import b2ChainShape, b2World
 
-from ..lib.body import Body, _world_scale
+from ..kb_profiling import PerfStats, _no_perf_stats
+from ..lib.body import Body, PoseCache, _world_scale
+from ..lib.contacts import ContactImpulses, ContactIndex
+from ..lib.convergence import FastForward
+from ..lib.hybrid import HybridStepping
 from ..lib.kilobot import Kilobot
-from ..lib.light import Light
+from ..lib.light import Light, LightCache
+from ..lib.messaging import Messaging
+from ..lib.physics import make_world
+from ..lib.simulation import AdaptiveIterations, SimulationProfile, make_profile
+from ..lib.swarm import KilobotSwarm
 
 import abc
 
 
+def _light_spaces(light):
+    if light is None:
+        return None, None
+    return light.observation_space, light.action_space
+
+
+def cached_space(build):
+    """turns a method that builds a space into a property that caches the space
+
+    The cached spaces are rebuilt only if kilobots or objects are added or removed or if the light is replaced by a
+    light with different spaces. The bounds of the cached spaces are read-only.
+    """
+    name = build.__name__
+
+    @functools.wraps(build)
+    def get_space(self):
+        key = len(self._kilobots), len(self._objects), self._light
+        if self._space_cache_key != key:
+            # a new light (e.g., after reset) keeps the cache if its spaces did not change
+            if self._space_cache_key is None or self._space_cache_key[:2] != key[:2] \
+                    or _light_spaces(self._space_cache_key[2]) != _light_spaces(self._light):
+                self._space_cache = {}
+            self._space_cache_key = key
+        if name not in self._space_cache:
+            space = build(self)
+            if isinstance(space, gym.spaces.Box):
+                space.low.flags.writeable = False
+                space.high.flags.writeable = False
+            self._space_cache[name] = space
+        return self._space_cache[name]
+
+    return property(get_space)
+
+
 class KilobotsEnv(gym.Env):
     metadata = {'render.modes': ['human']}
 
@@ -22,14 +66,13 @@ class KilobotsEnv(gym.Env):
     _observe_objects = False
     _observe_light = True
 
-    __sim_steps_per_second = 10
-    __sim_velocity_iterations = 10
-    __sim_position_iterations = 10
-    __steps_per_action = 10
+    # the default physics backend, see gym_kilobots.lib.physics
+    physics = 'box2d'
+
+    # the default simulation profile, see gym_kilobots.lib.simulation
+    simulation = 'default'
 
     def __new__(cls, **kwargs):
-        cls.sim_steps_per_second = cls.__sim_steps_per_second
-        cls.sim_step = 1. / cls.__sim_steps_per_second
         cls.world_x_range = -cls.world_width / 2, cls.world_width / 2
         cls.world_y_range = -cls.world_height / 2, cls.world_height / 2
         cls.world_bounds = (np.array([-cls.world_width / 2, -cls.world_height / 2]),
@@ -37,12 +80,24 @@ class KilobotsEnv(gym.Env):
 
         return super(KilobotsEnv, cls).__new__(cls)
 
-    def __init__(self, **kwargs):
+    def __init__(self, physics: str = None, simulation=None, **kwargs):
+        """
+        :param physics: str the physics backend, defaults to the class attribute physics
+        :param simulation: the simulation profile, either the name of a profile, a SimulationProfile or a dict of
+                           values that replace those of the profile of the class attribute simulation
+        """
         self.__sim_steps = 0
         self.__reset_counter = 0
 
-        # create the Kilobots world in Box2D
-        self.world = b2World(gravity=(0, 0), doSleep=True)
+        # the rates and solver iterations of the simulation, the profile can be replaced between steps
+        if isinstance(simulation, dict):
+            simulation = make_profile(self.simulation, **simulation)
+        self.simulation: SimulationProfile = make_profile(self.simulation if simulation is None else simulation)
+
+        # create the Kilobots world with the physics backend, Box2D by default
+        if physics is not None:
+            self.physics = physics
+        self.world = make_world(self.physics)
         self.table = self.world.CreateStaticBody(position=(.0, .0))
         self.table.CreateFixture(
             shape=b2ChainShape(vertices=[(_world_scale * self.world_x_range[0], _world_scale * self.world_y_range[1]),
@@ -53,10 +108,19 @@ class KilobotsEnv(gym.Env):
 
         # add kilobots
         self._kilobots: [Kilobot] = []
+        self._swarm: KilobotSwarm = None
         # add objects
         self._objects: [Body] = []
+        self._object_poses: PoseCache = None
         # add light
         self._light: Light = None
+        # index of the touching bodies, created on first access of contacts and updated on the first access after a
+        # world step
+        self._contact_index: ContactIndex = None
+        self._world_steps = 0
+
+        self._space_cache = {}
+        self._space_cache_key = None
 
         self.__seed = 0
 
@@ -64,6 +128,32 @@ class KilobotsEnv(gym.Env):
         self.render_mode = 'human'
         self.video_path = None
 
+        # if True, get_state returns the kilobot states as read-only view on the swarm arrays which is updated in place
+        self.state_views = False
+
+        # assign a PerfStats object to collect the timings of the phases of step
+        self.perf_stats: PerfStats = None
+
+        # reuses the light values of the kilobots between sub-steps, set light_cache.tolerance to reuse the values
+        # for kilobots that moved less than the tolerance
+        self.light_cache = LightCache()
+
+        # assign a ContactImpulses object to accumulate the impulses on the objects during each step, the totals are
+        # added to the info returned by step
+        self.contact_impulses: ContactImpulses = None
+
+        # assign a Messaging object to deliver the IR messages of the kilobots before each sub-step
+        self.messaging: Messaging = None
+
+        # assign a HybridStepping object to integrate the kilobots that are far from other bodies outside of Box2D
+        self.hybrid_stepping: HybridStepping = None
+
+        # assign an AdaptiveIterations object to choose the solver iterations of each world step from the contacts
+        self.adaptive_iterations: AdaptiveIterations = None
+
+        # assign a FastForward object to skip the sub-steps while the swarm rests at a static light
+        self.fast_forward: FastForward = None
+
         self._configure_environment()
         self._kilobots = []
 
@@ -73,10 +163,20 @@ class KilobotsEnv(gym.Env):
     def _sim_steps(self):
         return self.__sim_steps
 
+    @_sim_steps.setter
+    def _sim_steps(self, sim_steps):
+        self.__sim_steps = sim_steps
+
     @property
     def kilobots(self):
         return tuple(self._kilobots)
 
+    @property
+    def swarm(self) -> KilobotSwarm:
+        if self._swarm is None or not self._swarm.holds(self._kilobots):
+            self._swarm = KilobotSwarm(self._kilobots)
+        return self._swarm
+
     @property
     def num_kilobots(self):
         return len(self._kilobots)
@@ -85,6 +185,29 @@ class KilobotsEnv(gym.Env):
     def objects(self):
         return tuple(self._objects)
 
+    @property
+    def object_poses(self) -> PoseCache:
+        if self._object_poses is None or not self._object_poses.holds(self._objects):
+            self._object_poses = PoseCache(self._objects)
+            self._object_poses.sync()
+        return self._object_poses
+
+    @property
+    def contacts(self) -> ContactIndex:
+        """index of the touching kilobots, objects and walls
+
+        The index is built from the contacts of the Box2D world on the first access after a world step, access it
+        again after each step instead of keeping it. Environments that never query contacts do not pay for it.
+        """
+        if not isinstance(self.world, b2World):
+            raise NotImplementedError('the contact index requires the box2d physics backend')
+        if self._contact_index is None:
+            self._contact_index = ContactIndex()
+        if not self._contact_index.holds(self._kilobots, self._objects):
+            self._contact_index.register(self.table, self._kilobots, self._objects)
+        self._contact_index.update(self.world, self._world_steps)
+        return self._contact_index
+
     @property
     def action_space(self):
         if self._light:
@@ -98,9 +221,17 @@ class KilobotsEnv(gym.Env):
     def state_space(self):
         return NotImplemented
 
+    @property
+    def sim_steps_per_second(self):
+        return self.simulation.steps_per_second
+
+    @property
+    def sim_step(self):
+        return self.simulation.sim_step
+
     @property
     def _steps_per_action(self):
-        return self.__steps_per_action
+        return self.simulation.steps_per_action
 
     def _add_kilobot(self, kilobot: Kilobot):
         self._kilobots.append(kilobot)
@@ -112,11 +243,66 @@ class KilobotsEnv(gym.Env):
     def _configure_environment(self):
         raise NotImplementedError
 
+    def _reconfigure_environment(self) -> bool:
+        """samples a new initial state for the existing bodies instead of creating new ones
+
+        :return: False if the bodies cannot be reused, reset then destroys them and calls _configure_environment
+        """
+        return False
+
+    def _reset_world(self):
+        """prepares the world for an episode with the bodies that _reconfigure_environment reused
+
+        _reconfigure_environment sets the poses and velocities of the bodies, setting body.transform makes Box2D look
+        for the new contacts of the body right away. Box2D keeps the contacts that still overlap with their impulses
+        for warm starting and the sleep timers of the bodies, thus the episode is not bit-identical to one with new
+        bodies, the poses differ up to the tolerance of the solver.
+        """
+        self.world.ClearForces()
+
     def get_state(self):
-        return {'kilobots': np.array([k.get_state() for k in self._kilobots]),
-                'objects': np.array([o.get_state() for o in self._objects]),
+        kilobots_state = self.swarm.get_state()
+        if not self.state_views:
+            kilobots_state = np.array(kilobots_state)
+        if self._objects and all(type(o).get_state is Body.get_state for o in self._objects):
+            objects_state = self.object_poses.poses.copy()
+        else:
+            objects_state = np.array([o.get_state() for o in self._objects])
+        return {'kilobots': kilobots_state,
+                'objects': objects_state,
                 'light': self._light.get_state()}
 
+    def snapshot(self):
+        """captures the state of the simulation to branch from it with restore
+
+        The snapshot holds the Box2D state of all bodies, the kilobot and controller arrays, the light state, the sim
+        step counter and the state of the random number generators. Box2D does not expose its contact cache, after a
+        restore the bodies start without the warm starting of the contacts at the time of the snapshot. Thus, a
+        restored simulation with touching bodies is only equal to the original up to float32 rounding.
+        """
+        return {'sim_steps': self.__sim_steps,
+                'kilobots': self.swarm.snapshot(),
+                'objects': self.object_poses.snapshot(),
+                'light': self._light.snapshot() if self._light else None,
+                'np_random': np.random.get_state(),
+                'random': random.getstate()}
+
+    def restore(self, snapshot):
+        """sets the simulation to a snapshot of this environment, the bodies are not recreated
+
+        A snapshot can be restored as long as the kilobots and objects were not added or removed, i.e., not across
+        resets that change the number of bodies.
+        """
+        self.__sim_steps = snapshot['sim_steps']
+        self.swarm.restore(snapshot['kilobots'])
+        self.object_poses.restore(snapshot['objects'])
+        if self._light:
+            self._light.restore(snapshot['light'])
+        np.random.set_state(snapshot['np_random'])
+        random.setstate(snapshot['random'])
+        if self.fast_forward is not None:
+            self.fast_forward.interrupt()
+
     def get_observation(self):
         return self.get_state()
 
@@ -133,6 +319,12 @@ class KilobotsEnv(gym.Env):
     def destroy(self):
         del self._objects[:]
         del self._kilobots[:]
+        self._swarm = None
+        self._object_poses = None
+        if self._contact_index is not None:
+            self._contact_index.invalidate()
+        if self.contact_impulses is not None:
+            self.contact_impulses.invalidate()
         del self._light
         self._light = None
         if self._screen is not None:
@@ -149,9 +341,14 @@ class KilobotsEnv(gym.Env):
 
     def reset(self):
         self.__reset_counter += 1
-        self.destroy()
-        self._configure_environment()
+        if self._reconfigure_environment():
+            self._reset_world()
+        else:
+            self.destroy()
+            self._configure_environment()
         self.__sim_steps = 0
+        if self.fast_forward is not None:
+            self.fast_forward.interrupt()
 
         # step to resolve
         self._step_world()
@@ -162,61 +359,152 @@ class KilobotsEnv(gym.Env):
         # if self.action_space and action is not None:
         #     assert self.action_space.contains(action), "%r (%s) invalid " % (action, type(action))
 
+        stats = self.perf_stats or _no_perf_stats
+        stats.start_step()
+
         # state before action is applied
         state = self.get_state()
+        if self.state_views:
+            # the kilobot states are updated in place during the step
+            state['kilobots'] = state['kilobots'].copy()
+        stats.lap('get_state')
 
-        for i in range(self.__steps_per_action):
+        if self.contact_impulses is not None:
+            self.contact_impulses.clear()
+
+        for i in range(self.simulation.steps_per_action):
             _t_step_start = time.time()
             # step light
-            if action is not None and self._light:
-                self._light.step(action, self.sim_step)
+            self._step_light(action)
+            stats.lap('light_step')
 
-            if self._light:
+            # skip the sub-step if the swarm rests at the light
+            if not self._skip_sub_step(stats):
                 # compute light values and gradients
-                sensor_positions = np.array([kb.light_sensor_pos() for kb in self._kilobots])
-                values, gradients = self._light.value_and_gradients(sensor_positions)
+                self._update_light_values(stats)
 
-                for kb, v, g in zip(self._kilobots, values, gradients):
-                    kb.set_light_value_and_gradient(v, g)
+                self._step_messaging(stats)
 
-            # step kilobots
-            for k in self._kilobots:
-                k.step(self.sim_step)
+                # step kilobots
+                self._step_kilobots()
+                stats.lap('kilobots')
 
-            # step world
-            self.world.Step(self.sim_step, self.__sim_velocity_iterations, self.__sim_position_iterations)
-            self.world.ClearForces()
+                # step world
+                self._step_world(stats)
+                stats.lap('world_step')
+
+                self._observe_sub_step(stats)
 
             self.__sim_steps += 1
 
             if self._screen is not None:
                 self.render(self.render_mode)
+                stats.lap('render')
 
             _t_step_end = time.time()
 
             if self._real_time:
                 time.sleep(max(self.sim_step - (_t_step_end - _t_step_start), .0))
+                stats.lap('sleep')
 
         # state
         next_state = self.get_state()
+        stats.lap('get_state')
 
         # observation
         observation = self.get_observation()
+        stats.lap('observation')
 
         # reward
         reward = self.get_reward(state, action, next_state)
+        stats.lap('reward')
 
         # done
         done = self.has_finished(next_state, action)
+        stats.lap('done')
 
         # info
-        info = self.get_info(next_state, action)
+        info = self._add_impulse_info(self.get_info(next_state, action))
+        stats.lap('info')
+
+        stats.end_step(self.world)
 
         return observation, reward, done, info
 
-    def _step_world(self):
-        self.world.Step(self.sim_step, self.__sim_velocity_iterations, self.__sim_position_iterations)
-        self.world.ClearForces()
+    def _add_impulse_info(self, info):
+        if self.contact_impulses is None:
+            return info
+        if not info:
+            info = {}
+        elif not isinstance(info, dict):
+            info = {'info': info}
+        info['contact_impulses'] = self.contact_impulses.totals()
+        return info
+
+    # the phases of a sub-step, VectorKilobotsEnv runs them for several environments
+    def _step_light(self, action):
+        if action is not None and self._light:
+            self._light.step(action, self.sim_step)
+
+    def _skip_sub_step(self, stats) -> bool:
+        if self.fast_forward is None:
+            return False
+        skip = self.fast_forward.skip(self)
+        stats.lap('fast_forward')
+        return skip
+
+    def _update_light_values(self, stats):
+        if self._light:
+            values, gradients = self.light_cache.value_and_gradients(self._light, self._light_sensor_positions())
+            self._set_light_values_and_gradients(values, gradients)
+            stats.lap('light_values')
+
+    def _step_messaging(self, stats):
+        if self.messaging is not None:
+            self.messaging.step(self.swarm)
+            stats.lap('messaging')
+
+    def _observe_sub_step(self, stats):
+        if self.fast_forward is not None:
+            self.fast_forward.observe(self)
+            stats.lap('fast_forward')
+
+    def _light_sensor_positions(self):
+        return self.swarm.light_sensor_positions()
+
+    def _set_light_values_and_gradients(self, values, gradients):
+        self.swarm.set_light_values_and_gradients(values, gradients)
+
+    def _step_kilobots(self):
+        self.swarm.step(self.sim_step)
+
+    def _step_world(self, stats=None):
+        stats = stats or self.perf_stats or _no_perf_stats
+        profile = self.simulation
+        for _ in range(profile.physics_steps):
+            if self.hybrid_stepping is not None and self._kilobots:
+                self.hybrid_stepping.step(self.swarm, [self.table] + [o._body for o in self._objects],
+                                          profile.physics_step)
+
+            velocity_iterations, position_iterations = profile.velocity_iterations, profile.position_iterations
+            if self.adaptive_iterations is not None:
+                velocity_iterations, position_iterations = self.adaptive_iterations.choose(
+                    self.world, self.swarm, profile, [self.table] + [o._body for o in self._objects])
+            stats.count('velocity_iterations', velocity_iterations)
+            stats.count('position_iterations', position_iterations)
+
+            self.world.Step(profile.physics_step, velocity_iterations, position_iterations)
+            self.world.ClearForces()
+            self._world_steps += 1
+            self.swarm.invalidate()
+
+            if self.contact_impulses is not None:
+                self.contact_impulses.accumulate(self._kilobots, self._objects)
+
+        # Box2D moved the bodies, read all poses again
+        self.object_poses.invalidate()
+        self.swarm.sync()
+        self.object_poses.sync()
 
     def render(self, mode=None):
         # if close:
@@ -0,0 +1,204 @@
+import multiprocessing as mp
+import random
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+
+
+def _attach(specs):
+    shms, arrays = {}, {}
+    for key, (name, shape, dtype) in specs.items():
+        shms[key] = shared_memory.SharedMemory(name=name)
+        # the parent owns the shared memory, prevent the worker from unlinking it at exit
+        resource_tracker.unregister(shms[key]._name, 'shared_memory')
+        arrays[key] = np.ndarray(shape, dtype=dtype, buffer=shms[key].buf)
+    return shms, arrays
+
+
+def _as_dict(observation):
+    # flat observations are stored under a single key
+    if isinstance(observation, dict):
+        return observation
+    return {'': observation}
+
+
+def _write_observation(arrays, prefix, index, observation):
+    for key, value in _as_dict(observation).items():
+        arrays[prefix + key][index] = value
+
+
+def _seed_process(seed):
+    # the environments sample from the global random generators
+    np.random.seed(seed)
+    random.seed(seed)
+
+
+def _worker(index, remote, parent_remote, env_fn, seed):
+    parent_remote.close()
+    _seed_process(seed)
+    env = env_fn()
+    shms, arrays = {}, {}
+    try:
+        observation = env.reset()
+        action_shape = env.action_space.shape if env.action_space is not None else (0,)
+        remote.send(({k: (np.shape(v), np.asarray(v).dtype.str) for k, v in _as_dict(observation).items()},
+                     action_shape))
+
+        while True:
+            cmd, data = remote.recv()
+            if cmd == 'step':
+                action = arrays['action'][index] if data else None
+                observation, reward, done, info = env.step(action)
+                if done:
+                    _write_observation(arrays, 'terminal_', index, observation)
+                    observation = env.reset()
+                _write_observation(arrays, 'obs_', index, observation)
+                arrays['reward'][index] = reward
+                arrays['done'][index] = done
+                remote.send(info)
+            elif cmd == 'reset':
+                _write_observation(arrays, 'obs_', index, env.reset())
+                remote.send(None)
+            elif cmd == 'attach':
+                shms, arrays = _attach(data)
+                remote.send(None)
+            elif cmd == 'seed':
+                if data is not None:
+                    _seed_process(data)
+                remote.send(env.seed(data))
+            elif cmd == 'call':
+                name, args, kwargs = data
+                remote.send(getattr(env, name)(*args, **kwargs))
+            elif cmd == 'close':
+                break
+            else:
+                raise NotImplementedError('unknown command {}'.format(cmd))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        del arrays
+        for shm in shms.values():
+            shm.close()
+        env.close()
+        remote.close()
+
+
+class SubprocVectorKilobotsEnv(object):
+    """runs one KilobotsEnv per child process and collects their states in shared memory
+
+    The workers write the kilobot, object and light states directly into shared NumPy arrays, only the (small) info
+    objects are sent back through the pipes. Environments that are done after a step are reset automatically, their
+    last observation is kept in terminal_observations.
+
+    :param env_fns: picklable callables without arguments that create the environments, e.g.,
+                    functools.partial(YamlKilobotsEnv, configuration=conf)
+    :param start_method: the multiprocessing start method, uses the platform default if None
+    :param seed: the base seed, worker i seeds np.random and random with seed + i before it creates its environment.
+                 If None, the base seed is drawn from np.random, forked workers would otherwise share the random state
+                 of the parent and sample the same episodes.
+    """
+    def __init__(self, env_fns, start_method=None, seed=None):
+        self.num_envs = len(env_fns)
+        self._waiting = False
+        self._closed = True
+        if seed is None:
+            seed = np.random.randint(2 ** 31)
+
+        ctx = mp.get_context(start_method)
+        self._remotes, self._work_remotes = zip(*[ctx.Pipe() for _ in range(self.num_envs)])
+        self._processes = []
+        for index, (work_remote, remote, env_fn) in enumerate(zip(self._work_remotes, self._remotes, env_fns)):
+            process = ctx.Process(target=_worker, args=(index, work_remote, remote, env_fn, seed + index),
+                                  daemon=True)
+            process.start()
+            self._processes.append(process)
+            work_remote.close()
+
+        specs = [remote.recv() for remote in self._remotes]
+        observation_spec, action_shape = specs[0]
+        assert all(s == specs[0] for s in specs), 'all environments need states and actions of the same shape'
+
+        buffer_specs = {'action': (action_shape, np.float64), 'reward': ((), np.float64), 'done': ((), np.bool_)}
+        for key, (shape, dtype) in observation_spec.items():
+            buffer_specs['obs_' + key] = shape, np.dtype(dtype)
+            buffer_specs['terminal_' + key] = shape, np.dtype(dtype)
+        self._observation_keys = tuple(observation_spec.keys())
+
+        self._shms, self._arrays, attach_specs = {}, {}, {}
+        for key, (shape, dtype) in buffer_specs.items():
+            shape = (self.num_envs,) + tuple(shape)
+            nbytes = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+            self._shms[key] = shared_memory.SharedMemory(create=True, size=nbytes)
+            self._arrays[key] = np.ndarray(shape, dtype=dtype, buffer=self._shms[key].buf)
+            attach_specs[key] = self._shms[key].name, shape, np.dtype(dtype).str
+
+        for remote in self._remotes:
+            remote.send(('attach', attach_specs))
+        for remote in self._remotes:
+            remote.recv()
+        self._closed = False
+
+    @property
+    def terminal_observations(self):
+        return self._get_observations('terminal_')
+
+    def _get_observations(self, prefix):
+        if self._observation_keys == ('',):
+            return self._arrays[prefix].copy()
+        return {k: self._arrays[prefix + k].copy() for k in self._observation_keys}
+
+    def reset(self):
+        for remote in self._remotes:
+            remote.send(('reset', None))
+        for remote in self._remotes:
+            remote.recv()
+        return self._get_observations('obs_')
+
+    def step_async(self, actions):
+        if actions is not None:
+            self._arrays['action'][:] = actions
+        for remote in self._remotes:
+            remote.send(('step', actions is not None))
+        self._waiting = True
+
+    def step_wait(self):
+        infos = [remote.recv() for remote in self._remotes]
+        self._waiting = False
+        return (self._get_observations('obs_'), self._arrays['reward'].copy(), self._arrays['done'].copy(),
+                infos)
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def env_method(self, name, *args, **kwargs):
+        for remote in self._remotes:
+            remote.send(('call', (name, args, kwargs)))
+        return [remote.recv() for remote in self._remotes]
+
+    def seed(self, seed=None):
+        """seeds the random generators and the environment of worker i with seed + i"""
+        for i, remote in enumerate(self._remotes):
+            remote.send(('seed', None if seed is None else seed + i))
+        return [remote.recv() for remote in self._remotes]
+
+    def close(self):
+        if self._closed:
+            return
+        if self._waiting:
+            for remote in self._remotes:
+                remote.recv()
+        for remote in self._remotes:
+            remote.send(('close', None))
+        for process in self._processes:
+            process.join()
+
+        del self._arrays
+        for shm in self._shms.values():
+            shm.close()
+            shm.unlink()
+        self._closed = True
+
+    def __del__(self):
+        if not getattr(self, '_closed', True):
+            self.close()
@@ -0,0 +1,198 @@
+import numpy as np
+
+from .yaml_kilobots_env import YamlKilobotsEnv
+from ..kb_profiling import PerfStats, _no_perf_stats
+from ..lib.light import LightCache
+from ..lib.swarm import KilobotSwarm
+
+
+class VectorKilobotsEnv(object):
+    """steps num_envs independent copies of a YamlKilobotsEnv in lock-step
+
+    Each copy owns its own Box2D world, but all sub-step phases of KilobotsEnv.step are run as one pass over all
+    copies, so that lights of the same type are evaluated for all environments in a single batched call and the
+    kilobots of all environments are stepped as a single swarm. Observations, rewards and dones are returned as arrays
+    stacked along the first axis.
+
+    The rewards and dones are computed by get_reward and has_finished of each environment, unless batch_reward and
+    batch_done are set to functions that compute them for all environments at once from the stacked states.
+    """
+    def __init__(self, num_envs: int, *, configuration, env_class=YamlKilobotsEnv, **kwargs):
+        assert num_envs > 0, 'num_envs must be a positive integer'
+        self.num_envs = num_envs
+        self.envs = [env_class(configuration=configuration, **kwargs) for _ in range(num_envs)]
+
+        self.sim_step = self.envs[0].sim_step
+
+        self._swarm: KilobotSwarm = None
+        self._env_swarms = ()
+
+        # assign a PerfStats object to collect the timings of the phases of step, the phases of the environments are
+        # configured on the environments, e.g., their light_cache, messaging and fast_forward
+        self.perf_stats: PerfStats = None
+
+        # batch_reward(states, actions, new_states) and batch_done(states, actions) return the rewards and dones of all
+        # environments as arrays of length num_envs, the states are stacked like the observations
+        self.batch_reward = None
+        self.batch_done = None
+
+    @property
+    def swarm(self) -> KilobotSwarm:
+        env_swarms = tuple(env.swarm for env in self.envs)
+        if self._swarm is None or any(a is not b for a, b in zip(env_swarms, self._env_swarms)):
+            self._swarm = KilobotSwarm.concatenate(env_swarms)
+            self._env_swarms = env_swarms
+        return self._swarm
+
+    @property
+    def action_space(self):
+        return self.envs[0].action_space
+
+    @property
+    def observation_space(self):
+        return self.envs[0].observation_space
+
+    @property
+    def state_space(self):
+        return self.envs[0].state_space
+
+    def seed(self, seed=None):
+        return [env.seed(seed) for env in self.envs]
+
+    def _drop_swarm(self):
+        # the concatenated swarm holds the kilobots of the environments, they have to be released before the
+        # environments destroy their bodies
+        self._swarm = None
+        self._env_swarms = ()
+
+    def reset(self):
+        self._drop_swarm()
+        return self._stack_states([env.reset() for env in self.envs])
+
+    def get_state(self):
+        return self._stack_states([env.get_state() for env in self.envs])
+
+    def get_observation(self):
+        return self._stack_states([env.get_observation() for env in self.envs])
+
+    def get_rewards(self, states, actions, new_states):
+        if self.batch_reward is not None:
+            return np.asarray(self.batch_reward(states, actions, new_states), dtype=np.float64)
+        rewards = np.empty(self.num_envs)
+        for i, env in enumerate(self.envs):
+            rewards[i] = env.get_reward(self._unstack_state(states, i), actions[i],
+                                        self._unstack_state(new_states, i))
+        return rewards
+
+    def get_dones(self, states, actions):
+        if self.batch_done is not None:
+            return np.asarray(self.batch_done(states, actions), dtype=bool)
+        return np.array([env.has_finished(self._unstack_state(states, i), action)
+                         for i, (env, action) in enumerate(zip(self.envs, actions))])
+
+    def step(self, actions: np.ndarray):
+        if actions is None:
+            actions = [None] * self.num_envs
+
+        stats = self.perf_stats or _no_perf_stats
+        stats.start_step()
+
+        # states before actions are applied
+        states = self.get_state()
+        stats.lap('get_state')
+
+        for env in self.envs:
+            if env.contact_impulses is not None:
+                env.contact_impulses.clear()
+
+        for i in range(self.envs[0]._steps_per_action):
+            # step lights
+            for env, action in zip(self.envs, actions):
+                env._step_light(action)
+            stats.lap('light_step')
+
+            # the environments whose swarms rest at their lights skip the sub-step
+            envs = [env for env in self.envs if not env._skip_sub_step(stats)]
+
+            # compute light values and gradients
+            self._update_light_values(envs, stats)
+
+            # deliver messages, each environment has its own table
+            for env in envs:
+                env._step_messaging(stats)
+
+            # step kilobots
+            if len(envs) == self.num_envs:
+                self.swarm.step(self.sim_step)
+            else:
+                for env in envs:
+                    env._step_kilobots()
+            stats.lap('kilobots')
+
+            # step worlds
+            for env in envs:
+                env._step_world(stats)
+            stats.lap('world_step')
+
+            for env in envs:
+                env._observe_sub_step(stats)
+            for env in self.envs:
+                env._sim_steps += 1
+
+        # states
+        next_states = self.get_state()
+        stats.lap('get_state')
+
+        # observations
+        observations = self.get_observation()
+        stats.lap('observation')
+
+        # rewards
+        rewards = self.get_rewards(states, actions, next_states)
+        stats.lap('reward')
+
+        # dones
+        dones = self.get_dones(next_states, actions)
+        stats.lap('done')
+
+        # infos
+        infos = [env._add_impulse_info(env.get_info(self._unstack_state(next_states, i), action))
+                 for i, (env, action) in enumerate(zip(self.envs, actions))]
+        stats.lap('info')
+
+        stats.end_step(*(env.world for env in self.envs))
+
+        return observations, rewards, dones, infos
+
+    def _update_light_values(self, envs, stats):
+        # the lights are evaluated in one batched call if all environments step and have lights of the same type
+        lights = [env.get_light() for env in envs]
+        if len(envs) == self.num_envs and lights[0] is not None and all(type(l) is type(lights[0]) for l in lights):
+            sensor_positions = [env._light_sensor_positions() for env in envs]
+            if len(set(p.shape for p in sensor_positions)) == 1:
+                values, gradients = LightCache.batch_value_and_gradients([env.light_cache for env in envs], lights,
+                                                                         np.stack(sensor_positions))
+                self.swarm.set_light_values_and_gradients(values.reshape(-1), gradients.reshape((-1, 2)))
+                stats.lap('light_values')
+                return
+
+        for env in envs:
+            env._update_light_values(stats)
+
+    def render(self, mode=None):
+        return self.envs[0].render(mode)
+
+    def close(self):
+        self._drop_swarm()
+        for env in self.envs:
+            env.close()
+
+    @staticmethod
+    def _stack_states(states):
+        if not isinstance(states[0], dict):
+            return np.stack(states)
+        return {k: np.stack([s[k] for s in states]) for k in states[0]}
+
+    @staticmethod
+    def _unstack_state(states, i):
+        return {k: v[i] for k, v in states.items()}
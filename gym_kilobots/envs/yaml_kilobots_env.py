@@ -9,8 +9,9 @@ from gym import spaces
 import gym_kilobots
 from gym_kilobots.lib import CircularGradientLight, GradientLight, Quad, CornerQuad, Triangle, Circle, LForm, TForm, \
     CForm, CompositeLight
+from gym_kilobots.lib.body import _world_scale
 from gym_kilobots.lib.light import MomentumLight, SinglePositionLight
-from .kilobots_env import KilobotsEnv, UnknownLightTypeException, UnknownObjectException
+from .kilobots_env import KilobotsEnv, UnknownLightTypeException, UnknownObjectException, cached_space
 
 
 class EnvConfiguration(yaml.YAMLObject):
@@ -46,10 +47,13 @@ class EnvConfiguration(yaml.YAMLObject):
     class LightConfiguration(yaml.YAMLObject):
         yaml_tag = '!LightConf'
 
-        def __init__(self, obj_type, init, radius=None):
+        def __init__(self, obj_type, init, radius=None, components=None):
             self.type = obj_type
             self.init = init
             self.radius = radius
+            if components is not None:
+                # the lights of a composite light
+                self.components = [c if isinstance(c, type(self)) else type(self)(**c) for c in components]
 
         def __eq__(self, other):
             for k in self.__dict__:
@@ -98,6 +102,192 @@ def rot_matrix(alpha):
                      [np.sin(alpha), np.cos(alpha)]])
 
 
+class FlatObservationWriter(object):
+    """writes the observation described by YamlKilobotsEnv.observation_space into a reusable float32 buffer
+
+    The layout is computed once for the number of kilobots and objects and the light state size of an environment:
+    the x, y positions of all kilobots, the light state (if the light is observed), and x, y, sin(theta), cos(theta)
+    for each object.
+    """
+    def __init__(self, num_kilobots: int, num_objects: int, light_size: int, zero_copy: bool = False):
+        self.layout = num_kilobots, num_objects, light_size
+        self.zero_copy = zero_copy
+        # the light and the numbers of kilobots and objects the layout was computed for, see bind
+        self._bound = None
+
+        self.buffer = np.zeros(2 * num_kilobots + light_size + 4 * num_objects, dtype=np.float32)
+
+        self._kilobots = self.buffer[:2 * num_kilobots].reshape((num_kilobots, 2))
+        self._light = self.buffer[2 * num_kilobots:2 * num_kilobots + light_size]
+        self._objects = self.buffer[2 * num_kilobots + light_size:].reshape((num_objects, 4))
+
+    @classmethod
+    def layout_of(cls, env: 'YamlKilobotsEnv'):
+        light_size = np.size(env.get_light().get_state()) if env.light_observation_space else 0
+        return env.num_kilobots, len(env.objects), light_size
+
+    @classmethod
+    def bind(cls, env: 'YamlKilobotsEnv', writer: 'FlatObservationWriter' = None) -> 'FlatObservationWriter':
+        """a writer for the layout of env, writer is returned if its layout still fits
+
+        The layout is only computed again if the light or the numbers of kilobots or objects changed, computing the
+        size of the light state calls get_state of the light.
+        """
+        light, num_kilobots, num_objects = env.get_light(), env.num_kilobots, len(env.objects)
+        if writer is not None and writer._bound is not None and writer._bound[0] is light \
+                and writer._bound[1:] == (num_kilobots, num_objects):
+            return writer
+        layout = cls.layout_of(env)
+        if writer is None or writer.layout != layout:
+            writer = cls(*layout)
+        writer._bound = light, num_kilobots, num_objects
+        return writer
+
+    def write(self, env: 'YamlKilobotsEnv') -> np.ndarray:
+        self._kilobots[:] = env.swarm.poses[:, :2]
+        if self._light.size:
+            self._light[:] = env.get_light().get_state()
+        if self._objects.size:
+            object_poses = env.object_poses.poses
+            self._objects[:, :2] = object_poses[:, :2]
+            np.sin(object_poses[:, 2], out=self._objects[:, 2])
+            np.cos(object_poses[:, 2], out=self._objects[:, 3])
+
+        if self.zero_copy:
+            return self.buffer
+        return self.buffer.copy()
+
+
+class InitialStateSampler(object):
+    """samples the initial states of a configuration without access to an environment
+
+    The sampler only reads the configuration and the world bounds it was created with, the sampling methods of
+    YamlKilobotsEnv delegate to it. All random numbers are drawn from rng, which defaults to np.random.
+
+    :param conf: EnvConfiguration the configuration the states are sampled for
+    :param world_size: (float, float) the width and height of the world
+    :param world_bounds: (np.ndarray, np.ndarray) the lower left and upper right corner of the world
+    """
+    def __init__(self, conf, world_size, world_bounds):
+        self.conf = conf
+        self.world_size = world_size
+        self.world_bounds = world_bounds
+
+    def random_object_init(self, rng=np.random):
+        init_position = rng.rand(2) * np.asarray(self.world_size) + self.world_bounds[0]
+        init_position *= 0.7
+        init_orientation = rng.rand() * 2 * np.pi - np.pi
+        return np.r_[init_position, init_orientation]
+
+    def object_init(self, object_init, rng=np.random):
+        if isinstance(object_init, str) and object_init == 'random':
+            object_init = self.random_object_init(rng)
+            # other_obj_pos = np.array([o.get_position() for o in self._objects])
+            # _counter = 0
+            # while True:
+            #     object_init = self._get_random_object_init()
+            #     if len(self._objects) == 0:
+            #         break
+            #     dists = np.linalg.norm(other_obj_pos - object_init[:2], axis=1)
+            #     if np.all(dists > np.max((object_width, object_height))):
+            #         break
+            #     _counter += 1
+            #     if _counter > 30:
+            #         raise Exception('Could not find init position for object after 30 iterations.')
+        return object_init
+
+    def random_light_init(self, at_object=False, rng=np.random, objects=()):
+        """
+        :param objects: list of (position, extent) of the objects to place the light at
+        """
+        if at_object:
+            position, extent = objects[rng.choice(len(objects), 1)[0]]
+            init_position = np.array(position, dtype=np.float64)
+            radius = 1.2 * extent / 2
+            angle = rng.rand() * 2 * np.pi - np.pi
+            init_position += (np.cos(angle) * radius, np.sin(angle) * radius)
+        else:
+            init_position = rng.rand(2) * np.asarray(self.world_size) + self.world_bounds[0]
+        return init_position
+
+    def light(self, light_config, rng=np.random, objects=()):
+        light = None
+        if light_config.type in ['circular', 'momentum']:
+            light_bounds = np.array(self.world_bounds) * 1.1
+
+            if light_config.init == 'random':
+                init_position = self.random_light_init(rng=rng)
+            elif light_config.init == 'object':
+                init_position = self.random_light_init(at_object=True, rng=rng, objects=objects)
+            else:
+                init_position = light_config.init
+
+            if light_config.type == 'circular':
+                action_bounds = np.array([-1, -1]) * .01, np.array([1, 1]) * .01
+                light = CircularGradientLight(position=init_position, radius=light_config.radius,
+                                              bounds=light_bounds, action_bounds=action_bounds)
+            elif light_config.type == 'momentum':
+                init_angle = rng.rand() * 2 * np.pi - np.pi
+                init_velocity = np.array([np.sin(init_angle), np.cos(init_angle)]) * .01
+                max_velocity = .01
+                action_bounds = np.array([-1, -1]) * .01, np.array([1, 1]) * .01
+                light = MomentumLight(position=init_position, velocity=init_velocity,
+                                      max_velocity=max_velocity, radius=light_config.radius,
+                                      bounds=light_bounds, action_bounds=action_bounds)
+
+        elif light_config.type == 'linear':
+            if light_config.init == 'random':
+                # sample initial angle from a uniform between -pi and pi
+                light = GradientLight(angle=rng.rand() * 2 * np.pi - np.pi)
+            else:
+                light = GradientLight(angle=light_config.init)
+
+        elif light_config.type == 'composite':
+            lights = []
+            components = light_config.components
+            if light_config.init == 'random':
+                if rng is np.random:
+                    shuffle(components)
+                else:
+                    # another generator does not shuffle the configuration in place
+                    components = [components[i] for i in rng.permutation(len(components))]
+            for _c in components:
+                lights.append(self.light(_c, rng, objects))
+            light = CompositeLight(lights)
+
+        else:
+            raise UnknownLightTypeException()
+
+        return light
+
+    def kilobot_positions(self, rng=np.random, light=None):
+        num_kilobots = self.conf.kilobots.num
+        spawn_mean = self.conf.kilobots.mean
+        spawn_std = self.conf.kilobots.std
+
+        if isinstance(spawn_mean, str) and spawn_mean == 'light':
+            if isinstance(light, SinglePositionLight):
+                spawn_mean = light.get_position()
+            elif isinstance(light, CompositeLight):
+                lights_positions = np.asarray([_l.get_position() for _l in light.lights])
+                idx = rng.choice(np.arange(len(lights_positions)), num_kilobots)
+                spawn_mean = lights_positions[idx]
+            else:
+                spawn_mean = 'random'
+        if isinstance(spawn_mean, str) and spawn_mean == 'random':
+            spawn_mean = rng.rand(2) * np.asarray(self.world_size) + self.world_bounds[0]
+            spawn_mean *= 0.9
+
+        # draw the kilobots positions from a normal with mean and variance selected above
+        kilobot_positions = rng.normal(scale=spawn_std, size=(num_kilobots, 2))
+        kilobot_positions += spawn_mean
+
+        # assert for each kilobot that it is within the world bounds
+        kilobot_positions = np.maximum(kilobot_positions, self.world_bounds[0] + 0.02)
+        kilobot_positions = np.minimum(kilobot_positions, self.world_bounds[1] - 0.02)
+        return kilobot_positions
+
+
 class YamlKilobotsEnv(KilobotsEnv):
     def __new__(cls, *, configuration, **kwargs):
         cls.world_width = configuration.width
@@ -113,11 +303,32 @@ class YamlKilobotsEnv(KilobotsEnv):
     def __eq__(self, other):
         return self.conf == other.conf
 
-    def __init__(self, *, configuration, **kwargs):
+    def __init__(self, *, configuration, flat_observation=False, zero_copy_observation=False, pooled_reset=False,
+                 **kwargs):
+        """
+        :param configuration: EnvConfiguration the configuration of the environment
+        :param flat_observation: bool if True, get_observation returns the flat float32 vector described by
+                                 observation_space instead of the state dict
+        :param zero_copy_observation: bool if True, the flat observation is returned without copy, i.e., the same
+                                      buffer is returned and overwritten in each step
+        :param pooled_reset: bool if True, reset keeps the Box2D bodies as long as the shapes of the objects and the
+                             number of kilobots in the configuration do not change and only samples new poses for them.
+                             The sampled initial states are the same as with a reset that creates new bodies, the
+                             episodes differ where Box2D resolves overlapping bodies in another order (see
+                             KilobotsEnv._reset_world)
+        """
         self.conf = configuration
         self._progress_factor = 1.
         self._iteration_counter = 0
 
+        self.flat_observation = flat_observation
+        self.zero_copy_observation = zero_copy_observation
+        self._observation_writer: FlatObservationWriter = None
+
+        self.pooled_reset = pooled_reset
+        # configuration key and snapshots of the bodies right after they were created
+        self._pool = None
+
         super().__init__(**kwargs)
 
     @property
@@ -141,12 +352,47 @@ class YamlKilobotsEnv(KilobotsEnv):
     def inc_iteration_counter(self):
         self._iteration_counter += 1
 
+    def _initial_state_sampler(self) -> InitialStateSampler:
+        return InitialStateSampler(self.conf, self.world_size, self.world_bounds)
+
     def _configure_environment(self):
         self._init_objects()
         self._init_light()
         self._init_kilobots()
 
-    @property
+        if self.pooled_reset:
+            self._pool = self._pool_key(), self.object_poses.snapshot(), self.swarm.snapshot()
+
+    def _pool_key(self):
+        return [(o.shape, o.width, o.height, o.color) for o in self.conf.objects], self.conf.kilobots.num
+
+    def _reconfigure_environment(self):
+        if not self.pooled_reset or self._pool is None:
+            return False
+        key, objects_snapshot, kilobots_snapshot = self._pool
+        if key != self._pool_key() or len(self._objects) != len(self.conf.objects) \
+                or len(self._kilobots) != self.conf.kilobots.num:
+            return False
+
+        # sample in the same order as _configure_environment, the light may be placed relative to the objects
+        object_dynamics = objects_snapshot[0].copy()
+        for i, o in enumerate(self.conf.objects):
+            object_init = np.asarray(self._sample_object_init(o.init), dtype=np.float64)
+            # the positions are rounded like those of new bodies, which are passed to Box2D as b2Vec2 of float32
+            object_dynamics[i, :2] = (object_init[:2] * _world_scale).astype(np.float32)
+            object_dynamics[i, 2] = object_init[2]
+        self.object_poses.restore((object_dynamics, objects_snapshot[1]))
+
+        self._light = None
+        self._init_light()
+
+        kilobot_dynamics = kilobots_snapshot['bodies'][0].copy()
+        kilobot_dynamics[:, :2] = (self._sample_kilobot_positions() * _world_scale).astype(np.float32)
+        self.swarm.restore(dict(kilobots_snapshot, bodies=(kilobot_dynamics, kilobots_snapshot['bodies'][1])))
+
+        return True
+
+    @cached_space
     def state_space(self):
         _state_space_low = self.kilobots_state_space.low
         _state_space_high = self.kilobots_state_space.high
@@ -159,7 +405,7 @@ class YamlKilobotsEnv(KilobotsEnv):
 
         return spaces.Box(low=_state_space_low, high=_state_space_high, dtype=np.float32)
 
-    @property
+    @cached_space
     def observation_space(self):
         _observation_spaces_low = self.kilobots_state_space.low
         _observation_spaces_high = self.kilobots_state_space.high
@@ -175,43 +421,40 @@ class YamlKilobotsEnv(KilobotsEnv):
         return spaces.Box(low=_observation_spaces_low, high=_observation_spaces_high,
                           dtype=np.float32)
 
+    def get_flat_observation(self) -> np.ndarray:
+        self._observation_writer = FlatObservationWriter.bind(self, self._observation_writer)
+        self._observation_writer.zero_copy = self.zero_copy_observation
+        return self._observation_writer.write(self)
+
+    def get_observation(self):
+        if self.flat_observation:
+            return self.get_flat_observation()
+        return super().get_observation()
+
     def _init_objects(self):
         for o in self.conf.objects:
             self._init_object(o.shape, o.width, o.height, o.init, o.color)
 
-    @property
+    @cached_space
     def object_state_space(self):
         objects_low = np.array([self.world_x_range[0], self.world_y_range[0], -np.inf] * len(self._objects))
         objects_high = np.array([self.world_x_range[1], self.world_y_range[1], np.inf] * len(self._objects))
         return spaces.Box(low=objects_low, high=objects_high, dtype=np.float64)
 
-    @property
+    @cached_space
     def object_observation_space(self):
         objects_obs_low = np.array([self.world_x_range[0], self.world_y_range[0], -1., -1.] * len(self._objects))
         objects_obs_high = np.array([self.world_x_range[1], self.world_y_range[1], 1., 1.] * len(self._objects))
         return spaces.Box(low=objects_obs_low, high=objects_obs_high, dtype=np.float64)
 
-    def _get_random_object_init(self):
-        init_position = np.random.rand(2) * np.asarray(self.world_size) + self.world_bounds[0]
-        init_position *= 0.7
-        init_orientation = np.random.rand() * 2 * np.pi - np.pi
-        return np.r_[init_position, init_orientation]
+    def _get_random_object_init(self, rng=np.random):
+        return self._initial_state_sampler().random_object_init(rng)
+
+    def _sample_object_init(self, object_init, rng=np.random):
+        return self._initial_state_sampler().object_init(object_init, rng)
 
     def _init_object(self, object_shape, object_width, object_height, object_init, object_color=None):
-        if object_init == 'random':
-            object_init = self._get_random_object_init()
-            # other_obj_pos = np.array([o.get_position() for o in self._objects])
-            # _counter = 0
-            # while True:
-            #     object_init = self._get_random_object_init()
-            #     if len(self._objects) == 0:
-            #         break
-            #     dists = np.linalg.norm(other_obj_pos - object_init[:2], axis=1)
-            #     if np.all(dists > np.max((object_width, object_height))):
-            #         break
-            #     _counter += 1
-            #     if _counter > 30:
-            #         raise Exception('Could not find init position for object after 30 iterations.')
+        object_init = self._sample_object_init(object_init)
 
         if object_shape in ['square', 'quad', 'rect']:
             obj = Quad(width=object_width, height=object_height,
@@ -253,58 +496,21 @@ class YamlKilobotsEnv(KilobotsEnv):
 
         self._light = self._init_light_from_config(self.conf.light)
 
-    def _get_random_light_init(self, at_object=False):
-        if at_object:
-            which_object = self._objects[np.random.choice(len(self._objects), 1)[0]]
-            init_position = which_object.get_position()
-            radius = 1.2 * max(which_object.width, which_object.height) / 2
-            angle = np.random.rand() * 2 * np.pi - np.pi
-            init_position += (np.cos(angle) * radius, np.sin(angle) * radius)
-        else:
-            init_position = np.random.rand(2) * np.asarray(self.world_size) + self.world_bounds[0]
-        return init_position
-
-    def _init_light_from_config(self, light_config):
-        light = None
-        if light_config.type in ['circular', 'momentum']:
-            light_bounds = np.array(self.world_bounds) * 1.1
-
-            if light_config.init == 'random':
-                init_position = self._get_random_light_init()
-            elif light_config.init == 'object':
-                init_position = self._get_random_light_init(at_object=True)
-            else:
-                init_position = light_config.init
-
-            if light_config.type == 'circular':
-                action_bounds = np.array([-1, -1]) * .01, np.array([1, 1]) * .01
-                light = CircularGradientLight(position=init_position, radius=light_config.radius,
-                                              bounds=light_bounds, action_bounds=action_bounds)
-            elif light_config.type == 'momentum':
-                init_angle = np.random.rand() * 2 * np.pi - np.pi
-                init_velocity = np.array([np.sin(init_angle), np.cos(init_angle)]) * .01
-                max_velocity = .01
-                action_bounds = np.array([-1, -1]) * .01, np.array([1, 1]) * .01
-                light = MomentumLight(position=init_position, velocity=init_velocity,
-                                      max_velocity=max_velocity, radius=light_config.radius,
-                                      bounds=light_bounds, action_bounds=action_bounds)
-
-        elif light_config.type == 'linear':
-            # sample initial angle from a uniform between -pi and pi
-            light = GradientLight(angle=light_config.init)
-
-        elif light_config.type == 'composite':
-            lights = []
-            if light_config.init == 'random':
-                shuffle(light_config.components)
-            for _c in light_config.components:
-                lights.append(self._init_light_from_config(_c))
-            light = CompositeLight(lights)
-
-        else:
-            raise UnknownLightTypeException()
-
-        return light
+    def _get_random_light_init(self, at_object=False, rng=np.random, objects=None):
+        """
+        :param objects: list of (position, extent) to place the light at, uses the objects of the environment if None
+        """
+        if at_object and objects is None:
+            objects = [(o.get_position(), max(o.width, o.height)) for o in self._objects]
+        return self._initial_state_sampler().random_light_init(at_object, rng, objects)
+
+    def _init_light_from_config(self, light_config, rng=np.random, objects=None):
+        """
+        :param objects: list of (position, extent) to place the light at, uses the objects of the environment if None
+        """
+        if objects is None:
+            objects = [(o.get_position(), max(o.width, o.height)) for o in self._objects]
+        return self._initial_state_sampler().light(light_config, rng, objects)
 
     @property
     def action_space(self):
@@ -324,42 +530,24 @@ class YamlKilobotsEnv(KilobotsEnv):
             return self._light.observation_space
         return None
 
-    def _init_kilobots(self, type='SimplePhototaxisKilobot'):
-        num_kilobots = self.conf.kilobots.num
-        spawn_mean = self.conf.kilobots.mean
-        spawn_std = self.conf.kilobots.std
+    def _sample_kilobot_positions(self, rng=np.random, light=None):
+        if light is None:
+            light = self._light
+        return self._initial_state_sampler().kilobot_positions(rng, light)
 
-        if isinstance(spawn_mean, str) and spawn_mean == 'light':
-            if isinstance(self._light, SinglePositionLight):
-                spawn_mean = self._light.get_position()
-            elif isinstance(self._light, CompositeLight):
-                lights_positions = np.asarray([_l.get_position() for _l in self._light.lights])
-                idx = np.random.choice(np.arange(len(lights_positions)), num_kilobots)
-                spawn_mean = lights_positions[idx]
-            else:
-                spawn_mean = 'random'
-        if isinstance(spawn_mean, str) and spawn_mean == 'random':
-            spawn_mean = np.random.rand(2) * np.asarray(self.world_size) + self.world_bounds[0]
-            spawn_mean *= 0.9
-
-        # draw the kilobots positions from a normal with mean and variance selected above
-        kilobot_positions = np.random.normal(scale=spawn_std, size=(num_kilobots, 2))
-        kilobot_positions += spawn_mean
-
-        # assert for each kilobot that it is within the world bounds and add kilobot to the world
-        for position in kilobot_positions:
-            position = np.maximum(position, self.world_bounds[0] + 0.02)
-            position = np.minimum(position, self.world_bounds[1] - 0.02)
-            kb_class = getattr(gym_kilobots.lib, type)
+    def _init_kilobots(self, type='SimplePhototaxisKilobot'):
+        # add the kilobots to the world
+        kb_class = getattr(gym_kilobots.lib, type)
+        for position in self._sample_kilobot_positions():
             self._add_kilobot(kb_class(self.world, position=position, light=self._light))
 
-    @property
+    @cached_space
     def kilobots_state_space(self):
         kb_low = np.array([self.world_x_range[0], self.world_y_range[0]] * len(self._kilobots))
         kb_high = np.array([self.world_x_range[1], self.world_y_range[1]] * len(self._kilobots))
         return spaces.Box(low=kb_low, high=kb_high, dtype=np.float64)
 
-    @property
+    @cached_space
     def kilobots_observation_space(self):
         kb_low = np.array([self.world_x_range[0], self.world_y_range[0]] * len(self._kilobots))
         kb_high = np.array([self.world_x_range[1], self.world_y_range[1]] * len(self._kilobots))
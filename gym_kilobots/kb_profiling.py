@@ -0,0 +1,87 @@
+import time
+
+
+class PerfStats(object):
+    """collects the time spent in each phase of KilobotsEnv.step and counters of the Box2D world
+
+    Enable the collection by assigning an instance to env.perf_stats. Each phase is timed from the end of the
+    previous phase, the timings of the sub-steps are summed up per step. The solver iterations are summed over the world
+    steps of a step, the other counters are read from the world at the end of a step. The perf_stats of a
+    VectorKilobotsEnv time its steps, the counters are summed over the worlds of its environments.
+
+        env.perf_stats = PerfStats()
+        ...
+        print(env.perf_stats)
+    """
+    phases = ('light_step', 'fast_forward', 'light_values', 'messaging', 'kilobots', 'world_step', 'render', 'sleep',
+              'get_state', 'observation', 'reward', 'done', 'info')
+    counters = ('contacts', 'touching_contacts', 'awake_bodies', 'bodies', 'velocity_iterations',
+                'position_iterations')
+
+    def __init__(self):
+        self.steps = 0
+        # the timings and counters of the last step and the sums over all steps
+        self.last = dict.fromkeys(self.phases + self.counters, 0)
+        self.total = dict.fromkeys(self.phases + self.counters, 0)
+        self._lap = .0
+
+    def reset(self):
+        self.__init__()
+
+    def start_step(self):
+        for k in self.last:
+            self.last[k] = 0
+        self._lap = time.perf_counter()
+
+    def lap(self, phase):
+        """adds the time since the last lap to phase"""
+        now = time.perf_counter()
+        self.last[phase] += now - self._lap
+        self._lap = now
+
+    def count(self, counter, value):
+        """adds value to counter"""
+        self.last[counter] += value
+
+    def end_step(self, *worlds):
+        self.last['contacts'] = sum(world.contactCount for world in worlds)
+        self.last['touching_contacts'] = sum(1 for world in worlds for c in world.contacts if c.touching)
+        self.last['awake_bodies'] = sum(1 for world in worlds for b in world.bodies if b.awake)
+        self.last['bodies'] = sum(world.bodyCount for world in worlds)
+
+        self.steps += 1
+        for k, v in self.last.items():
+            self.total[k] += v
+
+    def mean(self):
+        """the mean timings (in seconds) and counters per step"""
+        return {k: v / max(self.steps, 1) for k, v in self.total.items()}
+
+    def __str__(self):
+        mean = self.mean()
+        step_time = sum(mean[p] for p in self.phases)
+        lines = ['{:>19} {:>10} {:>7}'.format('phase', 'ms/step', '%')]
+        for p in self.phases:
+            lines.append('{:>19} {:>10.3f} {:>7.1f}'.format(p, mean[p] * 1e3, 100 * mean[p] / max(step_time, 1e-12)))
+        lines.append('{:>19} {:>10.3f}'.format('total', step_time * 1e3))
+        for c in self.counters:
+            lines.append('{:>19} {:>10.1f}'.format(c, mean[c]))
+        return '\n'.join(lines)
+
+
+class _NoPerfStats(object):
+    # stands in for PerfStats if the collection is disabled
+    def start_step(self):
+        pass
+
+    def lap(self, phase):
+        pass
+
+    def count(self, counter, value):
+        pass
+
+    def end_step(self, *worlds):
+        pass
+
+
+_no_perf_stats = _NoPerfStats()
@@ -1,4 +1,11 @@
 from .kilobot import Kilobot, PhototaxisKilobot, SimplePhototaxisKilobot, SimpleVelocityControlKilobot,\
     SimpleAccelerationControlKilobot
 from .body import Body, Quad, CornerQuad, Triangle, Circle, CForm, TForm, LForm
-from .light import CircularGradientLight, GradientLight, CompositeLight
+from .light import CircularGradientLight, GradientLight, CompositeLight, SmoothGridLight
+from .swarm import KilobotSwarm
+from .contacts import ContactImpulses, ContactIndex
+from .messaging import Messaging, SpatialHash
+from .hybrid import HybridStepping
+from .physics import NumpyWorld, make_world
+from .simulation import AdaptiveIterations, SimulationProfile, make_profile
+from .convergence import FastForward
@@ -3,10 +3,91 @@ import abc
 import numpy as np
 import Box2D
 
+from .physics import batch_rows
+
 
 _world_scale = 25.
 
 
+def transform_points(points: np.ndarray, x, y, angle) -> np.ndarray:
+    """transforms points from the local frames given by x, y, angle into the world frame, broadcasts over all inputs"""
+    c, s = np.cos(angle), np.sin(angle)
+    return np.stack((x + c * points[..., 0] - s * points[..., 1], y + s * points[..., 0] + c * points[..., 1]),
+                    axis=-1)
+
+
+class PoseCache(object):
+    """keeps the poses of a group of bodies in one array that is filled from Box2D in a single pass
+
+    Each body holds a view on its row of the pose array and on the shared valid flag. As long as the cache is valid,
+    the bodies read their poses from it instead of from Box2D. The cache has to be invalidated whenever Box2D moves
+    the bodies, i.e., after each world step.
+    """
+    def __init__(self, bodies):
+        self._source = bodies
+        self._bodies = tuple(bodies)
+        self._b2_bodies = [b._body for b in self._bodies]
+        # the bodies of a NumpyWorld are read at once from its arrays
+        self._rows = batch_rows(self._b2_bodies)
+
+        self.poses = np.zeros((len(self._bodies), 3))
+        self.valid = np.zeros((), dtype=bool)
+        for body, pose in zip(self._bodies, self.poses):
+            body._bind_pose(pose, self.valid)
+
+    def __len__(self):
+        return len(self._bodies)
+
+    def holds(self, bodies) -> bool:
+        return bodies is self._source and len(bodies) == len(self._bodies)
+
+    def view_on(self, other: 'PoseCache', start: int):
+        """lets this cache refer to the rows of other starting at start, other has to hold the same bodies"""
+        self.poses = other.poses[start:start + len(self._bodies)]
+        self.valid = other.valid
+
+    def invalidate(self):
+        self.valid[()] = False
+
+    def sync(self, idx: np.ndarray = None):
+        """reads the poses of all bodies (or of the bodies idx) from Box2D"""
+        if self._rows is not None:
+            world, rows = self._rows
+            idx = slice(None) if idx is None else idx
+            self.poses[idx, :2] = world._position[rows[idx]]
+            self.poses[idx, 2] = world._angle[rows[idx]]
+            self.poses[idx, :2] /= _world_scale
+        elif idx is not None:
+            self.poses[idx] = [(b.position.x, b.position.y, b.angle)
+                               for b in map(self._b2_bodies.__getitem__, idx.tolist())]
+            self.poses[idx, :2] /= _world_scale
+        elif self._b2_bodies:
+            self.poses[:] = [(b.position.x, b.position.y, b.angle) for b in self._b2_bodies]
+            self.poses[:, :2] /= _world_scale
+        self.valid[()] = True
+
+    def snapshot(self):
+        """captures the Box2D state (pose, velocities, awake flag) and the snapshot attributes of all bodies"""
+        dynamics = np.array([(*b.position, b.angle, *b.linearVelocity, b.angularVelocity, b.awake)
+                             for b in self._b2_bodies]).reshape((-1, 7))
+        return dynamics, [body.snapshot() for body in self._bodies]
+
+    def restore(self, snapshot):
+        """sets the bodies to a snapshot taken from the same bodies, the bodies are not recreated"""
+        dynamics, attributes = snapshot
+        if len(dynamics) != len(self._bodies):
+            raise ValueError('snapshot of {} bodies cannot be restored to {} bodies'.format(len(dynamics),
+                                                                                             len(self._bodies)))
+        for b, (x, y, angle, vx, vy, w, awake) in zip(self._b2_bodies, dynamics.tolist()):
+            b.transform = (x, y), angle
+            b.linearVelocity = vx, vy
+            b.angularVelocity = w
+            b.awake = bool(awake)
+        for body, a in zip(self._bodies, attributes):
+            body.restore(a)
+        self.sync()
+
+
 class Body:
     _density = 2
     _friction = 0.01
@@ -48,21 +129,53 @@ class Body:
     def __del__(self):
         self._world.DestroyBody(self._body)
 
+    # attributes besides the Box2D state that change during a step and are captured by snapshot
+    _snapshot_attributes = ()
+
+    def snapshot(self):
+        if self._snapshot_attributes:
+            return {name: np.array(getattr(self, name)) for name in self._snapshot_attributes}
+
+    def restore(self, snapshot):
+        if snapshot:
+            for name, value in snapshot.items():
+                setattr(self, name, value.copy())
+
+    # the row of a PoseCache that holds the pose of this body
+    _pose = None
+    _pose_valid = False
+
+    def _bind_pose(self, pose, valid):
+        self._pose = pose
+        self._pose_valid = valid
+
+    def _get_pose_array(self):
+        if self._pose_valid:
+            return self._pose
+        position = self._body.position
+        return np.array((position.x / _world_scale, position.y / _world_scale, self._body.angle))
+
+    def _update_cached_pose(self):
+        if self._pose is not None:
+            position = self._body.position
+            self._pose[:] = position.x / _world_scale, position.y / _world_scale, self._body.angle
+
     def get_position(self):
-        return np.asarray(self._body.position) / _world_scale
+        return self._get_pose_array()[:2].copy()
 
     def set_position(self, position):
         self._body.position = position * _world_scale
+        self._update_cached_pose()
 
     def get_orientation(self):
-        return self._body.angle
+        return float(self._get_pose_array()[2])
 
     def set_orientation(self, orientation):
         self._body.angle = orientation
+        self._update_cached_pose()
 
     def get_pose(self):
-        position = np.asarray(self._body.position) / _world_scale
-        return tuple((*position, self._body.angle))
+        return tuple(self._get_pose_array())
 
     def set_pose(self, pose):
         self.set_position(pose[:2])
@@ -73,21 +186,31 @@ class Body:
         # return tuple((*self._body.position, self._body.angle))
 
     def get_local_point(self, point):
-        return np.asarray(self._body.GetLocalPoint(_world_scale * np.asarray(point))) / _world_scale
+        x, y, angle = self._get_pose_array()
+        c, s = np.cos(angle), np.sin(angle)
+        point = np.asarray(point)
+        dx, dy = point[..., 0] - x, point[..., 1] - y
+        return np.stack((c * dx + s * dy, c * dy - s * dx), axis=-1)
 
     def get_local_orientation(self, angle):
-        return angle - self._body.angle
+        return angle - self.get_orientation()
 
     def get_local_pose(self, pose):
         return tuple((*self.get_local_point(pose[:2]), self.get_local_orientation(pose[2])))
 
     def get_world_point(self, point):
-        return np.asarray(self._body.GetWorldPoint(_world_scale * np.asarray(point))) / _world_scale
+        x, y, angle = self._get_pose_array()
+        return transform_points(np.asarray(point), x, y, angle)
 
     def collides_with(self, other):
+        """whether the body touches the Box2D body other, walks the contacts of the body
+
+        Environments that query many pairs use KilobotsEnv.contacts.collides_with, which answers from the ContactIndex.
+        """
         for contact_edge in self._body.contacts_gen:
             if contact_edge.other == other and contact_edge.contact.touching:
                 return True
+        return False
 
     # def set_color(self, color):
     #     self._color = color
@@ -140,6 +263,7 @@ class Quad(Body):
             restitution=self._restitution,
             # radius=.000001
         )
+        self._local_vertices = np.asarray(self._fixture.shape.vertices) / _world_scale
 
     @property
     def width(self):
@@ -151,7 +275,7 @@ class Quad(Body):
 
     @property
     def vertices(self):
-        return np.asarray([[self._body.GetWorldPoint(v) for v in self._fixture.shape.vertices]]) / _world_scale
+        return self.get_world_point(self._local_vertices)[None]
 
     def draw(self, viewer):
         viewer.draw_polygon(self.vertices[0], filled=True, color=self._color)
@@ -262,7 +386,7 @@ class Polygon(Body):
 
     @property
     def vertices(self):
-        return np.array([[self.get_world_point(v) for v in vertices] for vertices in self.__local_vertices])
+        return self.get_world_point(self.__local_vertices)
 
     @property
     def local_vertices(self):
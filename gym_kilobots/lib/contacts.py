@@ -0,0 +1,220 @@
+from typing import Sequence
+
+import numpy as np
+
+
+class ContactIndex(object):
+    """an index of the touching kilobots, objects and walls that is built from the contacts of the world
+
+    Body.collides_with walks the contacts of a body for each query. The index instead walks world.contacts once after
+    each world step and answers all queries from that pass (KilobotsEnv.contacts builds it on the first access after a
+    step). It is no contact listener: once a listener is installed, pybox2d calls into Python for PreSolve and PostSolve
+    of every touching contact in every world step, which costs more than the pass (see benchmarks/contacts.py). The
+    bodies are identified by their kind (KILOBOT, OBJECT or WALL) and their index in the kilobots or objects of the
+    environment, the table is the only wall.
+
+    The index counts for each kilobot and each object the touching bodies of each kind in the arrays kilobot_counts
+    and object_counts, e.g., object_counts[i, ContactIndex.KILOBOT] is the number of kilobots that touch object i.
+    """
+    KILOBOT, OBJECT, WALL = 0, 1, 2
+    kinds = (KILOBOT, OBJECT, WALL)
+
+    def __init__(self):
+        self._kilobots = None
+        self._objects = None
+        self._num_kilobots = self._num_objects = 0
+        # the (kind, index) of each Box2D body by its hash, the address of the body. Looking up the hash avoids the
+        # comparison of the bodies, which pybox2d implements in Python
+        self._labels = {}
+        # the world step of the contacts in the index
+        self._stamp = None
+        self._clear()
+
+    def _clear(self):
+        # the touching pairs of bodies and the touching bodies of each body
+        self._pairs = set()
+        self._touching = {}
+        self.kilobot_counts = np.zeros((self._num_kilobots, len(self.kinds)), dtype=np.int32)
+        self.object_counts = np.zeros((self._num_objects, len(self.kinds)), dtype=np.int32)
+
+    def holds(self, kilobots: Sequence, objects: Sequence) -> bool:
+        return self._kilobots is kilobots and self._objects is objects and self._num_kilobots == len(kilobots) \
+            and self._num_objects == len(objects)
+
+    def invalidate(self):
+        """drops the labels of the bodies, the index has to be registered again before it is queried"""
+        self._kilobots = self._objects = None
+        self._labels = {}
+        self._stamp = None
+
+    def register(self, table, kilobots: Sequence, objects: Sequence):
+        """labels the bodies, the index is empty until it is updated"""
+        self._kilobots, self._objects = kilobots, objects
+        self._num_kilobots, self._num_objects = len(kilobots), len(objects)
+        self._labels = {hash(table): (self.WALL, 0)}
+        for kind, bodies in ((self.KILOBOT, kilobots), (self.OBJECT, objects)):
+            for i, body in enumerate(bodies):
+                self._labels[hash(body._body)] = kind, i
+        self._stamp = None
+        self._clear()
+
+    def update(self, world, stamp):
+        """builds the index from the touching contacts of the world unless it was built at the same stamp
+
+        :param world: the Box2D world
+        :param stamp: identifies the state of the world, e.g., the number of world steps
+        """
+        if stamp == self._stamp:
+            return
+        self._stamp = stamp
+        self._clear()
+
+        labels = self._labels
+        pairs = self._pairs
+        for contact in world.contacts:
+            if not contact.touching:
+                continue
+            fixture_a, fixture_b = contact.fixtureA, contact.fixtureB
+            if fixture_a.sensor or fixture_b.sensor:
+                continue
+            a, b = labels.get(hash(fixture_a.body)), labels.get(hash(fixture_b.body))
+            if a is not None and b is not None:
+                # bodies with several fixtures (or the edges of the table) can touch with several fixture pairs
+                pairs.add((a, b) if a <= b else (b, a))
+
+        for a, b in pairs:
+            self._touching.setdefault(a, set()).add(b)
+            self._touching.setdefault(b, set()).add(a)
+        if pairs:
+            kind_a, index_a, kind_b, index_b = np.array([a + b for a, b in pairs], dtype=np.intp).T
+            for kind, index, other in ((kind_a, index_a, kind_b), (kind_b, index_b, kind_a)):
+                for counts, counted in ((self.kilobot_counts, self.KILOBOT), (self.object_counts, self.OBJECT)):
+                    of_kind = kind == counted
+                    np.add.at(counts, (index[of_kind], other[of_kind]), 1)
+
+    def touching(self, kind: int, index: int):
+        """the (kind, index) of all bodies that touch the given body"""
+        return sorted(self._touching.get((kind, index), ()))
+
+    def contacts_of_object(self, index: int):
+        return self.touching(self.OBJECT, index)
+
+    def contacts_of_kilobot(self, index: int):
+        return self.touching(self.KILOBOT, index)
+
+    def collides_with(self, body, other) -> bool:
+        """whether two bodies touch, like body.collides_with(other) without walking the contacts of body
+
+        :param body: Body or Box2D body of a kilobot, an object or the table
+        :param other: Body or Box2D body of a kilobot, an object or the table
+        """
+        a = self._labels.get(hash(getattr(body, '_body', body)))
+        b = self._labels.get(hash(getattr(other, '_body', other)))
+        return a is not None and b in self._touching.get(a, ())
+
+    def touching_any(self, kind: int, other_kind: int) -> np.ndarray:
+        """the indices of the kilobots (kind KILOBOT) or objects (kind OBJECT) that touch any body of other_kind"""
+        counts = self.kilobot_counts if kind == self.KILOBOT else self.object_counts
+        return np.flatnonzero(counts[:, other_kind])
+
+    def kilobots_touching_objects(self) -> np.ndarray:
+        return self.touching_any(self.KILOBOT, self.OBJECT)
+
+    def pairs(self, kind_a: int, kind_b: int) -> np.ndarray:
+        """the touching pairs of a body of kind_a and a body of kind_b as array of shape (num_pairs, 2) of indices"""
+        if kind_a <= kind_b:
+            pairs = sorted((i, j) for (ka, i), (kb, j) in self._pairs if ka == kind_a and kb == kind_b)
+        else:
+            pairs = sorted((j, i) for (ka, i), (kb, j) in self._pairs if ka == kind_b and kb == kind_a)
+        return np.array(pairs, dtype=np.intp).reshape((-1, 2))
+
+
+class ContactImpulses(object):
+    """accumulates the contact impulses that act on the objects over the sub-steps of a step
+
+    After each world step, Box2D keeps the normal and tangent impulses that its solver applied in the manifold points
+    of the contacts (the impulses that a post-solve callback would report). Instead of a callback for every contact,
+    only the contacts of the objects are read, the cost grows with the number of object contacts and not with the
+    number of kilobot-kilobot contacts. Contacts between sleeping bodies are skipped, their stored impulses are stale.
+
+    All impulses are in Box2D units and summed over the sub-steps since the last clear:
+    normal and tangent (num_objects,) the normal and absolute tangent impulses of all contacts of each object,
+    kilobot_normal and kilobot_tangent (num_kilobots, num_objects) the impulses of each kilobot-object pair and
+    push (num_objects, 2) the net impulse of the kilobots on each object in world coordinates.
+    """
+    def __init__(self):
+        self._kilobots = None
+        self._objects = None
+        self._num_kilobots = self._num_objects = 0
+        self._object_bodies = []
+        self._kilobot_index = {}
+        self._allocate()
+
+    def _allocate(self):
+        self.normal = np.zeros(self._num_objects)
+        self.tangent = np.zeros(self._num_objects)
+        self.kilobot_normal = np.zeros((self._num_kilobots, self._num_objects))
+        self.kilobot_tangent = np.zeros((self._num_kilobots, self._num_objects))
+        self.push = np.zeros((self._num_objects, 2))
+
+    def holds(self, kilobots: Sequence, objects: Sequence) -> bool:
+        return self._kilobots is kilobots and self._objects is objects and self._num_kilobots == len(kilobots) \
+            and self._num_objects == len(objects)
+
+    def invalidate(self):
+        self._kilobots = self._objects = None
+        self._object_bodies = []
+        self._kilobot_index = {}
+
+    def _bind(self, kilobots: Sequence, objects: Sequence):
+        self._kilobots, self._objects = kilobots, objects
+        self._num_kilobots, self._num_objects = len(kilobots), len(objects)
+        self._object_bodies = [o._body for o in objects]
+        # the index of each kilobot by the hash of its Box2D body, see ContactIndex
+        self._kilobot_index = {hash(kb._body): i for i, kb in enumerate(kilobots)}
+        self._allocate()
+
+    def clear(self):
+        for a in (self.normal, self.tangent, self.kilobot_normal, self.kilobot_tangent, self.push):
+            a.fill(.0)
+
+    def accumulate(self, kilobots: Sequence, objects: Sequence):
+        """adds the impulses of the last world step"""
+        if not self.holds(kilobots, objects):
+            self._bind(kilobots, objects)
+
+        for j, body in enumerate(self._object_bodies):
+            key = hash(body)
+            for edge in body.contacts:
+                contact = edge.contact
+                if not contact.touching or not contact.enabled:
+                    continue
+                other = edge.other
+                if not body.awake and not other.awake:
+                    continue
+                points = contact.manifold.points
+                if not points:
+                    continue
+                normal_impulse = sum(p.normalImpulse for p in points)
+                tangent_impulse = sum(p.tangentImpulse for p in points)
+                self.normal[j] += normal_impulse
+                self.tangent[j] += abs(tangent_impulse)
+
+                i = self._kilobot_index.get(hash(other))
+                if i is None:
+                    continue
+                self.kilobot_normal[i, j] += normal_impulse
+                self.kilobot_tangent[i, j] += abs(tangent_impulse)
+                # the normal points from body A to body B, the impulse pushes body B along the normal. The world
+                # manifold is kept while its normal is read, pybox2d frees a temporary one before
+                world_manifold = contact.worldManifold
+                nx, ny = world_manifold.normal
+                sign = -1. if hash(contact.fixtureA.body) == key else 1.
+                self.push[j, 0] += sign * (normal_impulse * nx + tangent_impulse * ny)
+                self.push[j, 1] += sign * (normal_impulse * ny - tangent_impulse * nx)
+
+    def totals(self) -> dict:
+        """copies of the accumulated impulses, e.g., to be returned as info"""
+        return {'normal': self.normal.copy(), 'tangent': self.tangent.copy(),
+                'kilobot_normal': self.kilobot_normal.copy(), 'kilobot_tangent': self.kilobot_tangent.copy(),
+                'push': self.push.copy()}
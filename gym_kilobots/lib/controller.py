@@ -0,0 +1,155 @@
+import numpy as np
+
+from .kilobot import Kilobot, PhototaxisKilobot, SimplePhototaxisKilobot
+
+
+class SwarmController(object):
+    """steps a group of kilobots of the same class as part of a KilobotSwarm
+
+    Subclasses implement the behaviour of a kilobot class as operations on the swarm arrays, so that the cost of a
+    step grows with the number of array operations instead of the number of kilobots. The state of a controller is
+    kept in the arrays listed in _state_fields, each kilobot holds a view on its row in _controller_state.
+    """
+    _state_fields = ()
+    # whether the velocities of the kilobots are only set through KilobotSwarm.set_velocities, such kilobots can be
+    # integrated outside of Box2D (see HybridStepping)
+    _commands_velocities = False
+
+    def __init__(self, swarm, idx: np.ndarray):
+        # the controller must not keep a reference to the swarm, the kilobots are destroyed with the swarm
+        self._idx = idx
+        self._kilobots = tuple(swarm.kilobots[i] for i in idx)
+        self._kilobot_class = type(self._kilobots[0])
+
+    @classmethod
+    def handles(cls, kilobot: Kilobot) -> bool:
+        raise NotImplementedError
+
+    def view_on(self, other: 'SwarmController', start: int):
+        """lets the state arrays of this controller refer to the rows of other starting at start"""
+        for field in self._state_fields:
+            setattr(self, field, getattr(other, field)[start:start + len(self._idx)])
+
+    def snapshot(self):
+        return {field: getattr(self, field).copy() for field in self._state_fields}
+
+    def restore(self, snapshot):
+        # in place, the kilobots hold views on the state arrays
+        for field, value in snapshot.items():
+            getattr(self, field)[...] = value
+
+    def receive(self, swarm, inbox):
+        """delivers the messages of a tick, by default one by one to message_rx if the kilobot class implements it
+
+        Subclasses can process the arrays of the inbox for the whole group instead.
+        """
+        if self._kilobot_class.message_rx is Kilobot.message_rx:
+            return
+        for i, kb in zip(self._idx.tolist(), self._kilobots):
+            _, distances, messages = inbox.of(i)
+            for message, distance in zip(messages, distances.tolist()):
+                kb.message_rx(message, distance)
+
+    def step(self, swarm, time_step):
+        raise NotImplementedError
+
+
+class ObjectController(SwarmController):
+    """fallback that calls the step method of each kilobot"""
+    @classmethod
+    def handles(cls, kilobot):
+        return True
+
+    def step(self, swarm, time_step):
+        for kb in self._kilobots:
+            kb.step(time_step)
+
+
+class MotorController(SwarmController):
+    """runs the _loop of each kilobot and computes the velocities of all kilobots from their motor values at once"""
+    _commands_velocities = True
+
+    @classmethod
+    def handles(cls, kilobot):
+        return type(kilobot).step is Kilobot.step
+
+    def _loop(self, swarm):
+        for kb in self._kilobots:
+            kb._loop()
+
+    def step(self, swarm, time_step):
+        self._loop(swarm)
+
+        linear_velocities, angular_velocities = self._kilobot_class.motor_velocities(swarm.motors[self._idx],
+                                                                                     swarm.poses[self._idx, 2],
+                                                                                     time_step)
+        swarm.set_velocities(self._idx, linear_velocities, angular_velocities)
+
+
+class PhototaxisController(MotorController):
+    """the behaviour of PhototaxisKilobot as state machine over the whole group
+
+    Every update_interval steps, each kilobot compares its light measurement to its threshold and switches its turn
+    direction if the light got brighter or if it did not change for no_change_threshold updates.
+    """
+    _state_fields = ('state',)
+
+    def __init__(self, swarm, idx):
+        super().__init__(swarm, idx)
+
+        self.state = np.array([kb._controller_state for kb in self._kilobots], dtype=PhototaxisKilobot.state_dtype)
+        for i, kb in enumerate(self._kilobots):
+            kb._controller_state = self.state[i]
+
+    @classmethod
+    def handles(cls, kilobot):
+        return super().handles(kilobot) and type(kilobot)._loop is PhototaxisKilobot._loop
+
+    def _loop(self, swarm):
+        state = self.state
+
+        update = state['update_counter'] % state['update_interval'] == 0
+        state['update_counter'] += 1
+
+        light_measurement = np.where(update, swarm.light_values[self._idx], state['light_measurement'])
+        state['light_measurement'] = light_measurement
+
+        switch = update & ((light_measurement > state['threshold'])
+                           | (state['no_change_counter'] >= state['no_change_threshold']))
+        state['threshold'] = np.where(switch, light_measurement + .01, state['threshold'])
+        state['no_change_counter'] = np.where(switch, 0, state['no_change_counter'] + update)
+
+        swarm.switch_directions(self._idx[switch])
+
+
+class SimplePhototaxisController(SwarmController):
+    """the behaviour of SimplePhototaxisKilobot: moves along the light gradient with bounded velocity"""
+    _commands_velocities = True
+
+    def __init__(self, swarm, idx):
+        super().__init__(swarm, idx)
+
+        for kb in self._kilobots:
+            kb._body.linearDamping = .0
+
+    @classmethod
+    def handles(cls, kilobot):
+        return type(kilobot).step is SimplePhototaxisKilobot.step
+
+    def step(self, swarm, time_step):
+        movement_direction = swarm.light_gradients[self._idx]
+
+        n = np.sqrt(np.sum(movement_direction * movement_direction, axis=1))
+        too_fast = n > self._kilobot_class._max_linear_velocity
+        movement_direction[too_fast] = movement_direction[too_fast] / n[too_fast, None] \
+            * self._kilobot_class._max_linear_velocity
+
+        swarm.set_velocities(self._idx, movement_direction, None)
+
+
+# controllers are tried in this order, the first one that handles a kilobot is used for it
+controllers = [PhototaxisController, MotorController, SimplePhototaxisController, ObjectController]
+
+
+def controller_for(kilobot: Kilobot):
+    return next(c for c in controllers if c.handles(kilobot))
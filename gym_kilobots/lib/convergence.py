@@ -0,0 +1,129 @@
+import time
+
+import numpy as np
+
+
+class FastForward(object):
+    """skips the sub-steps of KilobotsEnv.step while the swarm rests at a static light
+
+    After each simulated sub-step, the speeds of the kilobots and objects are computed from their poses before and
+    after the sub-step. The swarm has converged once, for window consecutive sub-steps, the state of the light and the
+    commands of the kilobots did not change, no kilobot or object moved faster than linear_threshold or turned faster
+    than angular_threshold and the number of contacts of the world stayed the same. The commands are the motor values
+    and the velocities set by the controllers of the swarm and the _snapshot_attributes of the kilobots, e.g., the
+    velocities set by the actions of a DirectControlKilobotsEnv. From then on, the sub-steps are skipped: the light is
+    still stepped, but the light values, the messaging, the kilobots and the world are not, i.e., all bodies and the
+    states of the kilobots keep their values while the sim steps are counted as usual.
+
+    The fast-forward ends as soon as the state of the light or the commands of the kilobots differ from those at the
+    convergence, e.g., because an action moved the light or set new velocities, or the number of contacts of the world
+    changed, and with reset and restore of the environment. The sub-step is then simulated from the kept state and the
+    swarm has to converge again. Kilobots that never stop, like PhototaxisKilobots circling the light, do not converge.
+
+    Assign an instance to KilobotsEnv.fast_forward to enable it. The statistics are kept over all episodes:
+    simulated_steps and skipped_steps count the sub-steps, skipped_time is the simulated time in seconds that was
+    skipped, fast_forwards counts the convergences and simulated_seconds is the wall time spent in simulated sub-steps.
+
+    :param window: int the number of consecutive resting sub-steps after which the swarm has converged
+    :param linear_threshold: float the speed in m/s below which a kilobot or an object rests
+    :param angular_threshold: float the angular speed in rad/s below which a kilobot or an object rests
+    """
+    def __init__(self, window: int = 20, linear_threshold: float = .0005, angular_threshold: float = .01):
+        self.window = window
+        self.linear_threshold = linear_threshold
+        self.angular_threshold = angular_threshold
+
+        # whether the sub-steps are skipped
+        self.converged = False
+        self._resting = 0
+        self._poses = None
+        self._light_state = None
+        self._commands = None
+        self._contacts = None
+        self._start = .0
+
+        self.simulated_steps = 0
+        self.skipped_steps = 0
+        self.skipped_time = .0
+        self.fast_forwards = 0
+        self.simulated_seconds = .0
+
+    @property
+    def saved_seconds(self) -> float:
+        """the wall time that the skipped sub-steps would have taken, estimated from the simulated sub-steps"""
+        return self.skipped_steps * self.simulated_seconds / max(self.simulated_steps, 1)
+
+    def statistics(self) -> dict:
+        return {'simulated_steps': self.simulated_steps, 'skipped_steps': self.skipped_steps,
+                'skipped_time': self.skipped_time, 'fast_forwards': self.fast_forwards,
+                'saved_seconds': self.saved_seconds}
+
+    def interrupt(self):
+        """forgets the convergence and the resting sub-steps, e.g., after the bodies were reset or restored"""
+        self.converged = False
+        self._resting = 0
+        self._poses = None
+
+    @staticmethod
+    def _light_of(env):
+        if not env._light:
+            return None
+        return np.array(env._light.get_state(), dtype=np.float64)
+
+    @staticmethod
+    def _poses_of(env):
+        objects = env.object_poses.poses if env._objects else np.zeros((0, 3))
+        return np.concatenate((env.swarm.poses, objects))
+
+    @staticmethod
+    def _commands_of(env):
+        swarm = env.swarm
+        settings = [swarm.motors.ravel()]
+        settings += [np.ravel(getattr(kb, name)) for kb in swarm.kilobots for name in kb._snapshot_attributes]
+        return np.concatenate(settings).astype(np.float64), swarm.velocities.copy()
+
+    def _same_commands(self, commands, other):
+        if other is None or not np.array_equal(commands[0], other[0]) or commands[1].shape != other[1].shape:
+            return False
+        # the velocities of the controllers follow the light gradient, they vary as little as the poses of a resting
+        # swarm
+        change = np.abs(commands[1] - other[1])
+        return np.max(change[:, :2], initial=.0) <= self.linear_threshold \
+            and np.max(change[:, 2], initial=.0) <= self.angular_threshold
+
+    def skip(self, env) -> bool:
+        """whether the next sub-step is skipped, call after the light was stepped and the actions were applied"""
+        if self.converged:
+            if np.array_equal(self._light_of(env), self._light_state) \
+                    and self._same_commands(self._commands_of(env), self._commands) \
+                    and env.world.contactCount == self._contacts:
+                self.skipped_steps += 1
+                self.skipped_time += env.sim_step
+                return True
+            self.interrupt()
+        self._start = time.perf_counter()
+        return False
+
+    def observe(self, env):
+        """checks whether the swarm rests after a simulated sub-step"""
+        self.simulated_steps += 1
+        self.simulated_seconds += time.perf_counter() - self._start
+
+        poses, light_state, contacts = self._poses_of(env), self._light_of(env), env.world.contactCount
+        commands = self._commands_of(env)
+        if self._poses is None or self._poses.shape != poses.shape:
+            self._resting = 0
+        else:
+            linear = np.sqrt(np.sum((poses[:, :2] - self._poses[:, :2]) ** 2, axis=1)) / env.sim_step
+            # the difference of the orientations wrapped to [-pi, pi)
+            angular = np.abs((poses[:, 2] - self._poses[:, 2] + np.pi) % (2 * np.pi) - np.pi) / env.sim_step
+            resting = np.array_equal(light_state, self._light_state) and contacts == self._contacts \
+                and self._same_commands(commands, self._commands) \
+                and np.max(linear, initial=.0) <= self.linear_threshold \
+                and np.max(angular, initial=.0) <= self.angular_threshold
+            self._resting = self._resting + 1 if resting else 0
+        self._poses, self._light_state, self._commands, self._contacts = poses, light_state, commands, contacts
+
+        if self._resting >= self.window:
+            self.converged = True
+            self.fast_forwards += 1
@@ -0,0 +1,135 @@
+import weakref
+from typing import Sequence
+
+import numpy as np
+
+from .body import _world_scale
+from .messaging import SpatialHash
+from .physics import damping_factor
+
+
+class HybridStepping(object):
+    """advances the kilobots that are far from all other bodies analytically instead of in the solver of Box2D
+
+    Every interval sub-steps, the kilobots whose controller commands their velocities (see
+    SwarmController._commands_velocities) and that are farther than margin from every other kilobot, object and wall
+    become kinematic: their bodies are deactivated, such that Box2D neither solves nor collides them, and their
+    commanded velocities are damped and integrated in the arrays of the swarm as Box2D would do it for a body without
+    contacts. All other kilobots are handed to Box2D as usual. The margin is widened by the distance that two kilobots
+    can approach each other until the next test, bounded by the larger one of the commanded speeds and the largest
+    displacement of a kilobot in the last sub-step, such that a kilobot becomes dynamic again before it can touch
+    another body. Pushed kilobots can move faster than this bound, the margin covers such jumps.
+
+    A kilobot that becomes kinematic takes the velocities of its body (see KilobotSwarm.make_kinematic and
+    make_dynamic), a kilobot that becomes dynamic gets its body moved to its pose in the swarm and the velocities of
+    the swarm. As long as a kilobot is kinematic, the swarm arrays hold its pose, its body keeps the pose at which it
+    was deactivated. Since the contacts of a reactivated body are created anew, Box2D may solve them in a different
+    order, thus the trajectories of touching kilobots are not identical to those without hybrid stepping.
+
+    Assign an instance to KilobotsEnv.hybrid_stepping to enable the hybrid stepping, it requires the box2d physics
+    backend.
+
+    :param margin: float the minimal distance in meters between a kinematic kilobot and any other body
+    :param interval: int the number of sub-steps between two tests which kilobots are isolated
+    """
+    # from meters to Box2D units for poses and velocities
+    _scale = np.array([_world_scale, _world_scale, 1.])
+
+    def __init__(self, margin: float = .005, interval: int = 5):
+        self.margin = margin
+        self.interval = interval
+        # a weak reference to the swarm the arrays are bound to, the kilobots have to be destroyed with the bodies of
+        # the environment
+        self._swarm = None
+        self._num_kilobots = 0
+        self._radii = np.zeros(0)
+        self._commanded = np.zeros(0, dtype=bool)
+        self._previous = np.zeros((0, 2))
+        self._countdown = 0
+
+        # the number of kinematic kilobots in the last sub-step
+        self.num_kinematic = 0
+
+    def _bind(self, swarm):
+        self._swarm, self._num_kilobots = weakref.ref(swarm), len(swarm)
+        self._radii = np.array([kb._radius for kb in swarm.kilobots], dtype=np.float64)
+        self._commanded = np.zeros(len(swarm), dtype=bool)
+        for controller in swarm.controllers:
+            self._commanded[controller._idx] = controller._commands_velocities
+        self._previous = swarm.poses[:, :2].copy()
+        self._countdown = 0
+
+    @staticmethod
+    def _boxes(bodies):
+        # the bounding boxes of all fixtures (and all edges of chains) in meters as rows of lower and upper bounds
+        boxes = [(*aabb.lowerBound, *aabb.upperBound) for body in bodies for fixture in body.fixtures
+                 if not fixture.sensor for aabb in map(fixture.GetAABB, range(fixture.shape.childCount))]
+        return np.array(boxes, dtype=np.float64).reshape((-1, 4)) / _world_scale
+
+    def isolated(self, swarm, obstacles: Sequence, time_step: float, speed: float = .0) -> np.ndarray:
+        """the mask of the kilobots that can be integrated outside of Box2D in the next interval sub-steps
+
+        :param swarm: KilobotSwarm with valid poses
+        :param obstacles: the Box2D bodies besides the kilobots, i.e., the objects and the table
+        :param time_step: float the duration of a sub-step
+        :param speed: float a bound of the speed of the kilobots in m/s besides their commanded velocities
+        """
+        if self._swarm is None or swarm is not self._swarm() or len(swarm) != self._num_kilobots:
+            self._bind(swarm)
+        positions = swarm.poses[:, :2]
+        radii = self._radii
+        speed = max(speed, np.sqrt(np.sum(swarm.velocities[:, :2] ** 2, axis=1)).max(initial=.0))
+        reach = self.margin + 2 * speed * time_step * self.interval
+
+        near = np.zeros(len(swarm), dtype=bool)
+        if len(swarm) > 1:
+            distance = 2 * radii.max() + reach
+            grid = SpatialHash(distance)
+            grid.build(positions)
+            i, j, d = grid.query(positions, distance, sort=False)
+            close = (i != j) & (d <= radii[i] + radii[j] + reach)
+            near[i[close]] = True
+
+        boxes = self._boxes(obstacles)
+        if len(boxes):
+            pad = (radii + reach)[:, None]
+            inside = (positions[:, :1] >= boxes[None, :, 0] - pad) & (positions[:, :1] <= boxes[None, :, 2] + pad) \
+                & (positions[:, 1:] >= boxes[None, :, 1] - pad) & (positions[:, 1:] <= boxes[None, :, 3] + pad)
+            near |= np.any(inside, axis=1)
+
+        return self._commanded & ~near
+
+    def step(self, swarm, obstacles: Sequence, time_step: float):
+        """switches the kilobots between both modes every interval sub-steps and moves the kinematic ones, call before
+        the world step"""
+        if swarm._rows is not None:
+            raise NotImplementedError('hybrid stepping requires the box2d physics backend')
+        if not swarm._pose_cache.valid:
+            swarm.sync()
+        if self._swarm is None or swarm is not self._swarm() or len(swarm) != self._num_kilobots:
+            self._bind(swarm)
+
+        positions = swarm.poses[:, :2]
+        jump = np.sqrt(np.sum((positions - self._previous) ** 2, axis=1)).max(initial=.0)
+        self._previous[:] = positions
+        if self._countdown <= 0:
+            isolated = self.isolated(swarm, obstacles, time_step, jump / time_step)
+            swarm.make_dynamic(np.flatnonzero(swarm.kinematic & ~isolated))
+            swarm.make_kinematic(np.flatnonzero(isolated & ~swarm.kinematic))
+            self._countdown = self.interval
+        self._countdown -= 1
+
+        # the integration of Box2D: the velocities are damped first, then the poses are moved, in Box2D units and
+        # single precision such that the kinematic kilobots follow the same trajectories as in Box2D
+        rows = np.flatnonzero(swarm.kinematic)
+        h = np.float32(time_step)
+        damping = damping_factor(h, swarm._damping[rows].astype(np.float32))
+        v = (swarm.velocities[rows] * self._scale).astype(np.float32)
+        v[:, :2] *= damping[:, :1]
+        v[:, 2] *= damping[:, 1]
+        poses = (swarm.poses[rows] * self._scale).astype(np.float32)
+        poses += h * v
+        swarm.velocities[rows] = v / self._scale
+        swarm.poses[rows] = poses / self._scale
+        self._previous[rows] = swarm.poses[rows, :2]
+        self.num_kinematic = len(rows)
@@ -12,6 +12,8 @@ class Kilobot(Circle):
     _leg_left = np.array([-0.013, -.009])
     _leg_right = np.array([+0.013, -.009])
     _light_sensor = np.array([.0, -_radius+.001])
+    # position of the light sensor in the frame of the kilobot, used by light_sensor_pos and KilobotSwarm
+    _light_sensor_offset = np.array([.0, -_radius])
     _led = np.array([.011, .01])
 
     # _impulse_right_dir = _leg_front - _leg_right
@@ -29,30 +31,86 @@ class Kilobot(Circle):
     _linear_damping = .8  #* _world_scale
     _angular_damping = .8  #* _world_scale
 
+    # turn directions and the corresponding highlight colors
+    _no_turn, _left, _right = 0, 1, -1
+    _left_color = (0, 255, 0)
+    _right_color = (255, 0, 0)
+
+    # the payload of an IR message in bytes
+    _message_size = 9
+
     def __init__(self, world, position=None, orientation=None, light=None):
         # all parameters in real world units
         super().__init__(world=world, position=position, orientation=orientation, radius=self._radius)
 
-        # 0 .. 255
-        self._motor_left = 0
-        self._motor_right = 0
+        # 0 .. 255, left and right
+        self._motors = np.zeros(2)
         self.__light_measurement = 0
-        self.__turn_direction = None
+        self._turn_direction = np.array([self._no_turn])
 
         self._body_color = (150, 150, 150)
-        self._highlight_color = (255, 255, 255)
+        self._highlight_color = np.array((255, 255, 255))
 
-        self._light_value = None
-        self._light_gradient = None
+        # light value and gradient
+        self._light_reading = np.zeros(3)
+
+        # the IR message that is sent while transmitting
+        self._message = np.zeros(self._message_size, dtype=np.uint8)
+        self._transmitting = np.zeros(1, dtype=bool)
 
         self._setup()
 
+    def _bind(self, swarm, index):
+        # move the state of this kilobot into its rows of the swarm arrays
+        swarm.motors[index] = self._motors
+        swarm.light_readings[index] = self._light_reading
+        swarm.turn_directions[index] = self._turn_direction[0]
+        swarm.highlight_colors[index] = self._highlight_color
+        swarm.messages[index] = self._message
+        swarm.transmitting[index] = self._transmitting[0]
+        self._motors = swarm.motors[index]
+        self._light_reading = swarm.light_readings[index]
+        self._turn_direction = swarm.turn_directions[index:index + 1]
+        self._highlight_color = swarm.highlight_colors[index]
+        self._message = swarm.messages[index]
+        self._transmitting = swarm.transmitting[index:index + 1]
+
+    @property
+    def _motor_left(self):
+        return self._motors[0]
+
+    @property
+    def _motor_right(self):
+        return self._motors[1]
+
+    @property
+    def _light_value(self):
+        return self._light_reading[0]
+
+    @property
+    def _light_gradient(self):
+        return self._light_reading[1:]
+
     def set_light_value_and_gradient(self, value, gradient):
-        self._light_value = value
-        self._light_gradient = gradient
+        self._light_reading[0] = value
+        self._light_reading[1:] = gradient
 
     def light_sensor_pos(self):
-        return self.get_world_point((0.0, -self._radius))
+        return self.get_world_point(self._light_sensor_offset)
+
+    def set_message(self, message):
+        """starts transmitting message (up to _message_size bytes) to the neighbours, see Messaging"""
+        message = np.asarray(message, dtype=np.uint8).ravel()
+        self._message[:] = 0
+        self._message[:len(message)] = message
+        self._transmitting[0] = True
+
+    def stop_message(self):
+        self._transmitting[0] = False
+
+    def message_rx(self, message: np.ndarray, distance: float):
+        """called for each received message with the measured distance to the sender"""
+        pass
 
     def get_ambientlight(self):
         if self._light_value:
@@ -61,70 +119,82 @@ class Kilobot(Circle):
             return 0
 
     def set_motors(self, left, right):
-        self._motor_left = left
-        self._motor_right = right
+        self._motors[0] = left
+        self._motors[1] = right
 
     def switch_directions(self):
-        if self.__turn_direction == 'left':
+        if self._turn_direction[0] == self._left:
             self.turn_right()
         else:
             self.turn_left()
 
     def turn_right(self):
-        self.__turn_direction = 'right'
+        self._turn_direction[0] = self._right
         self.set_motors(0, 255)
-        self.set_color((255, 0, 0))
+        self.set_color(self._right_color)
 
     def turn_left(self):
-        self.__turn_direction = 'left'
+        self._turn_direction[0] = self._left
         self.set_motors(255, 0)
-        self.set_color((0, 255, 0))
+        self.set_color(self._left_color)
 
     def set_color(self, color):
-        self._highlight_color = color
+        self._highlight_color[:] = color
+
+    @classmethod
+    def motor_velocities(cls, motors: np.ndarray, orientations: np.ndarray, time_step: float):
+        """computes the linear and angular velocities of several kilobots from their motor values
+
+        :param motors: np.ndarray left and right motor values (0 .. 255) of shape (n, 2)
+        :param orientations: np.ndarray orientations of the kilobots of shape (n,)
+        :param time_step: float the time step for which the motor values are applied
+        :return: linear velocities of shape (n, 2) and angular velocities of shape (n,)
+        """
+        motor_left, motor_right = motors[:, 0], motors[:, 1]
+        both = (motor_left != 0) & (motor_right != 0)
+        right = ~both & (motor_right != 0)
+        left = ~both & ~right & (motor_left != 0)
+
+        angular_velocity = np.zeros(motors.shape[0])
+        angular_velocity[both] = (motor_right[both] - motor_left[both]) / 510. * cls._max_angular_velocity
+        angular_velocity[right] = motor_right[right] / 255. * cls._max_angular_velocity
+        angular_velocity[left] = -motor_left[left] / 255. * cls._max_angular_velocity
+
+        cos_dir = np.cos(orientations)
+        sin_dir = np.sin(orientations)
+
+        # with both motors on, the kilobot moves forward
+        linear_velocity = np.zeros((motors.shape[0], 2))
+        forward_velocity = (motor_right[both] + motor_left[both]) / 510. * cls._max_linear_velocity
+        linear_velocity[both, 0] = sin_dir[both] * forward_velocity
+        linear_velocity[both, 1] = cos_dir[both] * forward_velocity
+
+        # with only one motor on, the kilobot turns around the opposite leg
+        pivot = np.zeros((motors.shape[0], 2))
+        pivot[right] = cls._leg_left
+        pivot[left] = cls._leg_right
+        angular_displacement = angular_velocity * time_step
+        c, s = np.cos(angular_displacement), np.sin(angular_displacement)
+        translation_x = pivot[:, 0] - (c * pivot[:, 0] - s * pivot[:, 1])
+        translation_y = pivot[:, 1] - (s * pivot[:, 0] + c * pivot[:, 1])
+
+        turning = right | left
+        linear_velocity[turning, 0] = (cos_dir * translation_x - sin_dir * translation_y)[turning] / time_step
+        linear_velocity[turning, 1] = (sin_dir * translation_x + cos_dir * translation_y)[turning] / time_step
+
+        return linear_velocity, angular_velocity
+
+    def set_velocity(self, linear_velocity, angular_velocity):
+        self._body.linearVelocity = b2Vec2(*(linear_velocity * _world_scale).tolist())
+        self._body.angularVelocity = float(angular_velocity)
 
     def step(self, time_step):
         # loop kilobot logic
         self._loop()
 
-        cos_dir = np.cos(self.get_orientation())
-        sin_dir = np.sin(self.get_orientation())
-
-        linear_velocity = [.0, .0]
-        angular_velocity = .0
-
-        # compute new kilobot position or kilobot velocity
-        if self._motor_left and self._motor_right:
-            linear_velocity = (self._motor_right + self._motor_left) / 510. * self._max_linear_velocity
-            linear_velocity = [sin_dir * linear_velocity, cos_dir * linear_velocity]
-
-            angular_velocity = (self._motor_right - self._motor_left) / 510. * self._max_angular_velocity
-
-        elif self._motor_right:
-            angular_velocity = self._motor_right / 255. * self._max_angular_velocity
-            angular_displacement = angular_velocity * time_step
-
-            c, s = np.cos(angular_displacement), np.sin(angular_displacement)
-            R = [[c, -s], [s, c]]
-
-            translation = self._leg_left - np.dot(R, self._leg_left)
-            linear_velocity = self._body.GetWorldVector(translation * _world_scale) / _world_scale / time_step
-
-        elif self._motor_left:
-            angular_velocity = -self._motor_left / 255. * self._max_angular_velocity
-            angular_displacement = angular_velocity * time_step
-
-            c, s = np.cos(angular_displacement), np.sin(angular_displacement)
-            R = [[c, -s], [s, c]]
-
-            translation = self._leg_right - np.dot(R, self._leg_right)
-            linear_velocity = self._body.GetWorldVector(translation * _world_scale) / _world_scale / time_step
-
-        self._body.angularVelocity = angular_velocity
-        if type(linear_velocity) == np.ndarray:
-            self._body.linearVelocity = b2Vec2(*linear_velocity.astype(float)) * _world_scale
-        else:
-            self._body.linearVelocity = linear_velocity * _world_scale
+        linear_velocity, angular_velocity = self.motor_velocities(self._motors[None, :],
+                                                                  np.array([self.get_orientation()]), time_step)
+        self.set_velocity(linear_velocity[0], angular_velocity[0])
 
     def draw(self, viewer):
         # super(Kilobot, self).draw(viewer)
@@ -169,6 +239,9 @@ class Kilobot(Circle):
 
 
 class SimplePhototaxisKilobot(Kilobot):
+    # the light is measured at the centre
+    _light_sensor_offset = np.zeros(2)
+
     def __init__(self, world, position=None, orientation=None, light=None):
         super().__init__(world=world, position=position, orientation=orientation, light=light)
 
@@ -185,9 +258,6 @@ class SimplePhototaxisKilobot(Kilobot):
         # we override step
         pass
 
-    def light_sensor_pos(self):
-        return self.get_position()
-
     def step(self, time_step):
         movement_direction = self._light_gradient
 
@@ -196,7 +266,7 @@ class SimplePhototaxisKilobot(Kilobot):
         if n > self._max_linear_velocity:
             movement_direction = movement_direction / n * self._max_linear_velocity
 
-        movement_direction *= _world_scale
+        movement_direction = movement_direction * _world_scale
 
         self._body.linearVelocity = b2Vec2(*movement_direction.astype(float))
         # self._body.angle = np.arctan2(movement_direction[1], movement_direction[0])
@@ -212,6 +282,7 @@ class SimplePhototaxisKilobot(Kilobot):
 
 class SimpleVelocityControlKilobot(Kilobot):
     _density = 2.0
+    _snapshot_attributes = ('_velocity',)
 
     action_space = spaces.Box(np.array([.0, -Kilobot._max_angular_velocity]),
                               np.array([Kilobot._max_linear_velocity, Kilobot._max_angular_velocity]),
@@ -219,7 +290,8 @@ class SimpleVelocityControlKilobot(Kilobot):
     state_space = spaces.Box(np.array([-np.inf, -np.inf, -np.inf]),
                              np.array([np.inf, np.inf, np.inf, ]), dtype=np.float64)
 
-    def __init__(self, world, *, velocity=None, **kwargs):
+    def __init__(self, world, *, velocity=None, light=None, **kwargs):
+        # the velocity is controlled directly, the light is not used
         super().__init__(world=world, light=None, **kwargs)
 
         if velocity:
@@ -265,6 +337,7 @@ class SimpleVelocityControlKilobot(Kilobot):
 
 class SimpleAccelerationControlKilobot(SimpleVelocityControlKilobot):
     _density = 2.0
+    _snapshot_attributes = ('_velocity', '_acceleration')
 
     action_space = spaces.Box(np.array([-.005, -.2 * np.pi]), np.array([.005, .2 * np.pi]), dtype=np.float64)
     state_space = spaces.Box(np.array([-np.inf, -np.inf, -np.inf, .0, -Kilobot._max_angular_velocity]),
@@ -301,33 +374,34 @@ class SimpleAccelerationControlKilobot(SimpleVelocityControlKilobot):
 
 
 class PhototaxisKilobot(Kilobot):
+    state_dtype = np.dtype([('light_measurement', np.float64), ('threshold', np.float64),
+                            ('update_interval', np.int64), ('update_counter', np.int64),
+                            ('no_change_counter', np.int64), ('no_change_threshold', np.int64)])
+
     def __init__(self, world, position=None, orientation=None, light=None):
-        super(PhototaxisKilobot, self).__init__(world=world, position=position, orientation=orientation, light=light)
+        # the controller state is a view on a single row of a structured array, see PhototaxisController
+        self._controller_state = np.array([(0, -np.inf, 6, 0, 0, 15)], dtype=self.state_dtype)[0]
 
-        self.__light_measurement = 0
-        self.__threshold = -np.inf
-        self.__last_update = .0
-        self.__update_interval = 6
-        self.__update_counter = 0
-        self.__no_change_counter = 0
-        self.__no_change_threshold = 15
+        super(PhototaxisKilobot, self).__init__(world=world, position=position, orientation=orientation, light=light)
 
     def _setup(self):
         self.turn_left()
 
     def _loop(self):
+        state = self._controller_state
 
-        if self.__update_counter % self.__update_interval:
-            self.__update_counter += 1
+        if state['update_counter'] % state['update_interval']:
+            state['update_counter'] += 1
             return
 
-        self.__update_counter += 1
+        state['update_counter'] += 1
 
-        self.__light_measurement = self.get_ambientlight()
+        state['light_measurement'] = self.get_ambientlight()
 
-        if self.__light_measurement > self.__threshold or self.__no_change_counter >= self.__no_change_threshold:
-            self.__threshold = self.__light_measurement + .01
+        if state['light_measurement'] > state['threshold'] \
+                or state['no_change_counter'] >= state['no_change_threshold']:
+            state['threshold'] = state['light_measurement'] + .01
             self.switch_directions()
-            self.__no_change_counter = 0
+            state['no_change_counter'] = 0
         else:
-            self.__no_change_counter += 1
+            state['no_change_counter'] += 1
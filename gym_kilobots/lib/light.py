@@ -1,6 +1,6 @@
 import numpy as np
 
-from typing import Iterable, Callable, Optional
+from typing import Iterable, Callable, Optional, Sequence
 
 from gym import spaces
 
@@ -9,10 +9,22 @@ class Light(object):
     relative_actions = True
     interpolate_actions = True
 
+    # counts the changes of the light state, None if the light does not keep track of its changes
+    _version = None
+
     def __init__(self, **kwargs):
         self.observation_space = None
         self.action_space = None
-        
+
+    @property
+    def version(self):
+        """changes whenever the light changes, values and gradients computed for the same version are still valid"""
+        return self._version
+
+    def _changed(self):
+        if self._version is not None:
+            self._version += 1
+
     def step(self, action, time_step: float):
         raise NotImplementedError
 
@@ -25,9 +37,30 @@ class Light(object):
     def value_and_gradients(self, position: np.ndarray) -> (np.ndarray, np.ndarray):
         return self.get_value(position), self.get_gradient(position)
 
+    @classmethod
+    def batch_value_and_gradients(cls, lights: Iterable['Light'], positions: np.ndarray) -> (np.ndarray, np.ndarray):
+        """computes values and gradients of several lights of the same type at once
+
+        :param lights: Iterable[Light] the lights to evaluate, one per environment
+        :param positions: np.ndarray sensor positions of shape (len(lights), num_sensors, 2)
+        :return: values of shape (len(lights), num_sensors) and gradients of shape (len(lights), num_sensors, 2)
+        """
+        values, gradients = zip(*[l.value_and_gradients(p) for l, p in zip(lights, positions)])
+        # some lights return one gradient for all positions
+        return np.stack(values), np.stack([np.broadcast_to(g, p.shape) for g, p in zip(gradients, positions)])
+
     def get_state(self):
         raise NotImplementedError
 
+    def snapshot(self):
+        """captures the state of the light, by default all array attributes"""
+        return {k: v.copy() for k, v in vars(self).items() if isinstance(v, np.ndarray)}
+
+    def restore(self, snapshot):
+        for k, v in snapshot.items():
+            setattr(self, k, v.copy())
+        self._changed()
+
     def draw(self, viewer):
         raise NotImplementedError
 
@@ -56,6 +89,8 @@ class SinglePositionLight(Light):
         self.action_space = spaces.Box(*self._action_bounds, dtype=np.float64)
         self.observation_space = spaces.Box(*self._bounds, dtype=np.float64)
 
+        self._version = 0
+
     def step(self, action: np.ndarray, time_step: float):
         if action is None:
             return
@@ -73,6 +108,7 @@ class SinglePositionLight(Light):
 
         self._position = np.maximum(self._position, self._bounds[0])
         self._position = np.minimum(self._position, self._bounds[1])
+        self._changed()
 
     def get_value(self, position: np.ndarray):
         return -1 * np.linalg.norm(position - self._position, axis=1)
@@ -86,6 +122,15 @@ class SinglePositionLight(Light):
         gradient_norms = np.linalg.norm(gradients, axis=1)
         return -1 * gradient_norms, gradients / gradient_norms
 
+    @classmethod
+    def batch_value_and_gradients(cls, lights, positions):
+        if cls.value_and_gradients is not SinglePositionLight.value_and_gradients:
+            return super().batch_value_and_gradients(lights, positions)
+        light_positions = np.array([l.get_position() for l in lights])
+        gradients = -1 * (positions - light_positions[:, None, :])
+        gradient_norms = np.linalg.norm(gradients, axis=-1)
+        return -1 * gradient_norms, gradients / gradient_norms
+
     def get_position(self):
         return self._position
 
@@ -115,10 +160,22 @@ class CompositeLight(Light):
                                        dtype=np.float64)
         self._action_dims = list(l.action_space.shape[0] for l in self._lights)
 
+        # the radii of the lights if all lights are evaluated like CircularGradientLight, see value_and_gradients
+        self._radii = None
+        if all(type(l).value_and_gradients is CircularGradientLight.value_and_gradients for l in self._lights):
+            self._radii = np.array([l.radius for l in self._lights], dtype=np.float64)
+
     @property
     def lights(self):
         return tuple(self._lights)
 
+    @property
+    def version(self):
+        versions = [l.version for l in self._lights]
+        if any(v is None for v in versions):
+            return None
+        return sum(versions)
+
     def step(self, action, time_step):
         if action is not None:
             action = action.squeeze()
@@ -135,14 +192,56 @@ class CompositeLight(Light):
         return grads[max_l, range(grads.shape[1])].squeeze()
 
     def value_and_gradients(self, position: np.ndarray):
+        if self._radii is not None:
+            return self._circular_value_and_gradients(position)
         values, grads = map(np.asarray, zip(*[l.value_and_gradients(position) for l in self._lights]))
         value = np.sum(values, axis=0)
         max_l = np.argmax(values, axis=0)
         return value, grads[max_l, range(position.shape[0])].squeeze()
 
+    def _circular_value_and_gradients(self, position: np.ndarray):
+        """evaluates all lights at once, the result is equal to the loop over CircularGradientLight.value_and_gradients
+
+        Lights that are farther from the bounding box of the sensors than their radius are culled, they have value
+        and gradient zero at all sensors.
+        """
+        light_positions = np.array([l.get_position() for l in self._lights])
+        closest = np.minimum(np.maximum(light_positions, position.min(axis=0)), position.max(axis=0))
+        active = np.flatnonzero(np.linalg.norm(light_positions - closest, axis=1) <= self._radii)
+        radii = self._radii[active, None]
+
+        gradients = -1 * (position - light_positions[active, None, :])
+        norm_gradients = np.linalg.norm(gradients, axis=-1)
+
+        values = np.ones(norm_gradients.shape)
+        values -= norm_gradients / radii
+        values = np.maximum(np.minimum(values, 1.), .0)
+        values *= 255
+        gradients /= norm_gradients[..., None]
+        gradients[norm_gradients > radii] *= .0
+
+        if not active.size:
+            return np.zeros(position.shape[0]), np.zeros(position.shape).squeeze()
+
+        value = np.sum(values, axis=0)
+        max_l = np.argmax(values, axis=0)
+        gradient = gradients[max_l, range(position.shape[0])]
+        if active[0] != 0:
+            # where all values are zero, the argmax over all lights is the first light which was culled
+            gradient[values[max_l, range(position.shape[0])] == .0] = .0
+        return value, gradient.squeeze()
+
     def get_state(self):
         return np.concatenate(list(l.get_state() for l in self._lights))
 
+    def snapshot(self):
+        return [l.snapshot() for l in self._lights]
+
+    def restore(self, snapshot):
+        # the lights keep track of their changes
+        for l, s in zip(self._lights, snapshot):
+            l.restore(s)
+
     def draw(self, viewer):
         for l in self._lights:
             l.draw(viewer)
@@ -188,6 +287,30 @@ class CircularGradientLight(SinglePositionLight):
 
         return value, gradient
 
+    @classmethod
+    def batch_value_and_gradients(cls, lights, positions):
+        if cls.value_and_gradients is not CircularGradientLight.value_and_gradients:
+            return super().batch_value_and_gradients(lights, positions)
+        light_positions = np.array([l.get_position() for l in lights])
+        radii = np.array([l.radius for l in lights])[:, None]
+
+        gradient = -1 * (positions - light_positions[:, None, :])
+        norm_gradient = np.linalg.norm(gradient, axis=-1)
+
+        value = np.ones(positions.shape[:2])
+        value -= norm_gradient / radii
+        value = np.maximum(np.minimum(value, 1.), .0)
+        value *= 255
+
+        gradient /= norm_gradient[..., None]
+        gradient[norm_gradient > radii] *= .0
+
+        return value, gradient
+
+    @property
+    def radius(self):
+        return self._radius
+
     def get_state(self):
         return self._position
 
@@ -196,23 +319,148 @@ class CircularGradientLight(SinglePositionLight):
 
 
 class SmoothGridLight(Light):
-    def __init__(self):
-        super(SmoothGridLight, self).__init__()
+    """a light map given by a grid of values, e.g., a projector image or the measured illumination of the arena
+
+    The values between the grid points are interpolated bilinearly, the gradients are the derivatives of the
+    interpolation. Only the four grid points around each sensor are read, such that large grids can be memory mapped.
+    The actions shift and rotate the map, the pose (x, y, theta) of the map is applied to the sensor positions instead
+    of the grid. Outside of the map, value and gradient are zero.
+
+    :param grid: np.ndarray of shape (height, width) with the values of the map, row 0 at the lower border, or a path
+                 to a .npy file, which is memory mapped, or to an image file, which is converted to gray scale and
+                 requires imageio (the extra images of gym_kilobots)
+    :param extent: (np.ndarray, np.ndarray) the lower left and upper right corner of the map at pose zero
+    :param pose: np.ndarray the initial pose (x, y, theta) of the map
+    :param bounds: (np.ndarray, np.ndarray) the bounds of the pose
+    :param action_bounds: (np.ndarray, np.ndarray) the bounds of the actions, pose velocities if relative_actions
+    """
+    def __init__(self, grid, *, extent: (np.ndarray, np.ndarray) = None, pose: np.ndarray = None,
+                 bounds: (np.ndarray, np.ndarray) = None, action_bounds: (np.ndarray, np.ndarray) = None,
+                 relative_actions: bool = True, **kwargs):
+        super(SmoothGridLight, self).__init__(**kwargs)
+
+        self._grid = self.load_grid(grid)
+        assert self._grid.ndim == 2 and min(self._grid.shape) >= 2, 'grid must be 2d with at least 2x2 values'
+
+        if extent is None:
+            extent = np.array([-1., -.75]), np.array([1., .75])
+        self._extent = np.asarray(extent[0], dtype=np.float64), np.asarray(extent[1], dtype=np.float64)
+        # the distance between grid points along x (columns) and y (rows)
+        self._cell_size = (self._extent[1] - self._extent[0]) / (np.array(self._grid.shape[::-1]) - 1)
+
+        if pose is None:
+            self._pose = np.zeros(3)
+        else:
+            self._pose = np.array(pose, dtype=np.float64)
+
+        self._bounds = bounds
+        if self._bounds is None:
+            self._bounds = np.array([-np.inf, -np.inf, -np.pi]), np.array([np.inf, np.inf, np.pi])
+
+        self._relative_actions = relative_actions
+        self._action_bounds = action_bounds
+        if self._action_bounds is None:
+            if self._relative_actions:
+                self._action_bounds = np.array([-.01, -.01, -.1 * np.pi]), np.array([.01, .01, .1 * np.pi])
+            else:
+                self._action_bounds = self._bounds
+
+        self.action_space = spaces.Box(*self._action_bounds, dtype=np.float64)
+        self.observation_space = spaces.Box(*self._bounds, dtype=np.float64)
+
+        self._version = 0
+
+    @staticmethod
+    def load_grid(grid) -> np.ndarray:
+        if isinstance(grid, np.ndarray):
+            return grid
+        grid = str(grid)
+        if grid.endswith('.npy'):
+            return np.load(grid, mmap_mode='r')
+
+        try:
+            import imageio
+        except ImportError:
+            raise ImportError('loading the image {} of a SmoothGridLight requires imageio, install it with '
+                              '"pip install gym_kilobots[images]" or pass the grid as .npy file or array'.format(grid))
+        image = np.asarray(imageio.imread(grid), dtype=np.float64)
+        if image.ndim == 3:
+            # gray scale without alpha channel
+            image = image[..., :3].mean(axis=-1)
+        # the first row of an image is its upper border
+        return np.flipud(image)
+
+    @property
+    def grid(self):
+        return self._grid
 
     def step(self, action, time_step):
-        raise NotImplementedError
+        if action is None:
+            return
+
+        action = np.maximum(np.asarray(action).squeeze(), self._action_bounds[0])
+        action = np.minimum(action, self._action_bounds[1])
+
+        if self._relative_actions:
+            self._pose = self._pose + action * time_step
+        else:
+            self._pose = np.array(action, dtype=np.float64)
+
+        self._pose[2] = (self._pose[2] + np.pi) % (2 * np.pi) - np.pi
+        self._pose = np.maximum(self._pose, self._bounds[0])
+        self._pose = np.minimum(self._pose, self._bounds[1])
+        self._changed()
+
+    def value_and_gradients(self, position: np.ndarray):
+        x, y, theta = self._pose
+        c, s = np.cos(theta), np.sin(theta)
+
+        # sensor positions in grid coordinates, u along the columns and v along the rows
+        dx, dy = position[:, 0] - x, position[:, 1] - y
+        u = (c * dx + s * dy - self._extent[0][0]) / self._cell_size[0]
+        v = (c * dy - s * dx - self._extent[0][1]) / self._cell_size[1]
+
+        rows, cols = self._grid.shape
+        inside = (u >= 0) & (u <= cols - 1) & (v >= 0) & (v <= rows - 1)
+        j = np.clip(np.floor(u), 0, cols - 2).astype(np.intp)
+        i = np.clip(np.floor(v), 0, rows - 2).astype(np.intp)
+        fu, fv = u - j, v - i
+
+        v00 = np.asarray(self._grid[i, j], dtype=np.float64)
+        v01 = np.asarray(self._grid[i, j + 1], dtype=np.float64)
+        v10 = np.asarray(self._grid[i + 1, j], dtype=np.float64)
+        v11 = np.asarray(self._grid[i + 1, j + 1], dtype=np.float64)
+
+        value = (1 - fv) * ((1 - fu) * v00 + fu * v01) + fv * ((1 - fu) * v10 + fu * v11)
+        # derivatives of the bilinear interpolation in the frame of the map, rotated into the world frame
+        gu = ((1 - fv) * (v01 - v00) + fv * (v11 - v10)) / self._cell_size[0]
+        gv = ((1 - fu) * (v10 - v00) + fu * (v11 - v01)) / self._cell_size[1]
+        gradient = np.stack((c * gu - s * gv, s * gu + c * gv), axis=-1)
+
+        value[~inside] = .0
+        gradient[~inside] = .0
+        return value, gradient
 
     def get_value(self, position: np.ndarray):
-        raise NotImplementedError
+        return self.value_and_gradients(position)[0]
 
     def get_gradient(self, position: np.ndarray):
-        raise NotImplementedError
+        return self.value_and_gradients(position)[1]
 
     def get_state(self):
-        raise NotImplementedError
+        return self._pose
+
+    def snapshot(self):
+        # the grid does not change
+        return {'_pose': self._pose.copy()}
 
     def draw(self, viewer):
-        raise NotImplementedError
+        (x0, y0), (x1, y1) = self._extent
+        corners = np.array([(x0, y0), (x1, y0), (x1, y1), (x0, y1)])
+        x, y, theta = self._pose
+        c, s = np.cos(theta), np.sin(theta)
+        corners = corners.dot(np.array([[c, s], [-s, c]])) + (x, y)
+        viewer.draw_polyline(corners, color=(255, 255, 30), closed=True, width=.005)
 
 
 class GradientLight(Light):
@@ -234,6 +482,8 @@ class GradientLight(Light):
         self.observation_space = spaces.Box(*self._bounds, dtype=np.float64)
         self.action_space = spaces.Box(*self._action_bounds, dtype=np.float64)
 
+        self._version = 0
+
     def step(self, action, time_step):
         if action is None:
             return
@@ -251,9 +501,10 @@ class GradientLight(Light):
             self._gradient_angle -= 2 * np.pi
 
         self._gradient_vec = np.r_[np.cos(self._gradient_angle), np.sin(self._gradient_angle)]
+        self._changed()
 
     def get_value(self, position: np.ndarray):
-        projection = self._gradient_vec.dot(position)
+        projection = position.dot(self._gradient_vec)
         return projection
 
     def get_gradient(self, position: np.ndarray):
@@ -265,6 +516,7 @@ class GradientLight(Light):
     def set_angle(self, angle):
         self._gradient_angle = np.array([angle])
         self._gradient_vec = np.r_[np.cos(angle), np.sin(angle)]
+        self._changed()
 
     def draw(self, viewer):
         viewer.draw_polyline((np.array([0, 0]), self._gradient_vec), color=(1, 0, 0))
@@ -314,6 +566,101 @@ class MomentumLight(CircularGradientLight):
 
         self._position = np.maximum(self._position, self._bounds[0])
         self._position = np.minimum(self._position, self._bounds[1])
+        self._changed()
 
     def get_state(self):
         return np.r_[self._position, self._velocity]
+
+
+class LightCache(object):
+    """reuses the values and gradients of a light for the sensors that did not move since they were computed
+
+    The values of a sensor are computed again if the light changed (see Light.version) or if the sensor moved more
+    than tolerance along x or y since its values were computed. With tolerance zero the results are the same as
+    calling light.value_and_gradients. Lights with version None are always evaluated.
+
+    :param tolerance: float the distance a sensor can move before its values are computed again
+    """
+    def __init__(self, tolerance: float = .0):
+        self.tolerance = tolerance
+
+        # the number of calls that evaluated the light, the number of calls that reused all values and the number of
+        # sensors for which values were reused
+        self.evaluations = 0
+        self.skipped = 0
+        self.skipped_sensors = 0
+
+        self._light = None
+        self._version = None
+        self._positions = None
+        self._values = None
+        self._gradients = None
+
+    def reset_counters(self):
+        self.evaluations = self.skipped = self.skipped_sensors = 0
+
+    def _moved(self, light: Light, positions: np.ndarray):
+        """the sensors that have to be evaluated, None if the cache does not hold values for light and positions"""
+        version = light.version
+        if version is None or light is not self._light or version != self._version \
+                or positions.shape != self._positions.shape:
+            return None
+        return np.flatnonzero(np.any(np.abs(positions - self._positions) > self.tolerance, axis=1))
+
+    def _store(self, light: Light, positions: np.ndarray, moved, values, gradients):
+        """keeps the values and gradients evaluated for all positions, only those of the sensors moved are updated"""
+        self.evaluations += 1
+        if moved is None:
+            if light.version is not None:
+                self._light, self._version = light, light.version
+                self._positions = positions.copy()
+                self._values = np.array(values, dtype=np.float64)
+                self._gradients = np.array(np.broadcast_to(gradients, positions.shape), dtype=np.float64)
+            return values, gradients
+        self._positions[moved] = positions[moved]
+        self._values[moved] = np.broadcast_to(values, len(positions))[moved]
+        self._gradients[moved] = np.broadcast_to(gradients, positions.shape)[moved]
+        self.skipped_sensors += len(positions) - moved.size
+        return self._values, self._gradients
+
+    def value_and_gradients(self, light: Light, positions: np.ndarray) -> (np.ndarray, np.ndarray):
+        moved = self._moved(light, positions)
+        if moved is None or moved.size == len(positions):
+            return self._store(light, positions, moved, *light.value_and_gradients(positions))
+
+        if moved.size:
+            values, gradients = light.value_and_gradients(positions[moved])
+            self._positions[moved] = positions[moved]
+            self._values[moved] = values
+            self._gradients[moved] = gradients
+            self.evaluations += 1
+        else:
+            self.skipped += 1
+        self.skipped_sensors += len(positions) - moved.size
+        return self._values, self._gradients
+
+    @staticmethod
+    def batch_value_and_gradients(caches: Sequence['LightCache'], lights: Sequence[Light],
+                                  positions: np.ndarray) -> (np.ndarray, np.ndarray):
+        """value_and_gradients of several caches, the lights that have to be evaluated are evaluated in one batched
+        call, see Light.batch_value_and_gradients
+
+        :param caches: Sequence[LightCache] the caches, one per light
+        :param lights: Sequence[Light] lights of the same type
+        :param positions: np.ndarray sensor positions of shape (len(lights), num_sensors, 2)
+        :return: values of shape (len(lights), num_sensors) and gradients of shape (len(lights), num_sensors, 2)
+        """
+        moved = [c._moved(l, p) for c, l, p in zip(caches, lights, positions)]
+        evaluate = [i for i, m in enumerate(moved) if m is None or m.size]
+        values, gradients = np.empty(positions.shape[:2]), np.empty(positions.shape)
+        if evaluate:
+            batch_values, batch_gradients = type(lights[0]).batch_value_and_gradients([lights[i] for i in evaluate],
+                                                                                     positions[evaluate])
+            for i, v, g in zip(evaluate, batch_values, batch_gradients):
+                values[i], gradients[i] = caches[i]._store(lights[i], positions[i], moved[i], v, g)
+        for i, m in enumerate(moved):
+            if m is not None and not m.size:
+                caches[i].skipped += 1
+                caches[i].skipped_sensors += len(positions[i])
+                values[i], gradients[i] = caches[i]._values, caches[i]._gradients
+        return values, gradients
@@ -0,0 +1,182 @@
+import numpy as np
+
+
+class SpatialHash(object):
+    """uniform grid over a set of points for finding all points within a radius of other points
+
+    The points are sorted by the key of their cell, the points of a cell are a contiguous range of the sorted points.
+    A query looks up the points of the 3x3 cells around all query points with one searchsorted per column of cells,
+    thus building and querying costs O(n log n) NumPy operations and no Python loop over the points. The cell size has
+    to be at least the query radius.
+
+    :param cell_size: float the edge length of the cells
+    """
+    def __init__(self, cell_size: float):
+        self.cell_size = cell_size
+        self._points = np.zeros((0, 2))
+        self._order = np.zeros(0, dtype=np.intp)
+        self._sorted_keys = np.zeros(0, dtype=np.int64)
+        self._origin = np.zeros(2, dtype=np.int64)
+        self._rows = 0
+
+    def __len__(self):
+        return len(self._points)
+
+    def _cells(self, points):
+        return np.floor(points / self.cell_size).astype(np.int64) - self._origin
+
+    def _keys(self, cells):
+        # the cells are shifted by one, such that the neighbours of the cells in the first or last row or column get
+        # keys of their own instead of wrapping around to the next column
+        return (cells[:, 0] + 1) * self._rows + cells[:, 1] + 1
+
+    def build(self, points: np.ndarray):
+        """sorts the points into the grid, the previous points are dropped
+
+        :param points: np.ndarray of shape (n, 2)
+        """
+        self._points = np.asarray(points, dtype=np.float64).reshape((-1, 2))
+        cells = np.floor(self._points / self.cell_size).astype(np.int64)
+        if len(cells):
+            self._origin = cells.min(axis=0)
+            self._rows = int(cells[:, 1].max() - self._origin[1]) + 3
+        keys = self._keys(cells - self._origin)
+        self._order = np.argsort(keys, kind='stable')
+        self._sorted_keys = keys[self._order]
+
+    def query(self, points: np.ndarray, radius: float, sort: bool = True):
+        """finds the pairs of query points and grid points that are at most radius apart
+
+        :param points: np.ndarray query points of shape (m, 2)
+        :param radius: float at most the cell size
+        :param sort: bool whether to sort the pairs by query point and grid point
+        :return: indices of the query points, indices of the grid points and their distances
+        """
+        points = np.asarray(points, dtype=np.float64).reshape((-1, 2))
+        if not len(points) or not len(self._points):
+            return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp), np.zeros(0)
+
+        cells = self._cells(points)
+        # query points more than one cell outside of the grid have no neighbours, their keys could alias with cells
+        # in the next or previous column
+        outside = np.any(cells < -1, axis=1) | (cells[:, 1] > self._rows - 2)
+        keys = self._keys(cells)
+
+        query_idx, grid_idx = [], []
+        for dx in (-1, 0, 1):
+            # the cells dy = -1, 0, 1 of a column have consecutive keys, their points are one range of the sorted points
+            column_keys = keys + dx * self._rows
+            start = np.searchsorted(self._sorted_keys, column_keys - 1, side='left')
+            end = np.searchsorted(self._sorted_keys, column_keys + 1, side='right')
+            counts = end - start
+            counts[outside] = 0
+            total = counts.sum()
+            if not total:
+                continue
+            # the ranges [start, end) of all query points concatenated
+            offsets = np.repeat(start - np.cumsum(counts) + counts, counts) + np.arange(total)
+            query_idx.append(np.repeat(np.arange(len(points)), counts))
+            grid_idx.append(self._order[offsets])
+
+        if not query_idx:
+            return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp), np.zeros(0)
+        query_idx = np.concatenate(query_idx)
+        grid_idx = np.concatenate(grid_idx)
+
+        differences = points[query_idx] - self._points[grid_idx]
+        squared_distances = np.einsum('ij,ij->i', differences, differences)
+        close = squared_distances <= radius * radius
+        query_idx, grid_idx, distances = query_idx[close], grid_idx[close], np.sqrt(squared_distances[close])
+        if not sort:
+            return query_idx, grid_idx, distances
+
+        order = np.lexsort((grid_idx, query_idx))
+        return query_idx[order], grid_idx[order], distances[order]
+
+
+class Inbox(object):
+    """the messages received by the kilobots of a swarm in one tick, sorted by receiver
+
+    The messages of kilobot i are the rows offsets[i]:offsets[i + 1] of senders, distances and messages.
+    """
+    def __init__(self, num_kilobots: int, receivers: np.ndarray, senders: np.ndarray, distances: np.ndarray,
+                 messages: np.ndarray):
+        self.receivers = receivers
+        self.senders = senders
+        self.distances = distances
+        self.messages = messages
+        self.counts = np.bincount(receivers, minlength=num_kilobots)
+        self.offsets = np.concatenate(([0], np.cumsum(self.counts)))
+
+    def __len__(self):
+        return len(self.receivers)
+
+    def of(self, kilobot: int):
+        """the senders, distances and messages received by a kilobot"""
+        rows = slice(self.offsets[kilobot], self.offsets[kilobot + 1])
+        return self.senders[rows], self.distances[rows], self.messages[rows]
+
+
+class Messaging(object):
+    """IR messaging between the kilobots of a swarm
+
+    Each tick, every kilobot that transmits (see Kilobot.set_message) sends its message to all kilobots within
+    communication_range of its centre. The transmitters are sorted into a SpatialHash, such that a tick costs
+    O(n log n) instead of comparing all pairs of kilobots. The receivers measure the distance to the sender, optionally
+    with Gaussian noise. With a budget, each kilobot receives at most budget randomly chosen messages per tick, as the
+    IR channel of the real kilobots is shared by all neighbours.
+
+    Assign an instance to KilobotsEnv.messaging to deliver the messages before the kilobots are stepped, the controllers
+    of the swarm receive the Inbox (see SwarmController.receive).
+
+    :param communication_range: float the range of the IR transmitters in meters
+    :param budget: int the maximum number of messages received per kilobot and tick, None for no limit
+    :param distance_noise: float the standard deviation of the measured distances in meters
+    :param rng: the random number generator for the budget and the noise, defaults to np.random
+    """
+    def __init__(self, communication_range: float = .1, budget: int = None, distance_noise: float = .0, rng=None):
+        self.communication_range = communication_range
+        self.budget = budget
+        self.distance_noise = distance_noise
+        self._rng = rng if rng is not None else np.random
+        self._hash = SpatialHash(communication_range)
+
+        # the messages of the last tick
+        self.inbox: Inbox = None
+
+    def neighbours(self, positions: np.ndarray, senders: np.ndarray = None):
+        """finds the kilobots within communication range of each kilobot
+
+        :param positions: np.ndarray the positions of all kilobots of shape (n, 2)
+        :param senders: np.ndarray indices of the kilobots that are looked for, defaults to all kilobots
+        :return: receivers, senders and distances, sorted by receiver, a kilobot is not its own neighbour
+        """
+        if senders is None:
+            senders = np.arange(len(positions))
+        self._hash.build(positions[senders])
+        receivers, idx, distances = self._hash.query(positions, self.communication_range)
+        senders = senders[idx]
+        other = receivers != senders
+        return receivers[other], senders[other], distances[other]
+
+    def _apply_budget(self, receivers):
+        # keeps a random subset of budget messages of each receiver, the messages stay sorted by receiver
+        order = np.lexsort((self._rng.random_sample(len(receivers)), receivers))
+        counts = np.bincount(receivers)
+        rank = np.arange(len(receivers)) - np.repeat(np.cumsum(counts) - counts, counts)
+        return np.sort(order[rank < self.budget])
+
+    def step(self, swarm) -> Inbox:
+        """delivers the messages of the transmitting kilobots of the swarm"""
+        transmitting = np.flatnonzero(swarm.transmitting)
+        receivers, senders, distances = self.neighbours(swarm.poses[:, :2], transmitting)
+
+        if self.budget is not None and len(receivers):
+            keep = self._apply_budget(receivers)
+            receivers, senders, distances = receivers[keep], senders[keep], distances[keep]
+        if self.distance_noise:
+            distances = np.maximum(distances + self._rng.normal(.0, self.distance_noise, len(distances)), .0)
+
+        self.inbox = Inbox(len(swarm), receivers, senders, distances, swarm.messages[senders])
+        swarm.receive(self.inbox)
+        return self.inbox
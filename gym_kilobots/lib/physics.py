@@ -0,0 +1,773 @@
+"""physics backends for KilobotsEnv
+
+The world of a KilobotsEnv is created by make_world from the backend name. A backend is a callable that returns a
+world with the part of the Box2D API that gym_kilobots uses:
+
+    world.CreateDynamicBody(position, angle, linearDamping, angularDamping), world.CreateStaticBody(position),
+    world.DestroyBody(body), world.Step(time_step, velocity_iterations, position_iterations), world.ClearForces(),
+    world.bodies, world.bodyCount, world.contacts, world.contactCount
+
+    body.CreateFixture(shape, density, friction, restitution, isSensor), body.CreatePolygonFixture(box | shape, ...),
+    body.CreateCircleFixture(radius, ...), body.DestroyFixture(fixture), body.fixtures, body.position, body.angle,
+    body.transform, body.linearVelocity, body.angularVelocity, body.linearDamping, body.angularDamping, body.awake,
+    body.active, body.mass, body.contacts, body.contacts_gen
+
+All quantities are in Box2D units (see _world_scale). New backends are added to physics_backends.
+"""
+import collections
+
+import numpy as np
+import Box2D
+
+from .messaging import SpatialHash
+
+
+def box2d_world():
+    return Box2D.b2World(gravity=(0, 0), doSleep=True)
+
+
+def numpy_world():
+    return NumpyWorld()
+
+
+physics_backends = {'box2d': box2d_world, 'numpy': numpy_world}
+
+
+def make_world(backend: str = 'box2d'):
+    if backend not in physics_backends:
+        raise ValueError('unknown physics backend {}, available backends: {}'.format(
+            backend, ', '.join(physics_backends)))
+    return physics_backends[backend]()
+
+
+def damping_factor(time_step: float, damping):
+    """the factor by which Box2D scales the velocities of a body with damping in a step of time_step"""
+    return np.clip(1 - time_step * np.asarray(damping), .0, 1.)
+
+
+def batch_rows(bodies):
+    """the NumpyWorld and the rows of the bodies if all bodies belong to the same NumpyWorld, otherwise None
+
+    Code that reads or writes the state of many bodies uses the rows to access the arrays of the world at once.
+    """
+    if not bodies or not all(isinstance(b, NumpyBody) for b in bodies):
+        return None
+    world = bodies[0].world
+    if any(b.world is not world for b in bodies):
+        return None
+    return world, np.array([b.index for b in bodies], dtype=np.intp)
+
+
+class _Vec2(tuple):
+    # stands in for b2Vec2
+    def __new__(cls, x, y):
+        return super().__new__(cls, (float(x), float(y)))
+
+    @property
+    def x(self):
+        return self[0]
+
+    @property
+    def y(self):
+        return self[1]
+
+
+_Contact = collections.namedtuple('_Contact', ('bodyA', 'bodyB', 'touching'))
+_ContactEdge = collections.namedtuple('_ContactEdge', ('other', 'contact'))
+
+
+class NumpyFixture(object):
+    def __init__(self, body: 'NumpyBody', shape, density=.0, friction=.2, restitution=.0, isSensor=False):
+        self.body = body
+        self.shape = shape
+        self.density = density
+        self.friction = friction
+        self.restitution = restitution
+        self.sensor = isSensor
+
+
+class NumpyBody(object):
+    """a body of a NumpyWorld, its state is kept in row index of the arrays of the world"""
+    def __init__(self, world: 'NumpyWorld', index: int, static: bool):
+        self.world = world
+        self.index = index
+        self.fixtures = []
+        self.userData = None
+        self._static = static
+
+    @property
+    def type(self):
+        return Box2D.b2_staticBody if self._static else Box2D.b2_dynamicBody
+
+    @property
+    def position(self):
+        return _Vec2(*self.world._position[self.index])
+
+    @position.setter
+    def position(self, position):
+        self.world._position[self.index] = tuple(position)
+
+    @property
+    def angle(self):
+        return float(self.world._angle[self.index])
+
+    @angle.setter
+    def angle(self, angle):
+        self.world._angle[self.index] = angle
+
+    @property
+    def transform(self):
+        return self.position, self.angle
+
+    @transform.setter
+    def transform(self, transform):
+        self.position, self.angle = transform
+
+    @property
+    def linearVelocity(self):
+        return _Vec2(*self.world._velocity[self.index])
+
+    @linearVelocity.setter
+    def linearVelocity(self, velocity):
+        self.world._velocity[self.index] = tuple(velocity)
+
+    @property
+    def angularVelocity(self):
+        return float(self.world._angular_velocity[self.index])
+
+    @angularVelocity.setter
+    def angularVelocity(self, angular_velocity):
+        self.world._angular_velocity[self.index] = angular_velocity
+
+    @property
+    def linearDamping(self):
+        return float(self.world._damping[self.index, 0])
+
+    @linearDamping.setter
+    def linearDamping(self, damping):
+        self.world._damping[self.index, 0] = damping
+
+    @property
+    def angularDamping(self):
+        return float(self.world._damping[self.index, 1])
+
+    @angularDamping.setter
+    def angularDamping(self, damping):
+        self.world._damping[self.index, 1] = damping
+
+    @property
+    def awake(self):
+        # the bodies do not sleep
+        return self.world._active[self.index]
+
+    @awake.setter
+    def awake(self, awake):
+        pass
+
+    @property
+    def active(self):
+        return bool(self.world._active[self.index])
+
+    @active.setter
+    def active(self, active):
+        self.world._active[self.index] = active
+        self.world._shapes = None
+
+    @property
+    def mass(self):
+        return float(self.world._mass[self.index])
+
+    @property
+    def inertia(self):
+        return float(self.world._inertia[self.index])
+
+    def CreateFixture(self, shape=None, density=.0, friction=.2, restitution=.0, isSensor=False, **kwargs):
+        fixture = NumpyFixture(self, shape, density, friction, restitution, isSensor)
+        self.fixtures.append(fixture)
+        self.world._update_mass(self)
+        return fixture
+
+    def CreatePolygonFixture(self, box=None, shape=None, vertices=None, **kwargs):
+        if shape is None:
+            shape = Box2D.b2PolygonShape(box=tuple(box)) if box is not None else Box2D.b2PolygonShape(vertices=vertices)
+        return self.CreateFixture(shape=shape, **kwargs)
+
+    def CreateCircleFixture(self, radius, pos=(.0, .0), **kwargs):
+        return self.CreateFixture(shape=Box2D.b2CircleShape(radius=radius, pos=tuple(pos)), **kwargs)
+
+    def DestroyFixture(self, fixture):
+        self.fixtures.remove(fixture)
+        self.world._update_mass(self)
+
+    @property
+    def contacts(self):
+        return [_ContactEdge(c.bodyB if c.bodyA is self else c.bodyA, c) for c in self.world.contacts
+                if c.bodyA is self or c.bodyB is self]
+
+    @property
+    def contacts_gen(self):
+        return iter(self.contacts)
+
+
+class NumpyWorld(object):
+    """a world for discs and convex polygons that is stepped with array operations instead of one body at a time
+
+    The bodies are rows in arrays. Each step integrates the velocities with the damping of Box2D, moves the bodies and
+    resolves the overlaps with a position-based solver: in each of position_iterations iterations, the penetrations of
+    all disc-disc, disc-polygon, polygon-polygon, disc-wall and polygon-wall pairs are computed at once and the bodies
+    are moved apart by the mean of their corrections (Jacobi iterations), weighted by inverse mass and inertia. The
+    iterations stop early once no penetration is deeper than a small tolerance. After each iteration and after the
+    last one, the bodies are moved by their full penetration out of the walls of closed convex loops like the table,
+    thus no body leaves the table. The velocities after a step are the displacements divided by the time step.
+    Candidate disc pairs are found with a SpatialHash and kept as long as no body moved more than half of the skin,
+    the few polygons are tested against all discs.
+
+    Compared to Box2D, there is no friction, restitution, sleeping, continuous collision, joints or velocity solver;
+    walls are the edges of chain and edge shapes of static bodies and push the bodies towards the position of their
+    static body. Contact listeners, the contact index (KilobotsEnv.contacts) and contact impulses
+    (KilobotsEnv.contact_impulses) are not supported.
+
+    The backend only pays off for large swarms. For small swarms a step costs an order of magnitude more than with
+    Box2D, e.g., with the 15 kilobots of QuadAssemblyKilobotsEnv or with 50 kilobots. For large, dense swarms it is
+    faster than Box2D but far from interactive, a step of KilobotsEnv with 10000 kilobots takes seconds (see
+    benchmarks/physics_backends.py). The position solver separates heavily overlapping kilobots as slowly as Box2D.
+    """
+    # the margin of the candidates that are tested in the solver iterations relative to the radii of the discs and
+    # the skin of the Verlet list of candidates relative to the largest disc
+    _margin = .1
+    _skin = .5
+    # the linear slop of Box2D
+    _tolerance = .005
+
+    def __init__(self, capacity: int = 64):
+        self._bodies = []
+        self._free = []
+        self._allocate(capacity)
+        # the shape arrays, rebuilt when fixtures or bodies change
+        self._shapes = None
+        # the candidate pairs and the disc and polygon centres they were found at
+        self._candidates = None
+        self._reference = None
+        # the touching pairs of the last step
+        self._touching = np.zeros((0, 2), dtype=np.intp)
+        self._contacts = None
+        # the deepest penetration at the beginning of the last step, the world has no contact manifolds
+        self.penetration = .0
+
+    # the arrays that hold the state of the bodies, one row per body
+    _fields = (('_position', (2,), np.float64), ('_angle', (), np.float64), ('_velocity', (2,), np.float64),
+               ('_angular_velocity', (), np.float64), ('_damping', (2,), np.float64), ('_mass', (), np.float64),
+               ('_inertia', (), np.float64), ('_inv_mass', (), np.float64), ('_inv_inertia', (), np.float64),
+               ('_active', (), bool))
+
+    def _allocate(self, capacity):
+        for name, shape, dtype in self._fields:
+            array = np.zeros((capacity,) + shape, dtype=dtype)
+            old = getattr(self, name, None)
+            if old is not None:
+                array[:len(old)] = old
+            setattr(self, name, array)
+
+    @property
+    def contactListener(self):
+        return None
+
+    @contactListener.setter
+    def contactListener(self, listener):
+        raise NotImplementedError('contact listeners require the box2d physics backend')
+
+    def _create_body(self, static, position=(.0, .0), angle=.0, linearDamping=.0, angularDamping=.0, **kwargs):
+        if self._free:
+            index = self._free.pop()
+        else:
+            index = len(self._bodies)
+            if index == len(self._position):
+                self._allocate(2 * len(self._position))
+        body = NumpyBody(self, index, static)
+        if index == len(self._bodies):
+            self._bodies.append(body)
+        else:
+            self._bodies[index] = body
+
+        self._position[index] = tuple(position)
+        self._angle[index] = angle
+        self._velocity[index] = 0
+        self._angular_velocity[index] = 0
+        self._damping[index] = linearDamping, angularDamping
+        self._active[index] = True
+        self._update_mass(body)
+        return body
+
+    def CreateDynamicBody(self, **kwargs):
+        return self._create_body(False, **kwargs)
+
+    def CreateStaticBody(self, **kwargs):
+        return self._create_body(True, **kwargs)
+
+    def DestroyBody(self, body: NumpyBody):
+        self._bodies[body.index] = None
+        self._free.append(body.index)
+        self._active[body.index] = False
+        self._inv_mass[body.index] = self._inv_inertia[body.index] = 0
+        self._shapes = None
+        self._contacts = None
+        self._touching = self._touching[np.all(self._touching != body.index, axis=1)]
+
+    @property
+    def bodies(self):
+        return [b for b in self._bodies if b is not None]
+
+    @property
+    def bodyCount(self):
+        return len(self._bodies) - len(self._free)
+
+    @property
+    def contacts(self):
+        if self._contacts is None:
+            self._contacts = [_Contact(self._bodies[a], self._bodies[b], True) for a, b in self._touching.tolist()]
+        return self._contacts
+
+    @property
+    def contactCount(self):
+        return len(self._touching)
+
+    def ClearForces(self):
+        pass
+
+    def _update_mass(self, body: NumpyBody):
+        mass = inertia = .0
+        for fixture in body.fixtures:
+            shape = fixture.shape
+            if fixture.sensor or not fixture.density:
+                continue
+            if isinstance(shape, Box2D.b2CircleShape):
+                m = fixture.density * np.pi * shape.radius ** 2
+                mass += m
+                inertia += m * (.5 * shape.radius ** 2 + np.dot(shape.pos, shape.pos))
+            elif isinstance(shape, Box2D.b2PolygonShape):
+                v = np.asarray(shape.vertices)
+                w = np.roll(v, -1, axis=0)
+                cross = v[:, 0] * w[:, 1] - v[:, 1] * w[:, 0]
+                mass += fixture.density * abs(cross.sum()) / 2
+                inertia += fixture.density * abs(np.sum(cross * (np.sum(v * v, axis=1) + np.sum(v * w, axis=1)
+                                                                   + np.sum(w * w, axis=1)))) / 12
+        i = body.index
+        self._mass[i], self._inertia[i] = mass, inertia
+        dynamic = not body._static and mass > 0
+        self._inv_mass[i] = 1 / mass if dynamic else .0
+        self._inv_inertia[i] = 1 / inertia if dynamic and inertia > 0 else .0
+        self._shapes = None
+
+    def _build_shapes(self):
+        disc_body, disc_radius, disc_offset = [], [], []
+        part_body, part_vertices = [], []
+        wall_a, wall_b, wall_normal, wall_body, wall_bounding = [], [], [], [], []
+        for body in self.bodies:
+            if not self._active[body.index]:
+                continue
+            for fixture in body.fixtures:
+                shape = fixture.shape
+                if fixture.sensor:
+                    continue
+                if isinstance(shape, Box2D.b2CircleShape):
+                    disc_body.append(body.index)
+                    disc_radius.append(shape.radius)
+                    disc_offset.append(tuple(shape.pos))
+                elif isinstance(shape, Box2D.b2PolygonShape):
+                    v = np.asarray(shape.vertices, dtype=np.float64)
+                    # counter-clockwise such that the edge normals point outwards
+                    if np.sum(v[:, 0] * np.roll(v[:, 1], -1) - v[:, 1] * np.roll(v[:, 0], -1)) < 0:
+                        v = v[::-1]
+                    part_body.append(body.index)
+                    part_vertices.append(v)
+                elif body._static and isinstance(shape, (Box2D.b2ChainShape, Box2D.b2EdgeShape)):
+                    vertices = np.asarray(shape.vertices, dtype=np.float64)
+                    # in the world frame, walls point towards the position of their body
+                    c, s = np.cos(self._angle[body.index]), np.sin(self._angle[body.index])
+                    vertices = vertices @ np.array([[c, s], [-s, c]]) + self._position[body.index]
+                    normals = []
+                    for a, b in zip(vertices[:-1], vertices[1:]):
+                        u = (b - a) / np.linalg.norm(b - a)
+                        n = np.array([-u[1], u[0]])
+                        if np.dot(self._position[body.index] - a, n) < 0:
+                            n = -n
+                        normals.append(n)
+                        wall_a.append(a)
+                        wall_b.append(b)
+                        wall_normal.append(n)
+                        wall_body.append(body.index)
+                    wall_bounding += [self._is_bounding_loop(vertices, normals)] * len(normals)
+
+        shapes = dict(disc_body=np.array(disc_body, dtype=np.intp), disc_radius=np.array(disc_radius),
+                      disc_offset=np.array(disc_offset).reshape((-1, 2)), disc_centred=not np.any(disc_offset))
+
+        # the polygons are padded to the same number of vertices, the padded edges are masked
+        num_vertices = max((len(v) for v in part_vertices), default=0)
+        vertices = np.zeros((len(part_vertices), num_vertices, 2))
+        valid = np.zeros((len(part_vertices), num_vertices), dtype=bool)
+        for i, v in enumerate(part_vertices):
+            vertices[i, :len(v)] = v
+            vertices[i, len(v):] = v[0]
+            valid[i, :len(v)] = True
+        edges = np.roll(vertices, -1, axis=1) - vertices
+        for i, v in enumerate(part_vertices):
+            edges[i, len(v) - 1] = v[0] - v[-1]
+        lengths = np.linalg.norm(edges, axis=2)
+        normals = np.stack((edges[..., 1], -edges[..., 0]), axis=-1) / np.where(lengths > 0, lengths, 1)[..., None]
+        centres = np.array([v.mean(axis=0) for v in part_vertices]).reshape((-1, 2))
+        shapes.update(part_body=np.array(part_body, dtype=np.intp), part_vertices=vertices, part_valid=valid,
+                      part_edges=edges, part_normals=normals, part_centre=centres,
+                      part_radius=np.max(np.linalg.norm(vertices - centres[:, None], axis=2), axis=1,
+                                         initial=.0))
+
+        shapes.update(wall_a=np.array(wall_a).reshape((-1, 2)), wall_b=np.array(wall_b).reshape((-1, 2)),
+                      wall_normal=np.array(wall_normal).reshape((-1, 2)),
+                      wall_body=np.array(wall_body, dtype=np.intp), wall_bounding=np.array(wall_bounding, dtype=bool))
+        self._shapes = shapes
+
+    @staticmethod
+    def _is_bounding_loop(vertices, normals):
+        # a closed convex loop with all normals pointing inwards (like the table) is the intersection of the
+        # half-planes of its edges
+        if len(vertices) < 4 or not np.allclose(vertices[0], vertices[-1]):
+            return False
+        edges = np.diff(vertices, axis=0)
+        turns = _cross(edges, np.roll(edges, -1, axis=0))
+        if not (np.all(turns >= 0) or np.all(turns <= 0)):
+            return False
+        # the inside of a counter-clockwise loop is on the left of its edges
+        left = np.stack((-edges[:, 1], edges[:, 0]), axis=1)
+        return bool(np.all(np.sign(turns.sum()) * np.sum(np.array(normals) * left, axis=1) > 0))
+
+    def _rotate(self, points, rows):
+        c, s = np.cos(self._angle[rows]), np.sin(self._angle[rows])
+        return np.stack((c * points[..., 0] - s * points[..., 1], s * points[..., 0] + c * points[..., 1]), axis=-1)
+
+    def Step(self, time_step: float, velocity_iterations: int, position_iterations: int):
+        """integrates the bodies and resolves their overlaps in up to position_iterations iterations
+
+        :param velocity_iterations: not used, there is no velocity solver, the argument is kept for the interface of
+                                    b2World.Step
+        """
+        if self._shapes is None:
+            self._build_shapes()
+            self._candidates = None
+
+        moving = self._active & (self._inv_mass > 0)
+        position0, angle0 = self._position.copy(), self._angle.copy()
+
+        # integrate with the damping of Box2D
+        self._velocity[moving] *= damping_factor(time_step, self._damping[moving, :1])
+        self._angular_velocity[moving] *= damping_factor(time_step, self._damping[moving, 1])
+        self._position[moving] += time_step * self._velocity[moving]
+        self._angle[moving] += time_step * self._angular_velocity[moving]
+
+        disc_pairs, disc_part_pairs, part_pairs, wall_discs = self._find_pairs()
+
+        touching = None
+        for _ in range(max(position_iterations, 1)):
+            corrections = _Corrections(len(self._position))
+            solved = [self._solve_discs(disc_pairs, corrections),
+                      self._solve_disc_parts(disc_part_pairs, corrections),
+                      self._solve_parts(part_pairs, corrections),
+                      self._solve_disc_walls(wall_discs, corrections),
+                      self._solve_part_walls(corrections)]
+            # the bodies touch if they overlap after the integration, the later iterations only separate them
+            if touching is None:
+                touching = solved
+                self.penetration = corrections.depth
+            # like the slop of Box2D, penetrations below the tolerance are left to the next step
+            if corrections.depth <= self._tolerance:
+                break
+            corrections.apply(self._position, self._angle, self._inv_mass, self._inv_inertia)
+            self._project_into_bounds(moving)
+        # penetrations below the tolerance and bodies that passed a corner are left by the iterations
+        self._project_into_bounds(moving)
+
+        self._velocity[moving] = (self._position[moving] - position0[moving]) / time_step
+        self._angular_velocity[moving] = (self._angle[moving] - angle0[moving]) / time_step
+
+        touching = np.sort(np.concatenate(touching).reshape((-1, 2)), axis=1)
+        keys = np.unique(touching[:, 0] * len(self._position) + touching[:, 1])
+        self._touching = np.stack(np.divmod(keys, len(self._position)), axis=1)
+        self._contacts = None
+
+    def _disc_centres(self, discs=slice(None)):
+        shapes = self._shapes
+        rows = shapes['disc_body'][discs]
+        if shapes['disc_centred']:
+            return self._position[rows]
+        return self._position[rows] + self._rotate(shapes['disc_offset'][discs], rows)
+
+    def _part_centres(self):
+        shapes = self._shapes
+        rows = shapes['part_body']
+        return self._position[rows] + self._rotate(shapes['part_centre'], rows)
+
+    def _find_pairs(self):
+        # the candidate pairs are kept over several steps (a Verlet list), they include all pairs within skin of
+        # touching and are searched again once a disc or polygon moved by more than half of the skin
+        shapes = self._shapes
+        centres, part_centres = self._disc_centres(), self._part_centres()
+        radius = shapes['disc_radius']
+        points = np.concatenate((centres, part_centres))
+        if self._candidates is None or np.max(np.sum((points - self._reference) ** 2, axis=1), initial=.0) \
+                > (self._skin * radius.max(initial=.0) / 2) ** 2:
+            self._candidates = self._find_candidates(centres, part_centres, self._skin * radius.max(initial=.0))
+            self._reference = points
+        disc_pairs, disc_part_pairs, part_pairs, wall_discs = self._candidates
+
+        # the solver iterations only test the candidates that are about to touch
+        if len(disc_pairs):
+            i, j = disc_pairs[:, 0], disc_pairs[:, 1]
+            reach = (radius[i] + radius[j]) * (1 + self._margin)
+            disc_pairs = disc_pairs[np.sum((centres[j] - centres[i]) ** 2, axis=1) <= reach * reach]
+        disc, _, _ = self._walls(centres[wall_discs], radius[wall_discs] * (1 + self._margin))
+        return disc_pairs, disc_part_pairs, part_pairs, np.unique(wall_discs[disc])
+
+    def _find_candidates(self, centres, part_centres, skin):
+        shapes = self._shapes
+        empty = np.zeros((0, 2), dtype=np.intp)
+        disc_pairs = disc_part_pairs = part_pairs = empty
+
+        radius = shapes['disc_radius']
+        wall_discs, _, _ = self._walls(centres, radius + skin)
+        wall_discs = np.unique(wall_discs)
+        if len(centres):
+            reach = 2 * radius.max() + skin
+            grid = SpatialHash(reach)
+            grid.build(centres)
+            i, j, _ = grid.query(centres, reach, sort=False)
+            disc_pairs = np.stack((i, j), axis=1)[i < j]
+
+        part_rows = shapes['part_body']
+        if len(part_rows):
+            if len(centres):
+                distances = np.linalg.norm(part_centres[:, None] - centres[None], axis=2)
+                p, d = np.nonzero(distances <= shapes['part_radius'][:, None] + radius[None] + skin)
+                disc_part_pairs = np.stack((d, p), axis=1)
+            distances = np.linalg.norm(part_centres[:, None] - part_centres[None], axis=2)
+            p, q = np.nonzero(distances <= shapes['part_radius'][:, None] + shapes['part_radius'][None] + skin)
+            other = part_rows[p] != part_rows[q]
+            # both orders, the vertices of each part are tested against the other part
+            part_pairs = np.stack((p[other], q[other]), axis=1)
+        return disc_pairs, disc_part_pairs, part_pairs, wall_discs
+
+    def _solve_discs(self, pairs, corrections):
+        if not len(pairs):
+            return pairs
+        shapes = self._shapes
+        centres = self._disc_centres()
+        i, j = pairs[:, 0], pairs[:, 1]
+        d = centres[j] - centres[i]
+        distance = np.sqrt(np.sum(d * d, axis=1))
+        depth = shapes['disc_radius'][i] + shapes['disc_radius'][j] - distance
+        close = depth > 0
+        i, j, d, distance, depth = i[close], j[close], d[close], distance[close], depth[close]
+        normal = np.where(distance[:, None] > 0, d / np.where(distance > 0, distance, 1)[:, None], (1., 0.))
+
+        a, b = shapes['disc_body'][i], shapes['disc_body'][j]
+        corrections.add_pair(a, b, normal, depth, None, None, self._inv_mass, self._inv_inertia)
+        return np.stack((a, b), axis=1)
+
+    def _solve_disc_parts(self, pairs, corrections):
+        if not len(pairs):
+            return pairs
+        shapes = self._shapes
+        d, p = pairs[:, 0], pairs[:, 1]
+        rows = shapes['part_body'][p]
+        radius = shapes['disc_radius'][d]
+
+        # the disc centres in the frames of the polygons
+        c, s = np.cos(self._angle[rows]), np.sin(self._angle[rows])
+        offset = self._disc_centres(d) - self._position[rows]
+        q = np.stack((c * offset[:, 0] + s * offset[:, 1], -s * offset[:, 0] + c * offset[:, 1]), axis=1)
+
+        vertices, edges, normals, valid = (shapes['part_vertices'][p], shapes['part_edges'][p],
+                                           shapes['part_normals'][p], shapes['part_valid'][p])
+        to_centre = q[:, None] - vertices
+        separations = np.where(valid, np.sum(normals * to_centre, axis=2), -np.inf)
+        k = np.argmax(separations, axis=1)
+        separation = separations[np.arange(len(k)), k]
+        inside = separation <= 0
+
+        lengths = np.sum(edges * edges, axis=2)
+        t = np.clip(np.sum(to_centre * edges, axis=2) / np.where(lengths > 0, lengths, 1), 0, 1)
+        closest = vertices + t[..., None] * edges
+        distances = np.where(valid, np.sum((q[:, None] - closest) ** 2, axis=2), np.inf)
+        m = np.argmin(distances, axis=1)
+        closest = closest[np.arange(len(m)), m]
+        distance = np.sqrt(distances[np.arange(len(m)), m])
+
+        normal = np.where(inside[:, None], normals[np.arange(len(k)), k],
+                          (q - closest) / np.where(distance > 0, distance, 1)[:, None])
+        depth = np.where(inside, radius - separation, radius - distance)
+        point = np.where(inside[:, None], q - normal * separation[:, None], closest)
+
+        close = depth > 0
+        rows, d, normal, depth, point = rows[close], d[close], normal[close], depth[close], point[close]
+        c, s = c[close], s[close]
+        # to the world frame, the normal points from the polygon to the disc
+        normal = np.stack((c * normal[:, 0] - s * normal[:, 1], s * normal[:, 0] + c * normal[:, 1]), axis=1)
+        arm = np.stack((c * point[:, 0] - s * point[:, 1], s * point[:, 0] + c * point[:, 1]), axis=1)
+
+        discs = shapes['disc_body'][d]
+        corrections.add_pair(rows, discs, normal, depth, arm, None, self._inv_mass, self._inv_inertia)
+        return np.stack((rows, discs), axis=1)
+
+    def _part_world_vertices(self, parts):
+        shapes = self._shapes
+        rows = shapes['part_body'][parts]
+        return self._position[rows][:, None] + self._rotate(shapes['part_vertices'][parts], rows[:, None])
+
+    def _solve_parts(self, pairs, corrections):
+        # the vertices of part p that are inside part q
+        if not len(pairs):
+            return pairs
+        shapes = self._shapes
+        p, q = pairs[:, 0], pairs[:, 1]
+        rows_p, rows_q = shapes['part_body'][p], shapes['part_body'][q]
+
+        vertices = self._part_world_vertices(p) - self._position[rows_q][:, None]
+        c, s = np.cos(self._angle[rows_q])[:, None], np.sin(self._angle[rows_q])[:, None]
+        local = np.stack((c * vertices[..., 0] + s * vertices[..., 1], -s * vertices[..., 0] + c * vertices[..., 1]),
+                         axis=-1)
+        # separations of the vertices of p (axis 1) to the edges of q (axis 2)
+        separations = np.sum(shapes['part_normals'][q][:, None]
+                             * (local[:, :, None] - shapes['part_vertices'][q][:, None]), axis=3)
+        separations = np.where(shapes['part_valid'][q][:, None], separations, -np.inf)
+        k = np.argmax(separations, axis=2)
+        separation = np.take_along_axis(separations, k[..., None], axis=2)[..., 0]
+        inside = (separation < 0) & shapes['part_valid'][p]
+
+        pair, vertex = np.nonzero(inside)
+        if not len(pair):
+            return np.zeros((0, 2), dtype=np.intp)
+        normal = shapes['part_normals'][q[pair], k[pair, vertex]]
+        c, s = c[pair, 0], s[pair, 0]
+        # the normal points from q to the vertex of p
+        normal = np.stack((c * normal[:, 0] - s * normal[:, 1], s * normal[:, 0] + c * normal[:, 1]), axis=1)
+        point = vertices[pair, vertex] + self._position[rows_q[pair]]
+        a, b = rows_q[pair], rows_p[pair]
+        corrections.add_pair(a, b, normal, -separation[pair, vertex], point - self._position[a],
+                             point - self._position[b], self._inv_mass, self._inv_inertia)
+        return np.stack((a, b), axis=1)
+
+    def _walls(self, points, radius):
+        # the penetrations of points with radius into the walls
+        shapes = self._shapes
+        a, b, normal = shapes['wall_a'], shapes['wall_b'], shapes['wall_normal']
+        if not len(a) or not len(points):
+            return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp), np.zeros(0)
+        tangent = b - a
+        to_point = points[:, None] - a[None]
+        t = np.sum(to_point * tangent[None], axis=2) / np.sum(tangent * tangent, axis=1)[None]
+        depth = radius[:, None] - np.sum(to_point * normal[None], axis=2)
+        point, wall = np.nonzero((depth > 0) & (t >= 0) & (t <= 1))
+        return point, wall, depth[point, wall]
+
+    def _solve_disc_walls(self, discs, corrections):
+        if not len(discs):
+            return np.zeros((0, 2), dtype=np.intp)
+        shapes = self._shapes
+        rows = shapes['disc_body'][discs]
+        disc, wall, depth = self._walls(self._disc_centres(discs), shapes['disc_radius'][discs])
+        if not len(disc):
+            return np.zeros((0, 2), dtype=np.intp)
+        rows = rows[disc]
+        corrections.add_static(rows, shapes['wall_normal'][wall], depth, None, self._inv_mass, self._inv_inertia)
+        return np.stack((rows, shapes['wall_body'][wall]), axis=1)
+
+    def _solve_part_walls(self, corrections):
+        shapes = self._shapes
+        parts = np.arange(len(shapes['part_body']))
+        if not len(parts):
+            return np.zeros((0, 2), dtype=np.intp)
+        vertices = self._part_world_vertices(parts)
+        rows = np.broadcast_to(shapes['part_body'][:, None], vertices.shape[:2])
+        valid = shapes['part_valid']
+        vertices, rows = vertices[valid], rows[valid]
+        vertex, wall, depth = self._walls(vertices, np.zeros(len(vertices)))
+        rows = rows[vertex]
+        corrections.add_static(rows, shapes['wall_normal'][wall], depth, vertices[vertex] - self._position[rows],
+                               self._inv_mass, self._inv_inertia)
+        return np.stack((rows, shapes['wall_body'][wall]), axis=1)
+
+    def _project_into_bounds(self, moving):
+        # the mean corrections of the iterations do not resolve all penetrations of the walls in a dense swarm that
+        # is pushed against them, thus the bodies are moved into the half-plane of each wall of a closed convex loop
+        # by their full penetration
+        shapes = self._shapes
+        bounding = shapes['wall_bounding']
+        parts = np.arange(len(shapes['part_body']))
+        for a, normal in zip(shapes['wall_a'][bounding], shapes['wall_normal'][bounding]):
+            shift = np.zeros(len(self._position))
+            if len(shapes['disc_body']):
+                depth = shapes['disc_radius'] - (self._disc_centres() - a) @ normal
+                np.maximum.at(shift, shapes['disc_body'], depth)
+            if len(parts):
+                depth = -(self._part_world_vertices(parts) - a) @ normal
+                depth = np.max(np.where(shapes['part_valid'], depth, -np.inf), axis=1)
+                np.maximum.at(shift, shapes['part_body'], depth)
+            shift[~moving] = 0
+            self._position += shift[:, None] * normal
+
+
+def _cross(a, b):
+    return a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0]
+
+
+class _Corrections(object):
+    # the position and angle corrections of one solver iteration, averaged per body
+    def __init__(self, num_bodies):
+        self._n = num_bodies
+        self._dx, self._dy, self._da = [], [], []
+        # the deepest penetration that was resolved
+        self.depth = .0
+
+    def _add(self, rows, dx, dy, da):
+        self._dx.append((rows, dx))
+        self._dy.append((rows, dy))
+        self._da.append((rows, da))
+
+    def add_pair(self, a, b, normal, depth, arm_a, arm_b, inv_mass, inv_inertia):
+        """moves b along normal and a against it to resolve depth, the arms are the contact points relative to the
+        positions of the bodies (None for discs, which are not rotated by contacts)"""
+        w_a, w_b = inv_mass[a], inv_mass[b]
+        w = w_a + w_b
+        if arm_a is not None:
+            r_a = _cross(arm_a, normal)
+            w = w + inv_inertia[a] * r_a * r_a
+        if arm_b is not None:
+            r_b = _cross(arm_b, normal)
+            w = w + inv_inertia[b] * r_b * r_b
+        impulse = np.where(w > 0, depth / np.where(w > 0, w, 1), 0)
+        self.depth = max(self.depth, depth.max(initial=.0))
+
+        self._add(a, -normal[:, 0] * impulse * w_a, -normal[:, 1] * impulse * w_a,
+                  -inv_inertia[a] * r_a * impulse if arm_a is not None else np.zeros(len(a)))
+        self._add(b, normal[:, 0] * impulse * w_b, normal[:, 1] * impulse * w_b,
+                  inv_inertia[b] * r_b * impulse if arm_b is not None else np.zeros(len(b)))
+
+    def add_static(self, rows, normal, depth, arm, inv_mass, inv_inertia):
+        """moves the bodies along normal to resolve depth against static geometry"""
+        w = inv_mass[rows].copy()
+        if arm is not None:
+            r = _cross(arm, normal)
+            w += inv_inertia[rows] * r * r
+        impulse = np.where(w > 0, depth / np.where(w > 0, w, 1), 0)
+        self.depth = max(self.depth, depth.max(initial=.0))
+        self._add(rows, normal[:, 0] * impulse * inv_mass[rows], normal[:, 1] * impulse * inv_mass[rows],
+                  inv_inertia[rows] * r * impulse if arm is not None else np.zeros(len(rows)))
+
+    def apply(self, position, angle, inv_mass, inv_inertia):
+        if not self._dx:
+            return
+        rows = np.concatenate([r for r, _ in self._dx])
+        if not len(rows):
+            return
+        count = np.bincount(rows, minlength=self._n)
+        scale = 1 / np.maximum(count, 1)
+        position[:, 0] += np.bincount(rows, np.concatenate([v for _, v in self._dx]), minlength=self._n) * scale
+        position[:, 1] += np.bincount(rows, np.concatenate([v for _, v in self._dy]), minlength=self._n) * scale
+        angle += np.bincount(rows, np.concatenate([v for _, v in self._da]), minlength=self._n) * scale
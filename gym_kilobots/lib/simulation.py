@@ -0,0 +1,208 @@
+"""simulation profiles for KilobotsEnv
+
+A profile sets the rates and the solver iterations of the simulation of a KilobotsEnv:
+
+    steps_per_second: the rate of the sub-steps, in each sub-step the light, the messaging and the kilobots are
+        stepped once, i.e., the control rate of the kilobots
+    steps_per_action: the number of sub-steps per call of KilobotsEnv.step
+    physics_steps: the number of world steps per sub-step, each world step advances 1 / (steps_per_second *
+        physics_steps) seconds
+    velocity_iterations, position_iterations: the iterations of the Box2D solver per world step
+
+The profiles only differ in the cost of the physics, they keep the control rate and the duration of an action. The
+'default' profile has the values that KilobotsEnv always used, 'fast' solves the contacts with fewer iterations and
+'accurate' splits each sub-step into four world steps with more iterations, it serves as reference for the divergence
+of the other profiles (see benchmarks/simulation_profiles.py).
+"""
+import collections
+import math
+
+import Box2D
+
+from .body import _world_scale
+from .messaging import SpatialHash
+from .physics import NumpyWorld
+
+
+class SimulationProfile(collections.namedtuple('SimulationProfile', (
+        'steps_per_second', 'steps_per_action', 'physics_steps', 'velocity_iterations', 'position_iterations'))):
+    """the rates and solver iterations of a simulation, see make_profile"""
+    __slots__ = ()
+
+    @property
+    def sim_step(self) -> float:
+        """the duration of a sub-step in seconds"""
+        return 1. / self.steps_per_second
+
+    @property
+    def physics_step(self) -> float:
+        """the duration of a world step in seconds"""
+        return 1. / (self.steps_per_second * self.physics_steps)
+
+
+simulation_profiles = {
+    'fast': SimulationProfile(steps_per_second=10, steps_per_action=10, physics_steps=1, velocity_iterations=4,
+                              position_iterations=2),
+    'default': SimulationProfile(steps_per_second=10, steps_per_action=10, physics_steps=1, velocity_iterations=10,
+                                 position_iterations=10),
+    'accurate': SimulationProfile(steps_per_second=10, steps_per_action=10, physics_steps=4, velocity_iterations=20,
+                                  position_iterations=20),
+}
+
+
+def make_profile(profile='default', **overrides) -> SimulationProfile:
+    """the named profile (or the given SimulationProfile) with some of its values replaced
+
+        make_profile('fast', velocity_iterations=6)
+
+    :param profile: str the name of a profile in simulation_profiles or a SimulationProfile
+    :param overrides: the values to replace, all values are positive integers
+    """
+    if not isinstance(profile, SimulationProfile):
+        if profile not in simulation_profiles:
+            raise ValueError('unknown simulation profile {}, available profiles: {}'.format(
+                profile, ', '.join(simulation_profiles)))
+        profile = simulation_profiles[profile]
+
+    unknown = set(overrides) - set(SimulationProfile._fields)
+    if unknown:
+        raise ValueError('unknown simulation parameters {}, available parameters: {}'.format(
+            ', '.join(sorted(unknown)), ', '.join(SimulationProfile._fields)))
+    profile = profile._replace(**overrides)
+    for field, value in zip(profile._fields, profile):
+        if int(value) != value or value < 1:
+            raise ValueError('{} has to be a positive integer, got {}'.format(field, value))
+    return profile
+
+
+class AdaptiveIterations(object):
+    """chooses the solver iterations of each world step from the contact load of the world
+
+    The velocity iterations grow with the number of touching contacts per body, the position iterations grow with the
+    deepest penetration of any two touching bodies, i.e., of two kilobots, a kilobot and an object, two objects or a
+    body and a wall of the table. Both scale linearly from the minimum to the maximum, which they reach at
+    full_contacts touching contacts per body and at a penetration of full_depth. A world without contacts is stepped
+    with the minimal iterations.
+
+    The kilobot pairs are found with a SpatialHash from the poses of the swarm, the contacts of the table and the
+    objects are read from their Box2D contact manifolds in the way Box2D computes the separations of a contact. The
+    NumpyWorld has no manifolds, its own deepest penetration of the last step is used instead. Measuring the load
+    costs about as much as a world step, it is measured only if the world has contacts, at most every depth_interval
+    world steps and only when the poses of the swarm are valid, i.e., at the first world step of a sub-step. The
+    position solvers of both backends stop early once the penetrations are below their slop, a stale depth rather
+    costs iterations than accuracy.
+
+    Assign an instance to KilobotsEnv.adaptive_iterations to enable it, the chosen iterations are summed per step in the
+    counters velocity_iterations and position_iterations of PerfStats. It is off by default because it does not pay
+    off in this tree: with 1000 kilobots and the accurate profile a step took 108 ms with adaptive and 111 ms with
+    fixed iterations, with the default profile the difference is within the noise. In a dense swarm the contacts keep
+    the iterations at the maximum and the measurements cost about 3% (541 vs 526 ms per step with 1000 kilobots). The
+    solver iterations are a small part of an env step.
+
+    :param minimum: (int, int) the least velocity and position iterations
+    :param maximum: (int, int) the most velocity and position iterations, defaults to those of the simulation profile
+    :param full_contacts: float the number of touching contacts per body at which the maximal velocity iterations are
+                          used
+    :param full_depth: float the penetration in meters at which the maximal position iterations are used
+    :param depth_interval: int the number of world steps between two measurements of the contacts
+    """
+    def __init__(self, minimum=(1, 1), maximum=None, full_contacts: float = 1., full_depth: float = .001,
+                 depth_interval: int = 10):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.full_contacts = full_contacts
+        self.full_depth = full_depth
+        self.depth_interval = depth_interval
+        self._touching = 0
+        self._depth = .0
+        self._countdown = 0
+
+        # the iterations chosen for the last world step
+        self.velocity_iterations, self.position_iterations = minimum
+
+    @staticmethod
+    def _scale(minimum, maximum, load):
+        return minimum + math.ceil((maximum - minimum) * min(max(load, .0), 1.))
+
+    @staticmethod
+    def _kilobot_contacts(swarm):
+        # the number of touching kilobot pairs and their deepest penetration
+        diameter = 2 * max((kb._radius for kb in swarm.kilobots), default=.0)
+        if not swarm._pose_cache.valid:
+            swarm.sync()
+        positions = swarm.poses[:, :2]
+        if len(positions) < 2 or not diameter:
+            return 0, .0
+        grid = SpatialHash(diameter)
+        grid.build(positions)
+        i, j, distances = grid.query(positions, diameter, sort=False)
+        distances = distances[(i < j) & (distances < diameter)]
+        return len(distances), float(diameter - distances.min(initial=diameter))
+
+    @staticmethod
+    def _separation(contact) -> float:
+        # the separation of the manifold points like b2WorldManifold::Initialize, negative if the bodies overlap
+        manifold = contact.manifold
+        fixture_a, fixture_b = contact.fixtureA, contact.fixtureB
+        radii = fixture_a.shape.radius + fixture_b.shape.radius
+        transform_a, transform_b = fixture_a.body.transform, fixture_b.body.transform
+        if manifold.type_ == Box2D.b2Manifold.e_circles:
+            return (transform_b * manifold.points[0].localPoint - transform_a * manifold.localPoint).length - radii
+        if manifold.type_ == Box2D.b2Manifold.e_faceB:
+            transform_a, transform_b = transform_b, transform_a
+        normal = transform_a.q * manifold.localNormal
+        plane = transform_a * manifold.localPoint
+        return min(Box2D.b2Dot(transform_b * p.localPoint - plane, normal) for p in manifold.points) - radii
+
+    def measure(self, world, swarm, bodies=()):
+        """the number of touching contacts and the deepest penetration in meters
+
+        :param world: the world of the bodies
+        :param swarm: KilobotSwarm
+        :param bodies: the other bodies of the world, i.e., the table and the bodies of the objects
+        """
+        # the swarm is not kept, its kilobots have to be destroyed with the bodies of the environment
+        touching, depth = self._kilobot_contacts(swarm)
+        if isinstance(world, NumpyWorld):
+            return world.contactCount, max(depth, world.penetration / _world_scale)
+
+        # each contact between two of the bodies is seen from both
+        seen = set()
+        for body in bodies:
+            seen.add(hash(body))
+            for edge in body.contacts_gen:
+                contact = edge.contact
+                if hash(edge.other) in seen or not contact.touching or not contact.manifold.pointCount:
+                    continue
+                touching += 1
+                depth = max(depth, -self._separation(contact) / _world_scale)
+        return touching, depth
+
+    def penetration(self, world, swarm, bodies=()) -> float:
+        """the deepest penetration of two touching bodies in meters, see measure"""
+        return self.measure(world, swarm, bodies)[1]
+
+    def choose(self, world, swarm, profile: SimulationProfile, bodies=()):
+        """the velocity and position iterations for the next world step
+
+        :param world: the world before the step
+        :param swarm: KilobotSwarm
+        :param profile: SimulationProfile that provides the maximal iterations if maximum is None
+        :param bodies: the other bodies of the world, i.e., the table and the bodies of the objects
+        """
+        maximum = self.maximum or (profile.velocity_iterations, profile.position_iterations)
+        if not world.contactCount:
+            self._touching, self._depth, self._countdown = 0, .0, 0
+            self.velocity_iterations, self.position_iterations = self.minimum
+            return self.minimum
+
+        # the poses are read from Box2D once per sub-step anyway, the contacts are only measured from valid poses
+        if self._countdown <= 0 and swarm._pose_cache.valid:
+            self._touching, self._depth = self.measure(world, swarm, bodies)
+            self._countdown = self.depth_interval
+        self._countdown -= 1
+
+        self.velocity_iterations = self._scale(self.minimum[0], maximum[0],
+                                               self._touching / (self.full_contacts * max(world.bodyCount, 1)))
+        self.position_iterations = self._scale(self.minimum[1], maximum[1], self._depth / self.full_depth)
+        return self.velocity_iterations, self.position_iterations
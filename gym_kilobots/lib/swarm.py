@@ -0,0 +1,225 @@
+from typing import Iterable, Sequence
+
+import numpy as np
+
+from .body import Body, PoseCache, _world_scale, transform_points
+from .physics import batch_rows
+from .controller import controller_for
+from .kilobot import Kilobot
+
+
+class KilobotSwarm(object):
+    """keeps the state of a group of kilobots in contiguous arrays
+
+    The poses of all kilobots are kept in a PoseCache that is read from Box2D in one pass by sync(). The motor commands, light readings, turn
+    directions and highlight colors are owned by the swarm, each kilobot only holds views on its rows of these
+    arrays. The kilobots are stepped in groups by SwarmControllers which operate on these arrays.
+    """
+    _fields = ('motors', 'light_readings', 'turn_directions', 'highlight_colors', 'messages', 'transmitting',
+               'velocities', 'kinematic')
+
+    def __init__(self, kilobots: Sequence[Kilobot]):
+        self._source = kilobots
+        self._kilobots = tuple(kilobots)
+        self._bodies = [kb._body for kb in self._kilobots]
+        self._rows = batch_rows(self._bodies)
+
+        self._pose_cache = PoseCache(self._kilobots)
+        self.motors = np.zeros((len(self._kilobots), 2))
+        self.light_readings = np.zeros((len(self._kilobots), 3))
+        self.turn_directions = np.zeros(len(self._kilobots), dtype=np.int8)
+        self.highlight_colors = np.zeros((len(self._kilobots), 3), dtype=np.int32)
+        self.messages = np.zeros((len(self._kilobots), Kilobot._message_size), dtype=np.uint8)
+        self.transmitting = np.zeros(len(self._kilobots), dtype=bool)
+        # the velocities (x, y in m/s and angular in rad/s) commanded by set_velocities and the kinematic kilobots,
+        # which are taken out of Box2D and integrated by HybridStepping, their poses are only kept in the swarm
+        self.velocities = np.zeros((len(self._kilobots), 3))
+        self.kinematic = np.zeros(len(self._kilobots), dtype=bool)
+        self._damping = np.zeros((len(self._kilobots), 2))
+        for i, kb in enumerate(self._kilobots):
+            kb._bind(self, i)
+
+        self._uniform_state = all(type(kb).get_state is Body.get_state for kb in self._kilobots)
+
+        # the light sensors are computed from the pose array with the offset of each class, kilobots that override
+        # light_sensor_pos are asked one by one
+        self._light_sensor_offsets = np.array([kb._light_sensor_offset for kb in self._kilobots],
+                                              dtype=np.float64).reshape((-1, 2))
+        self._custom_light_sensors = [i for i, kb in enumerate(self._kilobots)
+                                      if type(kb).light_sensor_pos is not Kilobot.light_sensor_pos]
+
+        # the kilobots are stepped in groups of the same class and controller
+        groups = {}
+        for i, kb in enumerate(self._kilobots):
+            groups.setdefault((controller_for(kb), type(kb)), []).append(i)
+        self.controllers = [controller(self, np.array(idx)) for (controller, _), idx in groups.items()]
+
+        self.sync()
+
+    @classmethod
+    def concatenate(cls, swarms: Iterable['KilobotSwarm']) -> 'KilobotSwarm':
+        """creates one swarm from several swarms, the arrays of the given swarms become views on the new swarm"""
+        swarms = tuple(swarms)
+        swarm = cls(sum((s.kilobots for s in swarms), ()))
+
+        start = 0
+        # the rows of each controller of the new swarm that are taken by the controllers of the given swarms
+        controller_starts = dict.fromkeys(swarm.controllers, 0)
+        for s in swarms:
+            stop = start + len(s)
+            for field in cls._fields:
+                setattr(s, field, getattr(swarm, field)[start:stop])
+            s._pose_cache.view_on(swarm._pose_cache, start)
+            start = stop
+
+            for c in s.controllers:
+                other = next(o for o in swarm.controllers
+                             if type(o) is type(c) and o._kilobot_class is c._kilobot_class)
+                c.view_on(other, controller_starts[other])
+                controller_starts[other] += len(c._idx)
+
+        return swarm
+
+    def __len__(self):
+        return len(self._kilobots)
+
+    @property
+    def kilobots(self):
+        return self._kilobots
+
+    def holds(self, kilobots: Sequence[Kilobot]) -> bool:
+        return kilobots is self._source and len(kilobots) == len(self._kilobots)
+
+    @property
+    def poses(self):
+        return self._pose_cache.poses
+
+    @property
+    def light_values(self):
+        return self.light_readings[:, 0]
+
+    @property
+    def light_gradients(self):
+        return self.light_readings[:, 1:]
+
+    def invalidate(self):
+        self._pose_cache.invalidate()
+
+    def sync(self):
+        """reads the poses of all kilobots from Box2D, except for the kinematic kilobots"""
+        if self.kinematic.any():
+            self._pose_cache.sync(np.flatnonzero(~self.kinematic))
+        else:
+            self._pose_cache.sync()
+
+    def make_kinematic(self, idx: np.ndarray):
+        """deactivates the bodies of the kilobots idx, their velocities and damping are taken from the bodies"""
+        if not self._pose_cache.valid:
+            self.sync()
+        for i in idx.tolist():
+            body = self._bodies[i]
+            vx, vy = body.linearVelocity
+            self.velocities[i] = vx / _world_scale, vy / _world_scale, body.angularVelocity
+            self._damping[i] = body.linearDamping, body.angularDamping
+            body.active = False
+        self.kinematic[idx] = True
+
+    def make_dynamic(self, idx: np.ndarray = None):
+        """hands the kinematic kilobots idx (all by default) back to Box2D with their poses and velocities"""
+        if idx is None:
+            idx = np.flatnonzero(self.kinematic)
+        poses = self.poses[idx] * (_world_scale, _world_scale, 1.)
+        velocities = self.velocities[idx] * (_world_scale, _world_scale, 1.)
+        for i, (x, y, angle), (vx, vy, w) in zip(idx.tolist(), poses.tolist(), velocities.tolist()):
+            body = self._bodies[i]
+            body.transform = (x, y), angle
+            body.active = True
+            body.awake = True
+            body.linearVelocity = vx, vy
+            body.angularVelocity = w
+        self.kinematic[idx] = False
+
+    def light_sensor_positions(self):
+        if not self._pose_cache.valid:
+            self.sync()
+        poses = self.poses
+        positions = transform_points(self._light_sensor_offsets, poses[:, 0], poses[:, 1], poses[:, 2])
+        for i in self._custom_light_sensors:
+            positions[i] = self._kilobots[i].light_sensor_pos()
+        return positions
+
+    def set_light_values_and_gradients(self, values, gradients):
+        self.light_readings[:, 0] = values
+        self.light_readings[:, 1:] = gradients
+
+    def set_velocities(self, idx, linear_velocities, angular_velocities=None):
+        self.velocities[idx, :2] = linear_velocities
+        if angular_velocities is not None:
+            self.velocities[idx, 2] = angular_velocities
+        dynamic = ~self.kinematic[idx]
+        if not dynamic.all():
+            idx, linear_velocities = idx[dynamic], linear_velocities[dynamic]
+            if angular_velocities is not None:
+                angular_velocities = angular_velocities[dynamic]
+        if self._rows is not None:
+            world, rows = self._rows
+            world._velocity[rows[idx]] = linear_velocities * _world_scale
+            if angular_velocities is not None:
+                world._angular_velocity[rows[idx]] = angular_velocities
+            return
+        bodies = [self._bodies[i] for i in idx.tolist()]
+        for body, v in zip(bodies, (linear_velocities * _world_scale).tolist()):
+            body.linearVelocity = v
+        if angular_velocities is not None:
+            for body, w in zip(bodies, angular_velocities.tolist()):
+                body.angularVelocity = w
+
+    def turn_left(self, idx):
+        self.turn_directions[idx] = Kilobot._left
+        self.motors[idx] = 255, 0
+        self.highlight_colors[idx] = Kilobot._left_color
+
+    def turn_right(self, idx):
+        self.turn_directions[idx] = Kilobot._right
+        self.motors[idx] = 0, 255
+        self.highlight_colors[idx] = Kilobot._right_color
+
+    def switch_directions(self, idx):
+        left = self.turn_directions[idx] == Kilobot._left
+        self.turn_right(idx[left])
+        self.turn_left(idx[~left])
+
+    def receive(self, inbox):
+        """passes the messages of a tick to the controllers, see Messaging"""
+        for controller in self.controllers:
+            controller.receive(self, inbox)
+
+    def step(self, time_step):
+        for controller in self.controllers:
+            controller.step(self, time_step)
+
+    def snapshot(self):
+        """captures the Box2D state of the kilobots, the swarm arrays and the state of the controllers
+
+        The kinematic kilobots are handed back to Box2D first, this does not change their trajectories.
+        """
+        self.make_dynamic()
+        return {'bodies': self._pose_cache.snapshot(),
+                'fields': {field: getattr(self, field).copy() for field in self._fields},
+                'controllers': [c.snapshot() for c in self.controllers]}
+
+    def restore(self, snapshot):
+        self.make_dynamic()
+        self._pose_cache.restore(snapshot['bodies'])
+        # in place, the kilobots hold views on the swarm arrays
+        for field, value in snapshot['fields'].items():
+            getattr(self, field)[...] = value
+        for c, s in zip(self.controllers, snapshot['controllers']):
+            c.restore(s)
+
+    def get_state(self):
+        if self._uniform_state:
+            poses = self.poses.view()
+            poses.flags.writeable = False
+            return poses
+        return np.array([kb.get_state() for kb in self._kilobots])
@@ -3,5 +3,7 @@ from setuptools import setup, find_packages
 setup(name='gym_kilobots',
       version='0.0.1',
       install_requires=['gym', 'box2d-py', 'numpy', 'scipy', 'pygame', 'matplotlib'],
+      # loads the light maps of SmoothGridLight from images and records videos
+      extras_require={'images': ['imageio']},
       packages=find_packages()
 )
\ No newline at end of file
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from gym_kilobots.envs import DirectControlKilobotsEnv, YamlKilobotsEnv
+from gym_kilobots.envs.yaml_kilobots_env import EnvConfiguration
+from gym_kilobots.lib.kilobot import SimpleVelocityControlKilobot
+from gym_kilobots.lib.light import CircularGradientLight
+
+
+def make_configuration(num=10, light='circular', shape='quad', std=.03):
+    """a configuration of YamlKilobotsEnv with one object and a swarm that is spawned around the light"""
+    return EnvConfiguration(width=2., height=1.5, resolution=600,
+                            objects=[dict(idx=0, color=None, shape=shape, width=.15, height=.15, init='random',
+                                          symmetry=None)],
+                            light=dict(obj_type=light, init='random', radius=.2),
+                            kilobots=dict(num=num, mean='light', std=std))
+
+
+def yaml_env_class(kilobot_type='SimplePhototaxisKilobot'):
+    """a YamlKilobotsEnv with kilobots of the given class"""
+    class TestEnv(YamlKilobotsEnv):
+        def _init_kilobots(self, type=kilobot_type):
+            super()._init_kilobots(type)
+
+    return TestEnv
+
+
+class VelocityControlEnv(DirectControlKilobotsEnv):
+    """a row of SimpleVelocityControlKilobots that are driven by the actions"""
+    def _configure_environment(self):
+        self._light = CircularGradientLight(position=np.array([.0, .5]))
+        for x in (-.2, .0, .2):
+            kilobot = SimpleVelocityControlKilobot(self.world, position=(x, .0), orientation=.0,
+                                                   velocity=[.0, .0])
+            self._add_kilobot(kilobot)
+
+    def get_reward(self, state, action, new_state):
+        return .0
+
+
+@pytest.fixture
+def seeded():
+    np.random.seed(0)
@@ -0,0 +1,74 @@
+import numpy as np
+
+from gym_kilobots.lib import AdaptiveIterations
+
+from conftest import VelocityControlEnv, make_configuration, yaml_env_class
+
+
+class RecordingIterations(AdaptiveIterations):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.body_counts = []
+
+    def choose(self, world, swarm, profile, bodies=()):
+        self.body_counts.append(world.bodyCount)
+        return super().choose(world, swarm, profile, bodies)
+
+
+def make_env(num=50):
+    return yaml_env_class()(configuration=make_configuration(num=num))
+
+
+def test_iterations_follow_contacts(seeded):
+    env = make_env()
+    env.reset()
+    env.adaptive_iterations = AdaptiveIterations(minimum=(2, 3))
+    env.step(np.zeros(2))
+    assert env.world.contactCount > 0
+    assert 2 <= env.adaptive_iterations.velocity_iterations <= env.simulation.velocity_iterations
+    assert 3 <= env.adaptive_iterations.position_iterations <= env.simulation.position_iterations
+    env.close()
+
+
+def test_world_without_contacts_uses_the_minimum():
+    env = VelocityControlEnv()
+    env.reset()
+    env.adaptive_iterations = AdaptiveIterations(minimum=(2, 3))
+    env.step(np.zeros(6))
+    assert env.world.contactCount == 0
+    assert (env.adaptive_iterations.velocity_iterations, env.adaptive_iterations.position_iterations) == (2, 3)
+    env.close()
+
+
+def test_deep_object_penetration_raises_the_position_iterations(seeded):
+    env = make_env(num=1)
+    env.reset()
+    kilobot, body = env.kilobots[0], env.objects[0]._body
+    bodies = [env.table, body]
+    adaptive_iterations = AdaptiveIterations(minimum=(2, 3))
+    assert adaptive_iterations.measure(env.world, env.swarm, bodies) == (0, .0)
+
+    # push the object onto the kilobot, the next world step finds the contact
+    body.position = kilobot._body.position + (.5, .0)
+    env.world.Step(.0, 1, 1)
+    touching, depth = adaptive_iterations.measure(env.world, env.swarm, bodies)
+    assert touching == 1 and depth > 2 * kilobot._radius
+    velocity_iterations, position_iterations = adaptive_iterations.choose(env.world, env.swarm, env.simulation, bodies)
+    # one touching contact among three bodies
+    assert 2 < velocity_iterations < env.simulation.velocity_iterations
+    assert position_iterations == env.simulation.position_iterations
+    # without the bodies only the kilobots are measured
+    assert adaptive_iterations.measure(env.world, env.swarm) == (0, .0)
+    env.close()
+
+
+def test_reset_releases_bodies(seeded):
+    env = make_env()
+    env.adaptive_iterations = RecordingIterations(depth_interval=1)
+    env.reset()
+    env.step(np.zeros(2))
+    del env.adaptive_iterations.body_counts[:]
+    env.reset()
+    # the table, the object and the kilobots during the step that resolves the initial state
+    assert env.adaptive_iterations.body_counts == [1 + len(env.objects) + env.num_kilobots]
+    env.close()
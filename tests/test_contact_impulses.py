@@ -0,0 +1,62 @@
+import numpy as np
+from Box2D import b2ContactListener
+
+from gym_kilobots.lib import ContactImpulses
+
+from conftest import make_configuration, yaml_env_class
+
+
+class PostSolveImpulses(b2ContactListener):
+    """sums the impulses that Box2D reports to post-solve callbacks for the contacts of each object"""
+    def __init__(self, objects, kilobots):
+        super().__init__()
+        self.objects = [o._body for o in objects]
+        self.kilobots = [kb._body for kb in kilobots]
+        self.normal = np.zeros(len(objects))
+        self.push = np.zeros((len(objects), 2))
+
+    def PostSolve(self, contact, impulse):
+        points = contact.manifold.pointCount
+        body_a, body_b = contact.fixtureA.body, contact.fixtureB.body
+        for j, body in enumerate(self.objects):
+            if body in (body_a, body_b):
+                normal_impulse = sum(impulse.normalImpulses[:points])
+                self.normal[j] += normal_impulse
+                if (body_b if body == body_a else body_a) in self.kilobots:
+                    tangent_impulse = sum(impulse.tangentImpulses[:points])
+                    # the world manifold has to be kept while its normal is read
+                    world_manifold = contact.worldManifold
+                    nx, ny = world_manifold.normal
+                    sign = -1. if body == body_a else 1.
+                    self.push[j] += sign * np.array((normal_impulse * nx + tangent_impulse * ny,
+                                                     normal_impulse * ny - tangent_impulse * nx))
+
+
+def test_impulses_equal_the_post_solve_impulses(seeded):
+    # a dense swarm at a light that is placed at the object
+    configuration = make_configuration(num=40, std=.05)
+    configuration.light.init = 'object'
+    env = yaml_env_class('PhototaxisKilobot')(configuration=configuration)
+    env.contact_impulses = ContactImpulses()
+    env.reset()
+    listener = PostSolveImpulses(env.objects, env.kilobots)
+    env.world.contactListener = listener
+
+    for _ in range(5):
+        listener.normal[:] = 0
+        listener.push[:] = 0
+        *_, info = env.step(np.zeros(2))
+        impulses = info['contact_impulses']
+        np.testing.assert_allclose(impulses['normal'], listener.normal, rtol=1e-6)
+        np.testing.assert_allclose(impulses['push'], listener.push, rtol=1e-6, atol=1e-9)
+
+    assert impulses['normal'].sum() > 0
+    # the impulses of the kilobots are part of the impulses of the objects
+    assert np.all(impulses['kilobot_normal'].sum(axis=0) <= impulses['normal'] + 1e-9)
+    assert np.all(impulses['kilobot_normal'] >= 0)
+    assert np.linalg.norm(impulses['push']) > 0
+
+    # the totals are copies
+    impulses['normal'][:] = -1
+    assert np.all(env.contact_impulses.normal >= 0)
+    env.close()
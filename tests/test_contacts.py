@@ -0,0 +1,53 @@
+import numpy as np
+
+from gym_kilobots.lib import ContactIndex
+
+from conftest import make_configuration, yaml_env_class
+
+
+def scanned_pairs(env):
+    return [(i, j) for i, kb in enumerate(env.kilobots) for j, o in enumerate(env.objects)
+            if kb.collides_with(o._body)]
+
+
+def test_index_equals_collides_with(seeded):
+    # a dense swarm at a light that is placed at the object
+    configuration = make_configuration(num=40, std=.05)
+    configuration.light.init = 'object'
+    env = yaml_env_class('PhototaxisKilobot')(configuration=configuration)
+    env.reset()
+
+    touched = 0
+    for step in range(10):
+        if step == 5:
+            env.reset()
+        env.step(np.zeros(2))
+        contacts = env.contacts
+        pairs = contacts.pairs(ContactIndex.KILOBOT, ContactIndex.OBJECT)
+        assert [tuple(p) for p in pairs.tolist()] == scanned_pairs(env)
+        np.testing.assert_array_equal(contacts.kilobots_touching_objects(), np.unique(pairs[:, 0]))
+        for i, kb in enumerate(env.kilobots):
+            assert contacts.collides_with(kb, env.objects[0]) == kb.collides_with(env.objects[0]._body)
+            assert contacts.collides_with(kb._body, env.table) == kb.collides_with(env.table)
+            assert sorted(contacts.contacts_of_kilobot(i)) == contacts.contacts_of_kilobot(i)
+        touched += len(pairs)
+    assert touched > 0
+    env.close()
+
+
+def test_index_is_updated_after_world_steps(seeded):
+    configuration = make_configuration(num=40, std=.05)
+    configuration.light.init = 'object'
+    env = yaml_env_class('PhototaxisKilobot')(configuration=configuration)
+    env.reset()
+    counts = env.contacts.kilobot_counts
+    # queries between two steps do not build the index again
+    assert env.contacts.kilobot_counts is counts
+
+    for _ in range(3):
+        env.step(np.zeros(2))
+        assert env.contacts.kilobot_counts is not counts
+        counts = env.contacts.kilobot_counts
+        table = [kb.collides_with(env.table) for kb in env.kilobots]
+        np.testing.assert_array_equal(env.contacts.kilobot_counts[:, ContactIndex.WALL], table)
+    env.close()
@@ -0,0 +1,68 @@
+import numpy as np
+
+from gym_kilobots.envs import KilobotsEnv
+from gym_kilobots.lib import FastForward
+
+from conftest import VelocityControlEnv, make_configuration, yaml_env_class
+
+
+def rest(env, steps=10):
+    for _ in range(steps):
+        env.step(None)
+
+
+def test_fast_forward_skips_resting_swarm():
+    env = VelocityControlEnv()
+    env.reset()
+    env.fast_forward = FastForward(window=5)
+    rest(env)
+    assert env.fast_forward.converged
+    assert env.fast_forward.skipped_steps > 0
+    env.close()
+
+
+def test_action_ends_fast_forward():
+    env = VelocityControlEnv()
+    env.reset()
+    env.fast_forward = FastForward(window=5)
+    rest(env)
+    assert env.fast_forward.converged
+
+    poses = env.swarm.poses.copy()
+    skipped = env.fast_forward.skipped_steps
+    env.step(np.tile([.01, .0], (env.num_kilobots, 1)))
+    moved = np.linalg.norm(env.swarm.poses[:, :2] - poses[:, :2], axis=1)
+    # 10 sub-steps of .1 s at .01 m/s, slowed down by the damping
+    assert np.all(moved > .008)
+    assert env.fast_forward.skipped_steps == skipped
+    env.close()
+
+
+def test_command_of_one_kilobot_ends_fast_forward():
+    env = VelocityControlEnv()
+    env.reset()
+    env.fast_forward = FastForward(window=5)
+    rest(env)
+    poses = env.swarm.poses.copy()
+
+    # the velocity of a single kilobot changes without an action of the environment
+    env.kilobots[0].set_action(np.array([.01, .0]))
+    KilobotsEnv.step(env, None)
+    assert np.linalg.norm(env.swarm.poses[0, :2] - poses[0, :2]) > .008
+    np.testing.assert_array_equal(env.swarm.poses[1:], poses[1:])
+    env.close()
+
+
+def test_fast_forward_keeps_trajectory_of_moving_swarm():
+    def run(fast_forward):
+        np.random.seed(0)
+        env = yaml_env_class('PhototaxisKilobot')(configuration=make_configuration())
+        env.reset()
+        env.fast_forward = fast_forward
+        for _ in range(5):
+            env.step(np.zeros(2))
+        poses = env.swarm.poses.copy()
+        env.close()
+        return poses
+
+    np.testing.assert_array_equal(run(FastForward()), run(None))
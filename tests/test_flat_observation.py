@@ -0,0 +1,60 @@
+import numpy as np
+
+from gym_kilobots.envs.yaml_kilobots_env import FlatObservationWriter
+
+from conftest import make_configuration, yaml_env_class
+
+
+def expected_observation(env):
+    state = env.get_state()
+    objects = state['objects']
+    parts = [state['kilobots'][:, :2].ravel()]
+    if env.light_observation_space:
+        parts.append(np.ravel(state['light']))
+    parts.append(np.c_[objects[:, :2], np.sin(objects[:, 2]), np.cos(objects[:, 2])].ravel())
+    return np.concatenate(parts).astype(np.float32)
+
+
+def test_flat_observation_matches_the_observation_space(seeded):
+    env = yaml_env_class()(configuration=make_configuration(num=12), flat_observation=True)
+    observation = env.reset()
+    for _ in range(3):
+        assert observation.dtype == np.float32
+        assert env.observation_space.contains(observation)
+        np.testing.assert_array_equal(observation, expected_observation(env))
+        observation, *_ = env.step(env.action_space.sample())
+    env.close()
+
+
+def test_zero_copy_observation_reuses_the_buffer(seeded):
+    env = yaml_env_class()(configuration=make_configuration(num=12), flat_observation=True)
+    env.reset()
+    copied = env.get_observation()
+    assert copied is not env.get_observation()
+
+    env.zero_copy_observation = True
+    buffer = env.get_observation()
+    env.step(env.action_space.sample())
+    assert env.get_observation() is buffer
+    np.testing.assert_array_equal(buffer, expected_observation(env))
+    assert not np.array_equal(buffer, copied)
+    env.close()
+
+
+def test_layout_is_computed_again_only_for_another_light(seeded, monkeypatch):
+    layouts = []
+    layout_of = FlatObservationWriter.layout_of
+    monkeypatch.setattr(FlatObservationWriter, 'layout_of', lambda env: layouts.append(1) or layout_of(env))
+
+    env = yaml_env_class()(configuration=make_configuration(num=12), flat_observation=True)
+    env.reset()
+    writer = env._observation_writer
+    for _ in range(3):
+        env.step(env.action_space.sample())
+    assert env._observation_writer is writer and len(layouts) == 1
+
+    # a new episode has a new light, the layout is the same
+    env.reset()
+    assert env._observation_writer is writer and len(layouts) == 2
+    np.testing.assert_array_equal(env.get_observation(), expected_observation(env))
+    env.close()
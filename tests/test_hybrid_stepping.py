@@ -0,0 +1,48 @@
+import numpy as np
+
+from gym_kilobots.lib import HybridStepping
+
+from conftest import make_configuration, yaml_env_class
+
+
+def make_env(std=.3):
+    # a sparse swarm, most kilobots are isolated
+    return yaml_env_class()(configuration=make_configuration(num=20, std=std))
+
+
+def run(hybrid_stepping, steps=5):
+    np.random.seed(0)
+    env = make_env()
+    env.reset()
+    env.hybrid_stepping = hybrid_stepping
+    kinematic = 0
+    for _ in range(steps):
+        env.step(np.zeros(2))
+        kinematic = max(kinematic, hybrid_stepping.num_kinematic if hybrid_stepping else 0)
+    state = env.get_state()
+    env.close()
+    return state, kinematic
+
+
+def test_isolated_kilobots_follow_box2d():
+    reference, _ = run(None)
+    state, kinematic = run(HybridStepping())
+    assert kinematic > 0
+    np.testing.assert_allclose(state['kilobots'], reference['kilobots'], atol=1e-4)
+    np.testing.assert_allclose(state['objects'], reference['objects'], atol=1e-4)
+
+
+def test_reset_releases_bodies(seeded):
+    env = make_env()
+    env.hybrid_stepping = HybridStepping(interval=1)
+    env.reset()
+    env.step(np.zeros(2))
+    env.destroy()
+    # only the table is left
+    assert env.world.bodyCount == 1
+    env.reset()
+    # the table, the object and the kilobots
+    assert env.world.bodyCount == 1 + len(env.objects) + env.num_kilobots
+    env.step(np.zeros(2))
+    assert env.world.bodyCount == 1 + len(env.objects) + env.num_kilobots
+    env.close()
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from gym_kilobots.lib.light import CircularGradientLight, CompositeLight, LightCache, SmoothGridLight
+
+
+@pytest.fixture
+def positions():
+    return np.random.RandomState(0).uniform(-.6, .6, (50, 2))
+
+
+def circular_lights():
+    return [CircularGradientLight(position=np.array(p), radius=r)
+            for p, r in (([.0, .0], .2), ([.2, .1], .3), ([-.3, .2], .25), ([5., 5.], .2))]
+
+
+def loop_value_and_gradients(lights, positions):
+    # the sum of the values and the gradient of the brightest light
+    values, gradients = map(np.array, zip(*[l.value_and_gradients(positions) for l in lights]))
+    brightest = np.argmax(values, axis=0)
+    return values.sum(axis=0), gradients[brightest, np.arange(len(positions))]
+
+
+@pytest.mark.parametrize('num_lights', [1, 3, 4])
+def test_composite_of_circular_lights_equals_the_loop(positions, num_lights):
+    lights = circular_lights()[-num_lights:]
+    values, gradients = CompositeLight(lights).value_and_gradients(positions)
+    expected_values, expected_gradients = loop_value_and_gradients(lights, positions)
+    np.testing.assert_allclose(values, expected_values)
+    np.testing.assert_allclose(gradients, expected_gradients)
+
+
+def test_composite_of_other_lights_equals_the_loop(positions):
+    grid = np.add.outer(np.arange(4.), np.arange(5.))
+    lights = circular_lights()[:2] + [SmoothGridLight(grid)]
+    values, gradients = CompositeLight(lights).value_and_gradients(positions)
+    expected_values, expected_gradients = loop_value_and_gradients(lights, positions)
+    np.testing.assert_allclose(values, expected_values)
+    np.testing.assert_allclose(gradients, expected_gradients)
+
+
+def test_cache_without_tolerance_equals_the_light(positions):
+    light, cache = CircularGradientLight(radius=.3), LightCache()
+    rng = np.random.RandomState(1)
+    for _ in range(5):
+        positions = positions + rng.normal(scale=.01, size=positions.shape) * (rng.uniform(size=(50, 1)) < .5)
+        values, gradients = cache.value_and_gradients(light, positions)
+        expected_values, expected_gradients = light.value_and_gradients(positions)
+        np.testing.assert_array_equal(values, expected_values)
+        np.testing.assert_array_equal(gradients, expected_gradients)
+        light.step(np.array([.01, .0]), .1)
+
+
+def test_cache_reuses_the_values_of_resting_sensors(positions):
+    light, cache = CircularGradientLight(radius=.3), LightCache(tolerance=.001)
+    cache.value_and_gradients(light, positions)
+    assert (cache.evaluations, cache.skipped) == (1, 0)
+
+    moved = positions.copy()
+    moved[:3] += .01
+    moved[3:] += .0005
+    values, _ = cache.value_and_gradients(light, moved)
+    assert (cache.evaluations, cache.skipped, cache.skipped_sensors) == (2, 0, len(positions) - 3)
+    np.testing.assert_array_equal(values[:3], light.value_and_gradients(moved[:3])[0])
+
+    cache.value_and_gradients(light, moved)
+    assert (cache.evaluations, cache.skipped) == (2, 1)
+
+    # the values of all sensors are computed again once the light moved
+    light.step(np.array([.01, .0]), .1)
+    values, _ = cache.value_and_gradients(light, moved)
+    assert cache.evaluations == 3
+    np.testing.assert_array_equal(values, light.value_and_gradients(moved)[0])
+
+
+def test_batched_caches_equal_single_caches(positions):
+    lights = circular_lights()[:3]
+    batch_caches, caches = [LightCache() for _ in lights], [LightCache() for _ in lights]
+    stacked = np.stack([positions + .01 * i for i in range(len(lights))])
+    for step in range(3):
+        # the second light moves, the others rest
+        lights[1].step(np.array([.01, .0]), .1)
+        values, gradients = LightCache.batch_value_and_gradients(batch_caches, lights, stacked)
+        for i, (cache, light) in enumerate(zip(caches, lights)):
+            expected_values, expected_gradients = cache.value_and_gradients(light, stacked[i])
+            np.testing.assert_allclose(values[i], expected_values)
+            np.testing.assert_allclose(gradients[i], expected_gradients)
+    assert [c.evaluations for c in batch_caches] == [1, 3, 1]
@@ -0,0 +1,88 @@
+import Box2D
+import numpy as np
+
+from gym_kilobots.lib.kilobot import SimplePhototaxisKilobot
+from gym_kilobots.lib.messaging import Messaging, SpatialHash
+from gym_kilobots.lib.swarm import KilobotSwarm
+
+
+class ListeningKilobot(SimplePhototaxisKilobot):
+    """records the received messages"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.received = []
+
+    def message_rx(self, message, distance):
+        self.received.append((int(message[0]), distance))
+
+
+def brute_force_pairs(points, other, radius):
+    distances = np.linalg.norm(points[:, None] - other[None], axis=2)
+    i, j = np.nonzero(distances <= radius)
+    return i, j, distances[i, j]
+
+
+def test_spatial_hash_finds_all_pairs_within_radius():
+    rng = np.random.RandomState(0)
+    points, grid_points = rng.uniform(-1, 1, (200, 2)), rng.uniform(-1, 1, (300, 2))
+    grid = SpatialHash(.1)
+    grid.build(grid_points)
+    i, j, distances = grid.query(points, .1)
+    expected = brute_force_pairs(points, grid_points, .1)
+    np.testing.assert_array_equal(i, expected[0])
+    np.testing.assert_array_equal(j, expected[1])
+    np.testing.assert_allclose(distances, expected[2])
+
+
+def make_swarm(num=30):
+    world = Box2D.b2World(gravity=(0, 0), doSleep=True)
+    positions = np.random.RandomState(1).uniform(-.3, .3, (num, 2))
+    swarm = KilobotSwarm([ListeningKilobot(world, position=p, orientation=.0) for p in positions])
+    # the swarm must not outlive the world of its kilobots
+    return world, swarm
+
+
+def test_messages_reach_the_kilobots_in_range():
+    world, swarm = make_swarm()
+    transmitting = np.arange(0, len(swarm), 3)
+    for i in transmitting:
+        swarm.kilobots[i].set_message([i])
+
+    inbox = Messaging(communication_range=.1).step(swarm)
+
+    positions = swarm.poses[:, :2]
+    receivers, senders, distances = brute_force_pairs(positions, positions[transmitting], .1)
+    senders = transmitting[senders]
+    other = receivers != senders
+    assert len(inbox) == np.count_nonzero(other)
+    for i, kb in enumerate(swarm.kilobots):
+        expected = sorted(zip(senders[other][receivers[other] == i].tolist(),
+                              distances[other][receivers[other] == i].tolist()))
+        assert [s for s, _ in sorted(kb.received)] == [s for s, _ in expected]
+        np.testing.assert_allclose([d for _, d in sorted(kb.received)], [d for _, d in expected])
+
+
+def test_budget_limits_the_received_messages():
+    world, swarm = make_swarm(60)
+    for i, kb in enumerate(swarm.kilobots):
+        kb.set_message([i])
+
+    inbox = Messaging(communication_range=.1, budget=2, rng=np.random.RandomState(0)).step(swarm)
+    assert len(inbox) and inbox.counts.max() <= 2
+    # the messages stay sorted by receiver
+    assert np.all(np.diff(inbox.receivers) >= 0)
+    for i, kb in enumerate(swarm.kilobots):
+        assert len(kb.received) == inbox.counts[i]
+
+
+def test_env_delivers_messages_before_each_sub_step(seeded):
+    from conftest import make_configuration, yaml_env_class
+
+    env = yaml_env_class()(configuration=make_configuration())
+    env.messaging = Messaging(communication_range=.2)
+    env.reset()
+    for kb in env.kilobots:
+        kb.set_message([1])
+    env.step(np.zeros(2))
+    assert env.messaging.inbox is not None and len(env.messaging.inbox) > 0
+    env.close()
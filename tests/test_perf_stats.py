@@ -0,0 +1,39 @@
+import numpy as np
+
+from gym_kilobots.kb_profiling import PerfStats
+
+from conftest import make_configuration, yaml_env_class
+
+
+def run(perf_stats, steps=3):
+    np.random.seed(0)
+    env = yaml_env_class('PhototaxisKilobot')(configuration=make_configuration(num=20))
+    env.perf_stats = perf_stats
+    env.reset()
+    for _ in range(steps):
+        env.step(np.zeros(2))
+    return env
+
+
+def test_perf_stats_time_the_phases_of_each_step():
+    stats = PerfStats()
+    env = run(stats)
+    assert stats.steps == 3
+    assert all(stats.total[p] >= 0 for p in PerfStats.phases)
+    for phase in ('light_step', 'light_values', 'kilobots', 'world_step', 'get_state'):
+        assert stats.last[phase] > 0, phase
+
+    assert stats.last['bodies'] == env.world.bodyCount
+    assert stats.last['touching_contacts'] == sum(1 for c in env.world.contacts if c.touching)
+    assert 'world_step' in str(stats)
+
+    stats.reset()
+    assert stats.steps == 0 and not any(stats.total.values())
+    env.close()
+
+
+def test_perf_stats_do_not_change_the_simulation():
+    profiled, plain = run(PerfStats()), run(None)
+    np.testing.assert_array_equal(profiled.get_state()['kilobots'], plain.get_state()['kilobots'])
+    profiled.close()
+    plain.close()
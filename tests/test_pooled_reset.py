@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from gym_kilobots.envs.yaml_kilobots_env import EnvConfiguration
+
+from conftest import yaml_env_class
+
+
+def make_env(pooled_reset, shapes=('c_shape', 't_shape', 'quad'), num=30, physics=None, std=.05):
+    objects = [dict(idx=i, color=None, shape=shape, width=.15, height=.15, init='random', symmetry=None)
+               for i, shape in enumerate(shapes)]
+    configuration = EnvConfiguration(width=1., height=.8, resolution=600, objects=objects,
+                                     light=dict(obj_type='circular', init='random', radius=.2),
+                                     kilobots=dict(num=num, mean='light', std=std))
+    return yaml_env_class()(configuration=configuration, pooled_reset=pooled_reset, physics=physics)
+
+
+def run_episodes(env, episodes=4, steps=5):
+    np.random.seed(5)
+    observations = []
+    for _ in range(episodes):
+        observations.append(env.reset())
+        for _ in range(steps):
+            observations.append(env.step(np.zeros(2))[0])
+    env.close()
+    return observations
+
+
+def sampled_states(env, episodes=4):
+    # the states that reset samples, before the world step that resolves the overlaps
+    np.random.seed(5)
+    states, step_world = [], env._step_world
+
+    def record_and_step(*args):
+        states.append(env.get_state())
+        step_world(*args)
+
+    env._step_world = record_and_step
+    for _ in range(episodes):
+        env.reset()
+    env.close()
+    return states
+
+
+@pytest.mark.parametrize('shapes, physics', [(('quad',), 'box2d'), (('c_shape', 't_shape', 'quad'), 'box2d'),
+                                             (('l_shape', 'circle'), 'box2d'), (('quad',), 'numpy')])
+def test_pooled_reset_equals_full_reset(shapes, physics):
+    # the kilobots hardly overlap, the contacts that Box2D keeps from the previous episode do not change the result
+    pooled = run_episodes(make_env(True, shapes, num=10, physics=physics, std=.2))
+    full = run_episodes(make_env(False, shapes, num=10, physics=physics, std=.2))
+    for a, b in zip(pooled, full):
+        for key in a:
+            np.testing.assert_allclose(a[key], b[key], atol=1e-5)
+
+
+@pytest.mark.parametrize('shapes', [('quad',), ('c_shape', 't_shape', 'quad'), ('l_shape', 'circle')])
+def test_pooled_reset_samples_the_states_of_a_full_reset(shapes):
+    # overlapping kilobots are pushed apart in the order of their contacts, which differs after a pooled reset
+    pooled = sampled_states(make_env(True, shapes))
+    full = sampled_states(make_env(False, shapes))
+    assert len(pooled) == len(full) == 4
+    for a, b in zip(pooled, full):
+        for key in a:
+            np.testing.assert_array_equal(a[key], b[key])
+
+
+def test_pooled_reset_keeps_bodies(seeded):
+    env = make_env(True)
+    env.reset()
+    kilobot = env.kilobots[0]
+    env.reset()
+    assert env.kilobots[0] is kilobot
+    assert env.world.bodyCount == 1 + len(env.objects) + env.num_kilobots
+
+    # a configuration with another number of kilobots creates new bodies
+    env.conf.kilobots.num += 2
+    env.reset()
+    assert env.kilobots[0] is not kilobot
+    assert env.num_kilobots == env.conf.kilobots.num
+    env.close()
@@ -0,0 +1,36 @@
+import importlib.util
+import os
+
+import pytest
+
+_path = os.path.join(os.path.dirname(__file__), os.pardir, 'benchmarks', 'scaling.py')
+_spec = importlib.util.spec_from_file_location('scaling', _path)
+scaling = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(scaling)
+
+
+def test_sweeps_vary_one_dimension_of_the_base_case():
+    cases = list(scaling.cases(grid=False))
+    assert len(cases) == sum(map(len, scaling._sweeps.values())) - len(scaling._sweeps) + 1
+    assert all(cases.count(c) == 1 for c in cases)
+    for case in cases:
+        assert sum(case[k] != v for k, v in scaling._base_case.items()) <= 1
+
+
+def result(steps_per_s, resets_per_s=10., peak_rss_mb=100.):
+    return dict(scaling._base_case, steps_per_s=steps_per_s, resets_per_s=resets_per_s, peak_rss_mb=peak_rss_mb)
+
+
+@pytest.mark.parametrize('steps_per_s, peak_rss_mb, regressions', [(100., 100., 0), (80., 100., 1), (150., 130., 1),
+                                                                    (95., 105., 0)])
+def test_compare_counts_the_regressions(steps_per_s, peak_rss_mb, regressions):
+    reference = {'results': [result(100.)]}
+    results = {'results': [result(steps_per_s, peak_rss_mb=peak_rss_mb)]}
+    assert scaling.compare(results, reference, threshold=.1) == regressions
+
+
+def test_run_case_reports_the_metrics():
+    r = scaling.run_case(dict(scaling._base_case, kilobots=10), steps=2, resets=1, seed=0)
+    assert r['kilobots'] == 10
+    assert r['steps_per_s'] > 0 and r['resets_per_s'] > 0 and r['peak_rss_mb'] > 0
+    assert r['phases_ms']['world_step'] > 0
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from gym_kilobots.kb_profiling import PerfStats
+from gym_kilobots.lib.simulation import make_profile, simulation_profiles
+
+from conftest import make_configuration, yaml_env_class
+
+
+def test_make_profile_replaces_values():
+    profile = make_profile('fast', velocity_iterations=6)
+    assert profile == simulation_profiles['fast']._replace(velocity_iterations=6)
+    assert make_profile(profile) == profile
+    assert profile.sim_step == pytest.approx(.1)
+
+
+@pytest.mark.parametrize('profile, overrides', [('unknown', {}), ('default', dict(iterations=3)),
+                                                ('default', dict(physics_steps=0)),
+                                                ('default', dict(velocity_iterations=1.5))])
+def test_make_profile_rejects_invalid_values(profile, overrides):
+    with pytest.raises(ValueError):
+        make_profile(profile, **overrides)
+
+
+@pytest.mark.parametrize('simulation', ['fast', 'default', 'accurate', dict(physics_steps=2, position_iterations=3)])
+def test_profile_sets_the_world_steps(seeded, simulation):
+    env = yaml_env_class()(configuration=make_configuration(), simulation=simulation)
+    profile = env.simulation
+    env.reset()
+    env.perf_stats = PerfStats()
+    env.step(np.zeros(2))
+
+    world_steps = profile.steps_per_action * profile.physics_steps
+    assert env.perf_stats.last['velocity_iterations'] == world_steps * profile.velocity_iterations
+    assert env.perf_stats.last['position_iterations'] == world_steps * profile.position_iterations
+    # the control rate and the duration of an action do not depend on the physics
+    assert env.sim_step == pytest.approx(.1)
+    env.close()
+
+
+def test_default_profile_is_the_class_profile(seeded):
+    env = yaml_env_class()(configuration=make_configuration())
+    assert env.simulation == simulation_profiles['default']
+    env.close()
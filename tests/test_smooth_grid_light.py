@@ -0,0 +1,73 @@
+import sys
+
+import numpy as np
+import pytest
+
+from gym_kilobots.lib.light import SmoothGridLight
+
+
+def test_grid_from_npy_file(tmp_path):
+    grid = np.arange(12, dtype=np.float64).reshape((3, 4))
+    np.save(tmp_path / 'grid.npy', grid)
+    light = SmoothGridLight(str(tmp_path / 'grid.npy'))
+    np.testing.assert_array_equal(light.grid, grid)
+
+
+def make_light(**kwargs):
+    # a 3 x 4 grid over [0, 3] x [0, 2], i.e., grid points at integer coordinates
+    grid = np.array([[0., 1., 4., 2.],
+                     [3., 5., 2., 0.],
+                     [1., 0., 6., 8.]])
+    return SmoothGridLight(grid, extent=(np.array([0., 0.]), np.array([3., 2.])), **kwargs)
+
+
+def test_values_at_and_between_grid_points():
+    light = make_light()
+    rows, cols = np.mgrid[0:3, 0:4]
+    nodes = np.c_[cols.ravel(), rows.ravel()].astype(np.float64)
+    np.testing.assert_allclose(light.get_value(nodes), light.grid.ravel())
+
+    # bilinear interpolation of the cell with the corners 0, 1 (row 0) and 3, 5 (row 1)
+    between = np.array([[.5, .0], [.0, .5], [.5, .5], [.25, .75]])
+    expected = [.5, 1.5, (0 + 1 + 3 + 5) / 4, .25 * (.75 * 0 + .25 * 1) + .75 * (.75 * 3 + .25 * 5)]
+    np.testing.assert_allclose(light.get_value(between), expected)
+
+
+def test_gradients_equal_finite_differences():
+    light = make_light(pose=np.array([.3, -.2, .4]))
+    # positions inside of the cells, away from the edges where the gradient jumps
+    positions = np.random.RandomState(0).uniform(.1, .9, (20, 2)) + np.array([[1., 0.]])
+    positions = positions.dot(np.array([[np.cos(.4), np.sin(.4)], [-np.sin(.4), np.cos(.4)]])) + (.3, -.2)
+    values, gradients = light.value_and_gradients(positions)
+    eps = 1e-6
+    for axis in range(2):
+        shifted = positions.copy()
+        shifted[:, axis] += eps
+        np.testing.assert_allclose((light.get_value(shifted) - values) / eps, gradients[:, axis], atol=1e-4)
+
+
+def test_actions_shift_and_rotate_the_map():
+    light = make_light()
+    positions = np.array([[.5, .5], [2.2, 1.7], [1., 1.]])
+    values = light.get_value(positions)
+
+    light.step(np.array([.01, -.01, .1]), time_step=1.)
+    np.testing.assert_allclose(light.get_state(), [.01, -.01, .1])
+    c, s = np.cos(.1), np.sin(.1)
+    moved = positions.dot(np.array([[c, s], [-s, c]])) + (.01, -.01)
+    np.testing.assert_allclose(light.get_value(moved), values)
+
+
+def test_value_and_gradient_are_zero_outside_of_the_map():
+    light = make_light()
+    outside = np.array([[-.1, 1.], [3.1, 1.], [1., -.1], [1., 2.1]])
+    values, gradients = light.value_and_gradients(outside)
+    np.testing.assert_array_equal(values, 0)
+    np.testing.assert_array_equal(gradients, 0)
+
+
+def test_image_without_imageio_names_the_extra(tmp_path, monkeypatch):
+    # the import of a module that is None in sys.modules fails
+    monkeypatch.setitem(sys.modules, 'imageio', None)
+    with pytest.raises(ImportError, match=r'gym_kilobots\[images\]'):
+        SmoothGridLight(str(tmp_path / 'grid.png'))
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from conftest import make_configuration, yaml_env_class
+
+
+def run(env, actions):
+    return [env.step(action)[0] for action in actions]
+
+
+@pytest.mark.parametrize('kilobot_type', ['PhototaxisKilobot', 'SimplePhototaxisKilobot'])
+def test_restore_repeats_the_episode(seeded, kilobot_type):
+    env = yaml_env_class(kilobot_type)(configuration=make_configuration(std=.1))
+    env.reset()
+    actions = np.random.RandomState(2).uniform(-.01, .01, (8, 2))
+    run(env, actions[:3])
+
+    snapshot = env.snapshot()
+    first = run(env, actions[3:])
+    random_after = np.random.rand()
+
+    env.restore(snapshot)
+    second = run(env, actions[3:])
+    # the random number generators are restored as well
+    assert np.random.rand() == random_after
+
+    for a, b in zip(first, second):
+        # Box2D starts the restored contacts without warm starting
+        np.testing.assert_allclose(a['kilobots'], b['kilobots'], atol=1e-4)
+        np.testing.assert_array_equal(a['light'], b['light'])
+        np.testing.assert_allclose(a['objects'], b['objects'], atol=1e-4)
+    env.close()
+
+
+def test_restore_after_reset_with_the_same_bodies(seeded):
+    env = yaml_env_class()(configuration=make_configuration(), pooled_reset=True)
+    env.reset()
+    snapshot = env.snapshot()
+    # the state of the light is not copied by get_state
+    state = {key: np.copy(value) for key, value in env.get_state().items()}
+    env.step(np.full(2, .01))
+    env.reset()
+
+    env.restore(snapshot)
+    for key, value in env.get_state().items():
+        np.testing.assert_array_equal(value, state[key])
+    env.close()
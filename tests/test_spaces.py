@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from conftest import make_configuration, yaml_env_class
+
+
+def test_spaces_are_cached_across_resets(seeded):
+    env = yaml_env_class()(configuration=make_configuration(num=12))
+    env.reset()
+    observation_space, state_space = env.observation_space, env.state_space
+    assert env.observation_space is observation_space and env.state_space is state_space
+    with pytest.raises(ValueError):
+        observation_space.low[0] = 0
+
+    # the light is replaced by reset, its spaces stay the same
+    env.reset()
+    assert env.observation_space is observation_space and env.state_space is state_space
+    env.close()
+
+
+def test_spaces_are_rebuilt_for_other_swarms(seeded):
+    env = yaml_env_class()(configuration=make_configuration(num=12))
+    env.reset()
+    observation_space = env.observation_space
+
+    env.conf.kilobots.num = 15
+    env.reset()
+    assert env.observation_space is not observation_space
+    assert env.observation_space.shape[0] == observation_space.shape[0] + 2 * 3
+    assert env.observation_space.contains(np.asarray(env.get_flat_observation()))
+    env.close()
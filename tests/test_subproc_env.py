@@ -0,0 +1,58 @@
+import functools
+import random
+
+import numpy as np
+
+from gym_kilobots.envs import SubprocVectorKilobotsEnv
+
+from conftest import make_configuration, yaml_env_class
+
+env_fn = functools.partial(yaml_env_class(), configuration=make_configuration())
+
+
+def seed_process(seed):
+    np.random.seed(seed)
+    random.seed(seed)
+
+
+def test_workers_are_seeded_with_the_base_seed_and_their_index():
+    vector_env = SubprocVectorKilobotsEnv([env_fn, env_fn], start_method='fork', seed=4)
+    # the workers reset their environments when they start
+    observations = vector_env.reset()
+    assert not np.array_equal(observations['kilobots'][0], observations['kilobots'][1])
+
+    other = SubprocVectorKilobotsEnv([env_fn, env_fn], start_method='fork', seed=4)
+    for key, value in other.reset().items():
+        np.testing.assert_array_equal(value, observations[key])
+    other.close()
+
+    actions = np.random.RandomState(1).uniform(-.01, .01, (3, 2, 2))
+    steps = [vector_env.step(action) for action in actions]
+    # a single environment seeded with the base seed plus the index repeats the episode of each worker, one after
+    # the other because the environments of one process share the random generators
+    for i in range(2):
+        seed_process(4 + i)
+        env = env_fn()
+        env.reset()
+        observation = env.reset()
+        for key in observation:
+            np.testing.assert_array_equal(observations[key][i], observation[key])
+        for action, (step_observations, rewards, dones, infos) in zip(actions, steps):
+            observation, reward, done, info = env.step(action[i])
+            np.testing.assert_array_equal(step_observations['kilobots'][i], observation['kilobots'])
+            np.testing.assert_array_equal(step_observations['light'][i], observation['light'])
+            assert rewards[i] == reward and dones[i] == done and len(infos) == 2
+        env.close()
+
+    # seed hands out the seed plus the index of the worker
+    assert vector_env.seed(10) == [[10], [11]]
+    observations = vector_env.reset()
+    for i in range(2):
+        env = env_fn()
+        seed_process(10 + i)
+        env.seed(10 + i)
+        np.testing.assert_array_equal(observations['kilobots'][i], env.reset()['kilobots'])
+        env.close()
+
+    assert vector_env.env_method('get_reward', None, None, None) == [.0, .0]
+    vector_env.close()
@@ -0,0 +1,152 @@
+import Box2D
+import numpy as np
+import pytest
+
+from gym_kilobots.lib.body import _world_scale
+from gym_kilobots.lib.kilobot import Kilobot, PhototaxisKilobot, SimplePhototaxisKilobot
+from gym_kilobots.lib.light import CircularGradientLight
+from gym_kilobots.lib.swarm import KilobotSwarm
+
+
+class OtherPhototaxisKilobot(PhototaxisKilobot):
+    """a second kilobot class that is stepped by a PhototaxisController"""
+
+
+def make_swarm(world, x):
+    kilobots = [kilobot_class(world, position=(x, .1 * y), orientation=.0)
+                for y, kilobot_class in enumerate([PhototaxisKilobot, OtherPhototaxisKilobot] * 2)]
+    return KilobotSwarm(kilobots)
+
+
+def test_concatenate_controllers_of_the_same_type():
+    world = Box2D.b2World(gravity=(0, 0), doSleep=True)
+    swarms = [make_swarm(world, -.2), make_swarm(world, .2)]
+    swarm = KilobotSwarm.concatenate(swarms)
+    assert len(swarm.controllers) == 2
+
+    for i, kb in enumerate(swarm.kilobots):
+        kb._controller_state['update_counter'] = i
+    for s, offset in zip(swarms, (0, len(swarms[0]))):
+        for controller in s.controllers:
+            # the state rows of a controller of the given swarms belong to its kilobots
+            np.testing.assert_array_equal(controller.state['update_counter'], controller._idx + offset)
+
+
+def scalar_motor_velocities(body, motors, time_step):
+    # the motor model of Kilobot.step for a single kilobot, the turns use the world vectors of Box2D
+    motor_left, motor_right = motors
+    orientation = body.angle
+    if motor_left and motor_right:
+        forward = (motor_right + motor_left) / 510. * Kilobot._max_linear_velocity
+        return np.array([np.sin(orientation) * forward, np.cos(orientation) * forward]), \
+            (motor_right - motor_left) / 510. * Kilobot._max_angular_velocity
+    if not motor_left and not motor_right:
+        return np.zeros(2), .0
+    if motor_right:
+        angular_velocity, leg = motor_right / 255. * Kilobot._max_angular_velocity, Kilobot._leg_left
+    else:
+        angular_velocity, leg = -motor_left / 255. * Kilobot._max_angular_velocity, Kilobot._leg_right
+    c, s = np.cos(angular_velocity * time_step), np.sin(angular_velocity * time_step)
+    translation = leg - np.dot([[c, -s], [s, c]], leg)
+    return np.array(body.GetWorldVector(translation * _world_scale)) / _world_scale / time_step, angular_velocity
+
+
+def test_motor_velocities_equal_the_scalar_model():
+    rng = np.random.RandomState(0)
+    world = Box2D.b2World(gravity=(0, 0), doSleep=True)
+    orientations = rng.uniform(-np.pi, np.pi, 40)
+    bodies = [world.CreateDynamicBody(position=(0, 0), angle=float(o)) for o in orientations]
+    motors = rng.choice([0, 100, 255], size=(40, 2)).astype(np.float64)
+
+    # Box2D keeps the angles and rotates the vectors in float32
+    linear, angular = Kilobot.motor_velocities(motors, np.array([body.angle for body in bodies]), .1)
+    for body, m, v, w in zip(bodies, motors, linear, angular):
+        expected_v, expected_w = scalar_motor_velocities(body, m, .1)
+        np.testing.assert_allclose(v, expected_v, rtol=1e-5, atol=1e-9)
+        assert w == pytest.approx(expected_w)
+
+
+@pytest.mark.parametrize('kilobot_class', [PhototaxisKilobot, SimplePhototaxisKilobot])
+def test_controllers_equal_kilobot_step(kilobot_class):
+    light = CircularGradientLight(position=np.array([.1, .05]), radius=.3)
+    rng = np.random.RandomState(0)
+    poses = np.c_[rng.uniform(-.3, .3, (12, 2)), rng.uniform(-np.pi, np.pi, 12)]
+
+    swarms = []
+    for _ in range(2):
+        world = Box2D.b2World(gravity=(0, 0), doSleep=True)
+        swarms.append((world, KilobotSwarm([kilobot_class(world, position=p[:2], orientation=p[2], light=light)
+                                            for p in poses])))
+
+    for _ in range(30):
+        for stepped_by_controllers, (world, swarm) in zip((True, False), swarms):
+            swarm.set_light_values_and_gradients(*light.value_and_gradients(swarm.light_sensor_positions()))
+            if stepped_by_controllers:
+                swarm.step(.1)
+            else:
+                for kb in swarm.kilobots:
+                    kb.step(.1)
+            world.Step(.1, 10, 10)
+            swarm.invalidate()
+            swarm.sync()
+
+    (_, controlled), (_, stepped) = swarms
+    assert np.abs(controlled.poses - poses).max() > .01
+    np.testing.assert_allclose(controlled.poses, stepped.poses, atol=1e-6)
+    np.testing.assert_array_equal(controlled.motors, stepped.motors)
+
+
+def test_kilobots_keep_their_state_in_the_swarm():
+    world = Box2D.b2World(gravity=(0, 0), doSleep=True)
+    kilobot = PhototaxisKilobot(world, position=(.0, .0), orientation=.0)
+    kilobot.turn_right()
+    kilobot.set_message([1, 2])
+    swarm = KilobotSwarm([PhototaxisKilobot(world, position=(.1, .0), orientation=.0), kilobot])
+
+    # the state set before the swarm was created is moved into the swarm arrays
+    np.testing.assert_array_equal(swarm.motors[1], (0, 255))
+    assert swarm.transmitting[1] and swarm.messages[1, :2].tolist() == [1, 2]
+
+    swarm.turn_left(np.array([1]))
+    assert (kilobot._motor_left, kilobot._motor_right) == (255, 0)
+    kilobot.set_light_value_and_gradient(.5, (.1, .2))
+    np.testing.assert_array_equal(swarm.light_readings[1], (.5, .1, .2))
+    np.testing.assert_array_equal(swarm.light_readings[0], 0)
+
+
+def test_pose_cache_is_read_from_box2d():
+    world = Box2D.b2World(gravity=(0, 0), doSleep=True)
+    swarm = make_swarm(world, .0)
+    for kb in swarm.kilobots:
+        kb._body.linearVelocity = (.1, .05)
+        kb._body.angularVelocity = .3
+    world.Step(.1, 10, 10)
+
+    # the cache keeps the poses until it is invalidated, then the kilobots read Box2D
+    stale = swarm.poses.copy()
+    assert swarm.kilobots[0].get_pose() == tuple(stale[0])
+    swarm.invalidate()
+    expected = np.array([(b.position.x / _world_scale, b.position.y / _world_scale, b.angle)
+                         for b in (kb._body for kb in swarm.kilobots)])
+    np.testing.assert_allclose(swarm.kilobots[0].get_pose(), expected[0])
+    swarm.sync()
+    np.testing.assert_allclose(swarm.poses, expected)
+    assert np.abs(swarm.poses - stale).min() > 0
+
+
+class ShiftedSensorKilobot(PhototaxisKilobot):
+    def light_sensor_pos(self):
+        return self.get_position() + .01
+
+
+def test_light_sensor_positions_equal_the_world_points():
+    world = Box2D.b2World(gravity=(0, 0), doSleep=True)
+    rng = np.random.RandomState(0)
+    classes = [PhototaxisKilobot, SimplePhototaxisKilobot, ShiftedSensorKilobot] * 3
+    swarm = KilobotSwarm([kilobot_class(world, position=rng.uniform(-.3, .3, 2), orientation=rng.uniform(-3, 3))
+                          for kilobot_class in classes])
+
+    expected = [np.array(kb._body.GetWorldPoint(kb._light_sensor_offset * _world_scale)) / _world_scale
+                for kb in swarm.kilobots]
+    expected[2::3] = [kb.get_position() + .01 for kb in swarm.kilobots[2::3]]
+    np.testing.assert_allclose(swarm.light_sensor_positions(), expected, atol=1e-7)
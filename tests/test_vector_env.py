@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+
+from gym_kilobots.envs import VectorKilobotsEnv
+from gym_kilobots.kb_profiling import PerfStats
+from gym_kilobots.lib import FastForward
+
+from conftest import make_configuration, yaml_env_class
+
+
+def make_vector_env(num_envs=2, kilobot_type='SimplePhototaxisKilobot', light='circular', **kwargs):
+    return VectorKilobotsEnv(num_envs, configuration=make_configuration(light=light),
+                             env_class=yaml_env_class(kilobot_type), **kwargs)
+
+
+def make_envs(num_envs=2, kilobot_type='SimplePhototaxisKilobot', light='circular'):
+    return [yaml_env_class(kilobot_type)(configuration=make_configuration(light=light)) for _ in range(num_envs)]
+
+
+@pytest.mark.parametrize('kilobot_type, light', [('PhototaxisKilobot', 'circular'),
+                                                 ('SimplePhototaxisKilobot', 'linear')])
+def test_vector_env_equals_single_envs(kilobot_type, light):
+    np.random.seed(1)
+    vector_env = make_vector_env(3, kilobot_type, light)
+    vector_env.reset()
+    np.random.seed(1)
+    envs = make_envs(3, kilobot_type, light)
+    for env in envs:
+        env.reset()
+
+    actions = np.random.RandomState(5).uniform(-.01, .01, (5, 3) + vector_env.action_space.shape)
+    for action in actions:
+        observations, rewards, dones, _ = vector_env.step(action)
+        for i, (env, a) in enumerate(zip(envs, action)):
+            observation, reward, done, _ = env.step(a)
+            np.testing.assert_array_equal(observations['kilobots'][i], observation['kilobots'])
+            np.testing.assert_array_equal(observations['light'][i], observation['light'])
+            assert rewards[i] == reward
+    vector_env.close()
+
+
+class GatherEnv(yaml_env_class()):
+    def get_reward(self, state, action, new_state):
+        return -np.mean(np.linalg.norm(new_state['kilobots'][:, :2] - new_state['light'], axis=1))
+
+    def has_finished(self, state, action):
+        return bool(np.mean(np.linalg.norm(state['kilobots'][:, :2] - state['light'], axis=1)) < .05)
+
+
+def batch_reward(states, actions, new_states):
+    return -np.mean(np.linalg.norm(new_states['kilobots'][..., :2] - new_states['light'][:, None], axis=2), axis=1)
+
+
+def batch_done(states, actions):
+    return np.mean(np.linalg.norm(states['kilobots'][..., :2] - states['light'][:, None], axis=2), axis=1) < .05
+
+
+def test_batched_rewards_equal_the_rewards_of_the_envs():
+    vector_envs = []
+    for batched in (False, True):
+        np.random.seed(3)
+        vector_env = VectorKilobotsEnv(3, configuration=make_configuration(), env_class=GatherEnv)
+        if batched:
+            vector_env.batch_reward, vector_env.batch_done = batch_reward, batch_done
+        vector_env.reset()
+        vector_envs.append(vector_env)
+
+    for action in np.random.RandomState(0).uniform(-.01, .01, (5, 3, 2)):
+        (_, rewards, dones, _), (_, batch_rewards, batch_dones, _) = (env.step(action) for env in vector_envs)
+        np.testing.assert_allclose(batch_rewards, rewards, rtol=1e-12)
+        np.testing.assert_array_equal(batch_dones, dones)
+        assert batch_dones.dtype == bool and np.all(rewards < 0)
+    for vector_env in vector_envs:
+        vector_env.close()
+
+
+def test_vector_env_fast_forward():
+    np.random.seed(2)
+    vector_env = make_vector_env(2)
+    vector_env.reset()
+    np.random.seed(2)
+    envs = make_envs(2)
+    for env in envs:
+        env.reset()
+    # only the first environment fast-forwards
+    vector_env.envs[0].fast_forward, envs[0].fast_forward = FastForward(window=5), FastForward(window=5)
+    vector_env.perf_stats = PerfStats()
+
+    for _ in range(20):
+        observations = vector_env.step(np.zeros((2, 2)))[0]
+        for i, env in enumerate(envs):
+            np.testing.assert_array_equal(observations['kilobots'][i], env.step(np.zeros(2))[0]['kilobots'])
+    assert vector_env.envs[0].fast_forward.skipped_steps == envs[0].fast_forward.skipped_steps > 0
+    assert vector_env.perf_stats.steps == 20
+    assert vector_env.perf_stats.total['bodies'] == 20 * sum(env.world.bodyCount for env in envs)
+    vector_env.close()
+
+
+def test_vector_env_reuses_light_values(seeded):
+    vector_env = make_vector_env(2)
+    vector_env.reset()
+    for env in vector_env.envs:
+        env.light_cache.tolerance = 1.
+    # without actions the lights do not change, the values are reused while no kilobot moved by the tolerance
+    vector_env.step([None, None])
+    for env in vector_env.envs:
+        assert env.light_cache.evaluations == 1
+        assert env.light_cache.skipped == env._steps_per_action - 1
+    vector_env.close()
+
+
+def test_reset_releases_bodies(seeded):
+    vector_env = make_vector_env()
+    vector_env.reset()
+    vector_env.step(np.zeros((vector_env.num_envs, 2)))
+    vector_env.reset()
+    for env in vector_env.envs:
+        # the table, the object and the kilobots
+        assert env.world.bodyCount == 1 + len(env.objects) + env.num_kilobots
+    vector_env.close()